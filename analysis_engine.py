@@ -0,0 +1,524 @@
+# ai_resume_analyzer/analysis_engine.py
+"""
+UI-free analysis engine.
+
+run_analysis() runs one full analysis (any mode, plus the local ATS check and skill
+gap) and is shared by the app, the batch script and the job queue. AnalysisEngine
+runs analyses as jobs on background worker threads fed by a bounded queue:
+callers submit() a job, poll() its progress (finished tasks, partial results,
+notices) and collect the results when it is done, so a slow analysis never blocks
+the caller. run_shortlist_analysis() sends only the best matches from a resume index
+through the job match and skill gap prompts (recruiter mode), directly or as a job.
+StandInModel replaces Gemini for local runs without an API key.
+"""
+
+import copy
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analysis_store import get_default_store
+from metrics import export_metrics_from_env, get_default_metrics
+from rate_limiter import PRIORITY_INTERACTIVE
+from text_compaction import DEFAULT_PROMPT_TOKEN_BUDGET
+from utils import (
+    DEFAULT_MAX_PARALLEL_TASKS, LOCAL_ANALYSIS_KEYS, RESULT_SCHEMAS,
+    add_local_analysis, build_context_tasks, context_prompt, current_notice_handler, notice_handler,
+    run_analysis_tasks, run_combined_analysis, run_pipeline_analysis,
+)
+
+ANALYSIS_MODES = ("parallel", "combined", "pipeline")
+
+DEFAULT_ENGINE_WORKERS = int(os.getenv("ANALYSIS_ENGINE_WORKERS", "4"))
+DEFAULT_ENGINE_QUEUE_SIZE = int(os.getenv("ANALYSIS_ENGINE_QUEUE_SIZE", "32"))
+DEFAULT_FINISHED_JOBS_KEPT = int(os.getenv("ANALYSIS_ENGINE_FINISHED_JOBS", "256"))
+
+# Recruiter mode: only this many of the best-ranked resumes go through these Gemini tasks.
+DEFAULT_SHORTLIST_SIZE = int(os.getenv("SHORTLIST_TOP_K", "10"))
+SHORTLIST_TASKS = ("job_match", "skill_gap")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class QueueFullError(RuntimeError):
+    """Raised by AnalysisEngine.submit when the job queue is at capacity."""
+
+
+def run_analysis(resume_text, job_title, job_description="", mode="parallel", max_workers=DEFAULT_MAX_PARALLEL_TASKS,
+                 token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, enrich_local=False, on_task_done=None, on_partial=None,
+                 previous_results=None, **gemini_kwargs):
+    """
+    Runs every analysis task for one resume in `mode` ("parallel", "combined" or
+    "pipeline") and adds the local ATS check and skill gap. Gemini is only asked for
+    those two as well when `enrich_local` is set. `on_partial(key, partial)` streams
+    results in parallel mode. `previous_results` are earlier results that are still
+    valid for these inputs (see utils.reusable_results): they are reported as done
+    right away and their tasks do not run again. Extra keyword arguments (use_cache,
+    priority) are passed on to the Gemini calls.
+    Returns (results, prompt_size_report); the report is only filled in pipeline mode.
+    """
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode {mode!r}; expected one of {ANALYSIS_MODES}.")
+    reused = dict(previous_results or {})
+    metrics = get_default_metrics()
+    for key, result in reused.items():
+        metrics.increment("analysis_tasks_reused_total", task=key)
+        if on_task_done:
+            on_task_done(key, result)
+    skip_keys = tuple(reused) + (() if enrich_local else LOCAL_ANALYSIS_KEYS)
+    prompt_size_report = {}
+    if mode == "combined":
+        results = run_combined_analysis(resume_text, job_title, job_description, max_workers=max_workers,
+                                        on_task_done=on_task_done, token_budget=token_budget, skip_keys=skip_keys,
+                                        **gemini_kwargs)
+    elif mode == "pipeline":
+        results, prompt_size_report = run_pipeline_analysis(resume_text, job_title, job_description, max_workers=max_workers,
+                                                            on_task_done=on_task_done, token_budget=token_budget,
+                                                            skip_keys=skip_keys, extracted_details=reused.get("extracted_details"),
+                                                            **gemini_kwargs)
+    else:
+        context, analysis_tasks = build_context_tasks(resume_text, job_title, job_description, token_budget, skip_keys=skip_keys)
+        results = run_analysis_tasks(analysis_tasks, max_workers=max_workers, on_task_done=on_task_done,
+                                     on_partial=on_partial, context=context, **gemini_kwargs)
+    results = add_local_analysis(results, resume_text, job_title, job_description, on_task_done=on_task_done,
+                                 skip_keys=tuple(reused))
+    results = {**reused, **results}
+    if not job_description:
+        results["skill_gap"] = {"info": "Job description not provided for skill gap analysis."}
+    return results, prompt_size_report
+
+
+def _match_percentage(job_match):
+    """The job_match_percentage of a job match result as a number (Gemini may answer "75%"), or None."""
+    value = job_match.get("job_match_percentage") if isinstance(job_match, dict) else None
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+
+
+def run_shortlist_analysis(index, job_title, job_description="", top_k=DEFAULT_SHORTLIST_SIZE, ranked=None,
+                           max_workers=DEFAULT_MAX_PARALLEL_TASKS, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                           on_candidate_done=None, **gemini_kwargs):
+    """
+    Ranks the resumes in `index` (a resume_index.ResumeIndex) against the job, or takes
+    `ranked` (a list from index.search), and runs only the SHORTLIST_TASKS prompts for
+    the first `top_k`, `max_workers` resumes at a time. `on_candidate_done(doc_id,
+    candidate)` is called on the calling thread as each resume finishes.
+    Returns the candidates (the search hit plus index_rank, results and
+    job_match_percentage), best Gemini match first, then by index rank.
+    """
+    if ranked is None:
+        ranked = index.search(job_description, job_title, top_k=top_k)
+    ranked = ranked[:top_k]
+    if not ranked:
+        return []
+    skip_keys = [key for key in RESULT_SCHEMAS if key not in SHORTLIST_TASKS]
+    handler = current_notice_handler()
+
+    def analyze_candidate(index_rank, hit):
+        with notice_handler(handler):
+            resume_text = index.get_text(hit["doc_id"])
+            if resume_text is None:
+                results = {"job_match": {"error": "The resume is no longer in the index.", "raw_response": None}}
+            else:
+                # slim_extraction only skips the local contact scan; the extraction prompt itself is not sent.
+                context, tasks = build_context_tasks(resume_text, job_title, job_description, token_budget,
+                                                     skip_keys=skip_keys, slim_extraction=True)
+                results = run_analysis_tasks(tasks, max_workers=len(tasks), context=context, **gemini_kwargs)
+                if not job_description:
+                    results["skill_gap"] = {"info": "Job description not provided for skill gap analysis."}
+        return dict(hit, index_rank=index_rank, results=results,
+                    job_match_percentage=_match_percentage(results.get("job_match")))
+
+    candidates = []
+    with ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(ranked))), thread_name_prefix="shortlist") as executor:
+        futures = [executor.submit(analyze_candidate, index_rank, hit) for index_rank, hit in enumerate(ranked, 1)]
+        for future in as_completed(futures):
+            candidate = future.result()
+            candidates.append(candidate)
+            if on_candidate_done:
+                on_candidate_done(candidate["doc_id"], candidate)
+    return sorted(candidates, key=lambda candidate: (
+        candidate["job_match_percentage"] is None, -(candidate["job_match_percentage"] or 0), candidate["index_rank"],
+    ))
+
+
+class AnalysisJob:
+    """State of one submitted analysis. Updated by a worker thread; read through AnalysisEngine.poll."""
+
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.status = JOB_QUEUED
+        self.results = {}
+        self.partials = {}
+        self.finished_tasks = []
+        self.notices = []
+        self.prompt_size_report = {}
+        self.analysis_id = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0 # bumped on every change, so pollers can skip unchanged snapshots
+        self.lock = threading.Lock()
+
+    def update(self, **changes):
+        with self.lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+
+    def on_task_done(self, key, result):
+        with self.lock:
+            self.results[key] = result
+            self.partials.pop(key, None)
+            self.finished_tasks.append(key)
+            self.version += 1
+
+    def on_partial(self, key, partial):
+        with self.lock:
+            self.partials[key] = partial
+            self.version += 1
+
+    def on_notice(self, level, message):
+        with self.lock:
+            self.notices.append((level, message))
+            self.version += 1
+
+    def snapshot(self):
+        with self.lock:
+            return copy.deepcopy({
+                "id": self.id, "status": self.status, "version": self.version,
+                "job_title": self.params["job_title"], "mode": self.params["mode"],
+                "results": self.results, "partials": self.partials, "finished_tasks": self.finished_tasks,
+                "notices": self.notices, "prompt_size_report": self.prompt_size_report,
+                "analysis_id": self.analysis_id, "error": self.error,
+                "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            })
+
+
+class AnalysisEngine:
+    """
+    Runs analyses as background jobs. submit() only enqueues; `workers` threads take
+    jobs from a queue holding at most `queue_size` waiting jobs.
+
+        engine = AnalysisEngine()
+        job_id = engine.submit(resume_text, "Data Scientist", job_description)
+        while engine.poll(job_id)["status"] not in FINISHED_STATES:
+            time.sleep(0.5)
+        results = engine.poll(job_id)["results"]
+
+    Finished jobs are kept for polling until `finished_jobs_kept` newer ones finished.
+    With `save_results` every finished analysis is written to the default analysis store.
+    """
+
+    def __init__(self, workers=DEFAULT_ENGINE_WORKERS, queue_size=DEFAULT_ENGINE_QUEUE_SIZE,
+                 finished_jobs_kept=DEFAULT_FINISHED_JOBS_KEPT, save_results=True):
+        self.workers = max(1, workers)
+        self.finished_jobs_kept = finished_jobs_kept
+        self.save_results = save_results
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._jobs = OrderedDict() # job id -> AnalysisJob, oldest first
+        self._jobs_lock = threading.Lock()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._stopping = False
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "cancelled": 0}
+        self._sequence = itertools.count(1)
+
+    def _ensure_workers(self):
+        with self._threads_lock:
+            if self._threads or self._stopping:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"analysis-engine-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, resume_text, job_title, job_description="", mode="parallel", max_workers=DEFAULT_MAX_PARALLEL_TASKS,
+               token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, enrich_local=False, stream=False, use_cache=True,
+               priority=PRIORITY_INTERACTIVE, metadata=None, previous_results=None):
+        """
+        Queues an analysis and returns its job id. `stream` records partial results
+        while responses arrive (parallel mode only). `previous_results` are reused as in
+        run_analysis. Raises QueueFullError if the queue is full and ValueError for an
+        unknown mode.
+        """
+        if mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode {mode!r}; expected one of {ANALYSIS_MODES}.")
+        if self._stopping:
+            raise RuntimeError("The analysis engine has been shut down.")
+        return self._enqueue({
+            "kind": "analysis", "resume_text": resume_text, "job_title": job_title, "job_description": job_description or "",
+            "mode": mode, "max_workers": max_workers, "token_budget": token_budget, "enrich_local": enrich_local,
+            "stream": stream, "use_cache": use_cache, "priority": priority, "metadata": metadata or {},
+            "previous_results": previous_results or {},
+        })
+
+    def submit_shortlist(self, index, job_title, job_description="", top_k=DEFAULT_SHORTLIST_SIZE, ranked=None,
+                         max_workers=DEFAULT_MAX_PARALLEL_TASKS, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                         use_cache=True, priority=PRIORITY_INTERACTIVE):
+        """
+        Queues run_shortlist_analysis as a job and returns its id. Each finished resume
+        is reported as a finished task keyed by its doc_id; the final results map doc
+        ids to candidates in shortlist order. Shortlists are not saved to the store.
+        """
+        if self._stopping:
+            raise RuntimeError("The analysis engine has been shut down.")
+        return self._enqueue({
+            "kind": "shortlist", "index": index, "job_title": job_title, "job_description": job_description or "",
+            "mode": "shortlist", "top_k": top_k, "ranked": ranked, "max_workers": max_workers,
+            "token_budget": token_budget, "use_cache": use_cache, "priority": priority,
+        })
+
+    def _enqueue(self, params):
+        job = AnalysisJob(f"{next(self._sequence)}-{uuid.uuid4().hex[:12]}", params)
+        self._ensure_workers()
+        with self._jobs_lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"The analysis queue is full ({self._queue.maxsize} jobs waiting).") from None
+            self._jobs[job.id] = job
+            self._stats["submitted"] += 1
+        return job.id
+
+    def poll(self, job_id):
+        """Returns a snapshot of the job (see AnalysisJob.snapshot), or None for an unknown or expired id."""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def wait(self, job_id, timeout=None, interval=0.1):
+        """Polls until the job has finished or `timeout` seconds passed. Returns the last snapshot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.poll(job_id)
+            if snapshot is None or snapshot["status"] in FINISHED_STATES:
+                return snapshot
+            if deadline is not None and time.monotonic() >= deadline:
+                return snapshot
+            time.sleep(interval)
+
+    def cancel(self, job_id):
+        """Cancels a job that has not started yet. Returns True if it was cancelled."""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        with job.lock:
+            if job.status != JOB_QUEUED:
+                return False
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+            job.version += 1
+        self._finish(job)
+        return True
+
+    def stats(self):
+        """Returns queue depth, running jobs, worker count and job counters."""
+        with self._jobs_lock:
+            snapshot = dict(self._stats)
+            statuses = [job.status for job in self._jobs.values()]
+        snapshot["queue_depth"] = statuses.count(JOB_QUEUED)
+        snapshot["running"] = statuses.count(JOB_RUNNING)
+        snapshot["workers"] = len(self._threads)
+        snapshot["queue_capacity"] = self._queue.maxsize
+        return snapshot
+
+    def shutdown(self, wait=True):
+        """Stops the workers after the jobs already queued have run."""
+        with self._threads_lock:
+            self._stopping = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if job.status == JOB_QUEUED:
+                    self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job):
+        params = job.params
+        job.update(status=JOB_RUNNING, started_at=time.time())
+        get_default_metrics().observe("analysis_job_queue_seconds", job.started_at - job.created_at, mode=params["mode"])
+        try:
+            with notice_handler(job.on_notice):
+                if params["kind"] == "shortlist":
+                    candidates = run_shortlist_analysis(
+                        params["index"], params["job_title"], params["job_description"], top_k=params["top_k"],
+                        ranked=params["ranked"], max_workers=params["max_workers"], token_budget=params["token_budget"],
+                        on_candidate_done=job.on_task_done, use_cache=params["use_cache"], priority=params["priority"],
+                    )
+                    results, prompt_size_report = {candidate["doc_id"]: candidate for candidate in candidates}, {}
+                else:
+                    results, prompt_size_report = run_analysis(
+                        params["resume_text"], params["job_title"], params["job_description"], mode=params["mode"],
+                        max_workers=params["max_workers"], token_budget=params["token_budget"],
+                        enrich_local=params["enrich_local"], on_task_done=job.on_task_done,
+                        on_partial=job.on_partial if params["stream"] else None,
+                        previous_results=params["previous_results"], use_cache=params["use_cache"], priority=params["priority"],
+                    )
+            analysis_id = self._save(job, results) if params["kind"] == "analysis" else None
+            job.update(status=JOB_DONE, results=results, partials={}, prompt_size_report=prompt_size_report,
+                       analysis_id=analysis_id, finished_at=time.time())
+        except Exception as e: # the engine must outlive any one analysis
+            job.update(status=JOB_FAILED, error=f"Unexpected error while running the analysis: {e}", finished_at=time.time())
+        get_default_metrics().observe("analysis_job_seconds", job.finished_at - job.started_at,
+                                      mode=params["mode"], status=job.status)
+        try:
+            export_metrics_from_env()
+        except OSError as e:
+            print(f"Could not write the metrics file: {e}")
+        self._finish(job)
+
+    def _save(self, job, results):
+        store = get_default_store() if self.save_results else None
+        if store is None:
+            return None
+        params = job.params
+        metadata = dict(params["metadata"], analysis_mode=params["mode"], enrich_local_analysis=params["enrich_local"],
+                        prompt_token_budget=params["token_budget"])
+        try:
+            return store.save_analysis(params["resume_text"], params["job_title"], params["job_description"], results,
+                                       metadata=metadata)
+        except Exception as e: # a failed save should not fail the analysis
+            job.on_notice("warning", f"The analysis could not be saved for later: {e}")
+            return None
+
+    def _finish(self, job):
+        with self._jobs_lock:
+            self._stats[job.status] += 1
+            finished = [job_id for job_id, item in self._jobs.items() if item.status in FINISHED_STATES]
+            for job_id in finished[:max(0, len(finished) - self.finished_jobs_kept)]:
+                del self._jobs[job_id]
+
+
+# --- Stand-in model backend ---
+class _StandInResponse:
+    """Mimics a (streamed or not) GenerateContentResponse: .text, iteration over chunks, usage_metadata."""
+
+    def __init__(self, text, chunk_size=None, delay=0.0):
+        self.text = text
+        self.usage_metadata = None
+        self._chunk_size = chunk_size
+        self._delay = delay
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self._chunk_size or len(self.text) or 1):
+            if self._delay:
+                time.sleep(self._delay)
+            yield _StandInResponse(self.text[start:start + (self._chunk_size or len(self.text))])
+
+
+def _placeholder_value(field_type):
+    return {list: ["Stand-in item"], dict: {}, int: 50, str: "Stand-in text"}.get(field_type, "Stand-in text")
+
+
+def stand_in_response_text():
+    """
+    A JSON answer that satisfies every task's schema at once: each task's fields at
+    the top level (for the standalone prompts) and under each task key (for the
+    combined prompt).
+    """
+    answer = {}
+    for key, schema in RESULT_SCHEMAS.items():
+        fields = {field: _placeholder_value(field_type) for field, field_type in schema.items()}
+        answer.update(fields)
+        answer[key] = fields
+    return json.dumps(answer, indent=2)
+
+
+class StandInModel:
+    """
+    Offline replacement for genai.GenerativeModel, for running the engine locally:
+
+        utils.set_model_factory(lambda name: StandInModel(latency=0.5))
+
+    Answers every prompt with `respond(prompt)` if given, otherwise with
+    stand_in_response_text(), after `latency` seconds (spread over the chunks when streaming).
+    With `context_caching` it also stands in for Gemini context caching (see
+    utils.shared_context); `cached_contexts` lists the cached models not yet deleted.
+    """
+
+    def __init__(self, model_name=None, latency=0.0, respond=None, stream_chunks=8, context_caching=True):
+        self.model_name = model_name
+        self.latency = latency
+        self.respond = respond
+        self.stream_chunks = max(1, stream_chunks)
+        self.context_caching = context_caching
+        self.calls = 0
+        self.cached_contexts = []
+        self._lock = threading.Lock()
+
+    def cache_context(self, context, ttl_seconds=None):
+        """
+        Returns (model, delete) like utils._create_context_cache: the model answers each
+        prompt as `respond(context + prompt)` would. Raises NotImplementedError without
+        `context_caching`, so the caller falls back to sending the context with each prompt.
+        """
+        if not self.context_caching:
+            raise NotImplementedError("context caching is turned off for this stand-in model")
+        respond = (lambda prompt: self.respond(context_prompt(context, prompt))) if self.respond else None
+        cached_model = StandInModel(self.model_name, self.latency, respond, self.stream_chunks, context_caching=False)
+        with self._lock:
+            self.cached_contexts.append(cached_model)
+
+        def delete():
+            with self._lock:
+                self.cached_contexts.remove(cached_model)
+        return cached_model, delete
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        with self._lock:
+            self.calls += 1
+        text = self.respond(prompt) if self.respond else stand_in_response_text()
+        if stream:
+            chunk_size = max(1, -(-len(text) // self.stream_chunks))
+            return _StandInResponse(text, chunk_size=chunk_size, delay=self.latency / self.stream_chunks)
+        if self.latency:
+            time.sleep(self.latency)
+        return _StandInResponse(text)
+
+
+# --- Process-wide default engine ---
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+def get_default_engine():
+    """Returns the shared engine used by the app, creating it on first use."""
+    global _default_engine
+    with _default_engine_lock:
+        if _default_engine is None:
+            _default_engine = AnalysisEngine()
+        return _default_engine
+
+def set_default_engine(engine):
+    """Replaces the shared engine (e.g. with a different worker count)."""
+    global _default_engine
+    with _default_engine_lock:
+        _default_engine = engine
@@ -0,0 +1,254 @@
+# ai_resume_analyzer/analysis_store.py
+"""
+Persistent store for finished analyses.
+
+Each analysis is saved under (resume hash, job title, job description hash) in an
+SQLite file (WAL mode, so several Streamlit worker processes can share it). The
+resume text, the job description and every task result are stored as zlib-compressed
+JSON, so a returning user can reload earlier results without any Gemini call, and
+all analyses of one resume can be listed as its history.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+
+def text_hash(text):
+    """Returns the SHA-256 hex digest of a (resume or job description) text."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def normalize_job_title(job_title):
+    """Job titles are matched case-insensitively and ignoring extra whitespace."""
+    return " ".join((job_title or "").split()).casefold()
+
+
+def encode_value(value):
+    """Compact JSON, zlib-compressed."""
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_value(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class AnalysisStore:
+    """
+    Saves and loads analyses in a single SQLite file. Each operation uses its own
+    short-lived connection, as SQLiteCache does.
+
+        analysis_id = store.save_analysis(resume_text, job_title, job_description, results)
+        saved = store.find_analysis(resume_text, job_title, job_description)
+    """
+
+    def __init__(self, path, max_analyses_per_resume=20):
+        self.path = path
+        self.max_analyses_per_resume = max_analyses_per_resume
+        self._stats_lock = threading.Lock()
+        self._stats = {"saves": 0, "loads": 0, "misses": 0, "raw_bytes": 0, "stored_bytes": 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resumes ("
+                " resume_hash TEXT PRIMARY KEY,"
+                " text BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " resume_hash TEXT NOT NULL REFERENCES resumes(resume_hash),"
+                " job_title TEXT NOT NULL,"
+                " job_title_key TEXT NOT NULL,"
+                " jd_hash TEXT NOT NULL,"
+                " job_description BLOB NOT NULL,"
+                " metadata BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analyses_lookup"
+                " ON analyses(resume_hash, job_title_key, jd_hash, created_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_results ("
+                " analysis_id INTEGER NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,"
+                " task_key TEXT NOT NULL,"
+                " result BLOB NOT NULL,"
+                " PRIMARY KEY (analysis_id, task_key))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn: # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _encode(self, value):
+        blob = encode_value(value)
+        self._count("raw_bytes", len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")))
+        self._count("stored_bytes", len(blob))
+        return blob
+
+    def save_analysis(self, resume_text, job_title, job_description, results, metadata=None):
+        """
+        Stores the results of one analysis and returns its id. Results that are
+        errors are left out so that a reload never shows a failed task as final.
+        Only the newest `max_analyses_per_resume` analyses of a resume are kept.
+        """
+        now = time.time()
+        resume_hash = text_hash(resume_text)
+        stored_results = {
+            key: result for key, result in results.items()
+            if not (isinstance(result, dict) and "error" in result)
+        }
+        with self._connect() as conn:
+            updated = conn.execute("UPDATE resumes SET last_used = ? WHERE resume_hash = ?", (now, resume_hash)).rowcount
+            if not updated:
+                conn.execute(
+                    "INSERT INTO resumes (resume_hash, text, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (resume_hash, self._encode(resume_text), now, now),
+                )
+            analysis_id = conn.execute(
+                "INSERT INTO analyses (resume_hash, job_title, job_title_key, jd_hash, job_description, metadata, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (resume_hash, job_title or "", normalize_job_title(job_title), text_hash(job_description),
+                 self._encode(job_description or ""), self._encode(metadata or {}), now),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO analysis_results (analysis_id, task_key, result) VALUES (?, ?, ?)",
+                [(analysis_id, key, self._encode(result)) for key, result in stored_results.items()],
+            )
+            if self.max_analyses_per_resume:
+                conn.execute(
+                    "DELETE FROM analyses WHERE resume_hash = ? AND id NOT IN"
+                    " (SELECT id FROM analyses WHERE resume_hash = ? ORDER BY created_at DESC, id DESC LIMIT ?)",
+                    (resume_hash, resume_hash, self.max_analyses_per_resume),
+                )
+        self._count("saves")
+        return analysis_id
+
+    def find_analysis(self, resume_text, job_title, job_description=""):
+        """Returns the newest saved analysis for this resume, job title and job description, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM analyses WHERE resume_hash = ? AND job_title_key = ? AND jd_hash = ?"
+                " ORDER BY created_at DESC, id DESC LIMIT 1",
+                (text_hash(resume_text), normalize_job_title(job_title), text_hash(job_description)),
+            ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        return self.load_analysis(row[0])
+
+    def load_analysis(self, analysis_id):
+        """
+        Returns a saved analysis as a dict with id, resume_hash, job_title,
+        job_description, metadata, created_at and results (task key -> result), or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, resume_hash, job_title, job_description, metadata, created_at FROM analyses WHERE id = ?",
+                (analysis_id,),
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            result_rows = conn.execute(
+                "SELECT task_key, result FROM analysis_results WHERE analysis_id = ?", (analysis_id,)
+            ).fetchall()
+            conn.execute("UPDATE resumes SET last_used = ? WHERE resume_hash = ?", (time.time(), row[1]))
+        self._count("loads")
+        return {
+            "id": row[0], "resume_hash": row[1], "job_title": row[2],
+            "job_description": decode_value(row[3]), "metadata": decode_value(row[4]), "created_at": row[5],
+            "results": {key: decode_value(blob) for key, blob in result_rows},
+        }
+
+    def load_resume_text(self, resume_hash):
+        """Returns the stored resume text for a resume hash, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT text FROM resumes WHERE resume_hash = ?", (resume_hash,)).fetchone()
+        return decode_value(row[0]) if row else None
+
+    def history(self, resume_text, limit=20):
+        """Lists the saved analyses of a resume, newest first, without loading their results."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT a.id, a.job_title, a.jd_hash, a.created_at, COUNT(r.task_key)"
+                " FROM analyses a LEFT JOIN analysis_results r ON r.analysis_id = a.id"
+                " WHERE a.resume_hash = ? GROUP BY a.id ORDER BY a.created_at DESC, a.id DESC LIMIT ?",
+                (text_hash(resume_text), limit),
+            ).fetchall()
+        empty_jd_hash = text_hash("")
+        return [
+            {"id": row[0], "job_title": row[1], "has_job_description": row[2] != empty_jd_hash,
+             "created_at": row[3], "task_count": row[4]}
+            for row in rows
+        ]
+
+    def delete_analysis(self, analysis_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM analyses WHERE id = ?", (analysis_id,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM analyses")
+            conn.execute("DELETE FROM resumes")
+
+    def stats(self):
+        """Returns entry counts, save/load counters and the compression ratio of values written so far."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        with self._connect() as conn:
+            snapshot["resumes"] = conn.execute("SELECT COUNT(*) FROM resumes").fetchone()[0]
+            snapshot["analyses"] = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        snapshot["compression_ratio"] = (
+            round(snapshot["stored_bytes"] / snapshot["raw_bytes"], 3) if snapshot["raw_bytes"] else 0.0
+        )
+        return snapshot
+
+
+# --- Process-wide default store ---
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def create_store_from_env():
+    """
+    Builds a store from ANALYSIS_STORE_PATH and ANALYSIS_STORE_MAX_PER_RESUME.
+    Returns None when ANALYSIS_STORE_PATH is set to "none".
+    """
+    path = os.getenv("ANALYSIS_STORE_PATH", os.path.join(".cache", "analysis_store.sqlite3"))
+    if path.lower() == "none":
+        return None
+    return AnalysisStore(path, max_analyses_per_resume=int(os.getenv("ANALYSIS_STORE_MAX_PER_RESUME", "20")))
+
+def get_default_store():
+    """Returns the shared analysis store (or None if disabled), creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = create_store_from_env()
+        return _default_store
+
+def set_default_store(store):
+    """Replaces the shared analysis store."""
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
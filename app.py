@@ -1,18 +1,23 @@
 # ai_resume_analyzer/app.py
 import streamlit as st
 from utils import (
-    extract_text_from_pdf, extract_text_from_txt,
-    get_gemini_response, load_api_key,
-    format_extracted_details, format_analysis, format_suggestions,
-    format_job_match, format_skill_gap, format_ats_check, format_grammar_check
-)
-from prompts import (
-    EXTRACT_PROMPT_TEMPLATE, ANALYSIS_PROMPT_TEMPLATE,
-    IMPROVEMENT_SUGGESTIONS_PROMPT_TEMPLATE, JOB_MATCH_PROMPT_TEMPLATE,
-    SKILL_GAP_PROMPT_TEMPLATE, ATS_CHECK_PROMPT_TEMPLATE,
-    GRAMMAR_CLARITY_PROMPT_TEMPLATE
+    extract_resume_text, file_digest, load_api_key,
+    measure_prompt_compaction, measure_contact_prefill, in_flight_stats, LOCAL_ANALYSIS_KEYS, gemini_task_keys,
+    DEFAULT_MAX_PARALLEL_TASKS, RESULT_FORMATTERS,
+    result_fingerprint, render_result, build_export_file, task_fingerprints, reusable_results
 )
+from analysis_engine import get_default_engine, QueueFullError, DEFAULT_SHORTLIST_SIZE, FINISHED_STATES, JOB_DONE, JOB_QUEUED
+from analysis_store import get_default_store
+from resume_index import ResumeIndex, get_default_index, index_path_from_env
+from llm_cache import get_default_cache
+from llm_json import repair_stats
+from metrics import get_default_metrics
+from rate_limiter import get_default_scheduler
+from text_compaction import DEFAULT_PROMPT_TOKEN_BUDGET
 import os # For clearing API key from env if needed
+import sqlite3
+import time
+from datetime import datetime
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -22,6 +27,11 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+ANALYSIS_MODES = ["Parallel requests", "Combined single call", "Extraction-first pipeline"]
+ENGINE_MODES = dict(zip(ANALYSIS_MODES, ("parallel", "combined", "pipeline"))) # see analysis_engine.ANALYSIS_MODES
+JOB_POLL_INTERVAL_SECONDS = 0.25
+RANKING_LIST_SIZE = 50 # indexed resumes listed in recruiter mode
+
 # --- Initialize session state ---
 if "resume_text" not in st.session_state:
     st.session_state.resume_text = None
@@ -29,6 +39,20 @@ if "api_key_loaded" not in st.session_state:
     st.session_state.api_key_loaded = False
 if "analysis_results" not in st.session_state:
     st.session_state.analysis_results = {}
+if "analysis_fingerprints" not in st.session_state:
+    st.session_state.analysis_fingerprints = {} # result key -> fingerprint, for the render cache
+if "analysis_input_fingerprints" not in st.session_state:
+    st.session_state.analysis_input_fingerprints = {} # result key -> fingerprint of the inputs it was computed from
+if "analysis_job_id" not in st.session_state:
+    st.session_state.analysis_job_id = None # the engine job this session is waiting for
+if "recruiter_ranking" not in st.session_state:
+    st.session_state.recruiter_ranking = None # last ranking of the resume index (recruiter mode)
+if "resume_index" not in st.session_state:
+    # Shared by every session only when the operator sets RESUME_INDEX_PATH; otherwise the
+    # resumes a user indexes stay in this session and are not ranked or listed for others.
+    st.session_state.resume_index = None if index_path_from_env() else ResumeIndex()
+if "recruiter_job_id" not in st.session_state:
+    st.session_state.recruiter_job_id = None
 if "show_api_key_input" not in st.session_state:
     st.session_state.show_api_key_input = True
 
@@ -84,21 +108,29 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Upload your Resume (PDF or TXT)", type=["pdf", "txt"], key="resume_upload")
     
     if uploaded_file:
-        file_type = uploaded_file.type
-        with st.spinner(f"Extracting text from {uploaded_file.name}..."):
-            if file_type == "application/pdf":
-                st.session_state.resume_text = extract_text_from_pdf(uploaded_file)
-            elif file_type == "text/plain":
-                st.session_state.resume_text = extract_text_from_txt(uploaded_file)
-            
-            if st.session_state.resume_text and "Error extracting" in st.session_state.resume_text:
-                st.error(st.session_state.resume_text)
-                st.session_state.resume_text = None
-            elif not st.session_state.resume_text or st.session_state.resume_text.strip() == "Could not extract any text from PDF.":
-                 st.error("Could not extract any text from the uploaded file or the file is empty.")
-                 st.session_state.resume_text = None
+        # Streamlit reruns this script on every widget change; only re-extract when the file itself changed.
+        file_bytes = uploaded_file.getvalue()
+        uploaded_digest = file_digest(file_bytes)
+        if st.session_state.get("resume_digest") != uploaded_digest:
+            with st.spinner(f"Extracting text from {uploaded_file.name}..."):
+                extracted_text, pdf_stats = extract_resume_text(file_bytes, uploaded_file.type, digest=uploaded_digest)
+            upload_messages = []
+            if extracted_text and "Error extracting" in extracted_text:
+                upload_messages.append(("error", extracted_text))
+                extracted_text = None
+            elif not extracted_text or extracted_text.strip() == "Could not extract any text from PDF.":
+                upload_messages.append(("error", "Could not extract any text from the uploaded file or the file is empty."))
+                extracted_text = None
             else:
-                st.success(f"Resume '{uploaded_file.name}' uploaded and text extracted!")
+                upload_messages.append(("success", f"Resume '{uploaded_file.name}' uploaded and text extracted!"))
+                if pdf_stats.get("stopped_early"):
+                    upload_messages.append(("warning", f"Only part of the PDF was read: stopped at the {pdf_stats['stopped_early']}."))
+            st.session_state.resume_text = extracted_text
+            st.session_state.resume_digest = uploaded_digest
+            st.session_state.resume_upload_messages = upload_messages
+
+        for level, message in st.session_state.get("resume_upload_messages", []):
+            getattr(st, level)(message)
 
     st.markdown("---")
     # The `value` argument retrieves from session_state if it exists, otherwise uses default.
@@ -115,6 +147,181 @@ with st.sidebar:
         key="jd_input", 
         value=st.session_state.get("jd_input", "")
     )
+    with st.expander("⚙️ Advanced Settings"):
+        max_parallel_tasks = st.slider(
+            "Parallel AI requests",
+            min_value=1, max_value=8,
+            value=st.session_state.get("max_parallel_tasks", DEFAULT_MAX_PARALLEL_TASKS),
+            key="max_parallel_tasks",
+            help="How many analysis tasks are sent to Gemini at the same time. Lower this if you hit rate limits."
+        )
+        use_response_cache = st.checkbox(
+            "Reuse cached AI responses",
+            value=st.session_state.get("use_response_cache", True),
+            key="use_response_cache",
+            help="Identical prompts (same resume, job title and job description) are answered from the cache instead of calling Gemini again."
+        )
+        analysis_mode = st.radio(
+            "Analysis mode",
+            ANALYSIS_MODES,
+            index=ANALYSIS_MODES.index(st.session_state.get("analysis_mode", ANALYSIS_MODES[0])),
+            key="analysis_mode",
+            help=(
+                "Parallel: one request per analysis. "
+                "Combined: send the resume once in one request; sections that fail are retried individually. "
+                "Extraction-first: extract the resume details first, then send those compact details instead of the full text to the role-specific analyses."
+            )
+        )
+        prompt_token_budget = st.number_input(
+            "Max tokens per prompt (0 = no limit)",
+            min_value=0, step=500,
+            value=st.session_state.get("prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET),
+            key="prompt_token_budget",
+            help="Long resumes are cleaned up and trimmed section by section (least important sections first) so that each prompt stays under this estimated size."
+        )
+        enrich_local_analysis = st.checkbox(
+            "Enrich ATS & skill gap with Gemini",
+            value=st.session_state.get("enrich_local_analysis", False),
+            key="enrich_local_analysis",
+            help="The ATS check and skill gap are computed instantly on this machine. Turn this on to also ask Gemini and merge its answers in."
+        )
+        reuse_unchanged_results = st.checkbox(
+            "Only re-run what changed",
+            value=st.session_state.get("reuse_unchanged_results", True),
+            key="reuse_unchanged_results",
+            help="When you analyze again, results whose inputs did not change are kept: a new job title keeps the extracted details and the grammar check."
+        )
+        stream_results = st.checkbox(
+            "Show results as they arrive",
+            value=st.session_state.get("stream_results", True),
+            key="stream_results",
+            help="Stream each AI response and fill in the tabs item by item instead of waiting for every task to finish. Only used in parallel mode."
+        )
+        cache_stats = get_default_cache().stats()
+        st.caption(
+            f"Response cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits / {cache_stats['misses']} misses; "
+            f"{in_flight_stats()['coalesced']} duplicate in-flight requests shared"
+        )
+        json_repairs = repair_stats()
+        repaired = sum(count for name, count in json_repairs.items() if name not in ("strict", "failed"))
+        st.caption(f"JSON responses: {json_repairs.get('strict', 0)} clean, {repaired} repaired locally, {json_repairs.get('failed', 0)} unusable")
+        scheduler_stats = get_default_scheduler().stats()
+        st.caption(
+            f"Gemini queue: {scheduler_stats['queue_depth']} waiting, {scheduler_stats['acquired']} sent, "
+            f"average wait {scheduler_stats['avg_wait_seconds']}s (max {scheduler_stats['max_wait_seconds']}s), "
+            f"{scheduler_stats['quota_errors']} quota errors"
+        )
+        engine_stats = get_default_engine().stats()
+        st.caption(
+            f"Analysis jobs: {engine_stats['running']} running, {engine_stats['queue_depth']} queued "
+            f"(capacity {engine_stats['queue_capacity']}), {engine_stats['done']} done, {engine_stats['failed']} failed"
+        )
+        if st.button("Clear Response Cache"):
+            get_default_cache().clear()
+            st.info("Response cache cleared.")
+        show_diagnostics = st.checkbox(
+            "Show diagnostics",
+            value=st.session_state.get("show_diagnostics", False),
+            key="show_diagnostics",
+            help="Timings per analysis task and Gemini attempt (queue, generation, parse), token counts, retries and cache hits for this server process."
+        )
+
+    if show_diagnostics:
+        with st.expander("📈 Diagnostics", expanded=True):
+            metric_rows = get_default_metrics().summary()
+            if metric_rows:
+                st.dataframe(
+                    [
+                        {"Metric": row["name"], "Labels": ", ".join(f"{k}={v}" for k, v in sorted(row["labels"].items())),
+                         "Count": row.get("count", row.get("value")), "p50": row.get("p50"), "p95": row.get("p95"), "Max": row.get("max")}
+                        for row in metric_rows
+                    ],
+                    use_container_width=True, hide_index=True
+                )
+                st.download_button("Download metrics (Prometheus text)", get_default_metrics().prometheus_text(),
+                                   file_name="resume_analyzer_metrics.prom", mime="text/plain", key="download_metrics")
+            else:
+                st.caption("No metrics recorded yet. Run an analysis first.")
+
+    # Earlier analyses of this resume are reloaded from disk without calling Gemini.
+    analysis_store = get_default_store()
+    if analysis_store and st.session_state.resume_text:
+        try:
+            saved_analyses = analysis_store.history(st.session_state.resume_text)
+        except sqlite3.Error as e:
+            saved_analyses = []
+            st.warning(f"Could not read saved analyses: {e}")
+        if saved_analyses:
+            with st.expander(f"🗂️ Saved Analyses ({len(saved_analyses)})"):
+                def load_saved_analysis(analysis_id):
+                    saved = analysis_store.load_analysis(analysis_id)
+                    if saved is None:
+                        return
+                    # Runs before the widgets are created, so their values can be set here.
+                    st.session_state.job_title_input = saved["job_title"]
+                    st.session_state.jd_input = saved["job_description"]
+                    st.session_state.analysis_results = saved["results"]
+                    st.session_state.analysis_fingerprints = {
+                        key: result_fingerprint(result) for key, result in saved["results"].items()
+                    }
+                    metadata = saved["metadata"] or {}
+                    st.session_state.analysis_input_fingerprints = task_fingerprints(
+                        st.session_state.resume_text, saved["job_title"], saved["job_description"],
+                        mode=metadata.get("analysis_mode", "parallel"),
+                        token_budget=metadata.get("prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET),
+                        enrich_local=metadata.get("enrich_local_analysis", False),
+                    )
+                    st.session_state.loaded_analysis_id = analysis_id
+
+                labels = {
+                    entry["id"]: (
+                        f"{entry['job_title']} ({'with' if entry['has_job_description'] else 'no'} JD) - "
+                        f"{datetime.fromtimestamp(entry['created_at']):%Y-%m-%d %H:%M}"
+                    )
+                    for entry in saved_analyses
+                }
+                selected_analysis_id = st.selectbox(
+                    "Previous analyses of this resume",
+                    list(labels), format_func=labels.get, key="saved_analysis_choice"
+                )
+                st.button("Load Saved Analysis", key="load_saved_analysis",
+                          on_click=load_saved_analysis, args=(selected_analysis_id,), use_container_width=True,
+                          help="Shows the stored results without sending anything to Gemini.")
+                if st.session_state.get("loaded_analysis_id") in labels:
+                    st.caption(f"Showing saved analysis: {labels[st.session_state.loaded_analysis_id]}")
+
+    # Recruiter mode: many resumes in a local index, ranked against the job without any Gemini call.
+    resume_index = st.session_state.resume_index if st.session_state.resume_index is not None else get_default_index()
+    with st.expander("👥 Recruiter Mode"):
+        index_uploads = st.file_uploader(
+            "Add resumes to the index (PDF or TXT)", type=["pdf", "txt"], accept_multiple_files=True, key="index_upload"
+        )
+        if index_uploads and st.button("Add to Index", key="add_to_index", use_container_width=True):
+            indexed_documents, unreadable_files = [], []
+            with st.spinner(f"Indexing {len(index_uploads)} resume(s)..."):
+                for index_upload in index_uploads:
+                    index_bytes = index_upload.getvalue()
+                    index_text, _ = extract_resume_text(index_bytes, index_upload.type, digest=file_digest(index_bytes))
+                    if not index_text or "Error extracting" in index_text or index_text.strip() == "Could not extract any text from PDF.":
+                        unreadable_files.append(index_upload.name)
+                    else:
+                        indexed_documents.append({"resume_text": index_text, "name": index_upload.name})
+                resume_index.add_many(indexed_documents)
+            st.success(f"Indexed {len(indexed_documents)} resume(s).")
+            if unreadable_files:
+                st.warning(f"No text could be extracted from: {', '.join(unreadable_files)}")
+        if st.session_state.resume_text and st.button("Add Current Resume to Index", key="add_current_to_index", use_container_width=True):
+            resume_index.add_resume(st.session_state.resume_text, name=uploaded_file.name if uploaded_file else None)
+            st.success("Current resume indexed.")
+        shortlist_size = st.number_input(
+            "Shortlist size", min_value=1, max_value=50,
+            value=st.session_state.get("shortlist_size", DEFAULT_SHORTLIST_SIZE), key="shortlist_size",
+            help="Only this many of the best-ranked resumes are sent to Gemini for the job match and skill gap."
+        )
+        indexed_count = len(resume_index)
+        st.caption(f"{indexed_count} resume(s) indexed. Ranking runs on this machine; paste a job description for best results.")
+        rank_button = st.button("🔎 Rank Indexed Resumes", key="rank_indexed", use_container_width=True,
+                                disabled=not (indexed_count and job_title))
     st.markdown("---")
     
     # THESE LINES WERE THE PROBLEM AND ARE NOW REMOVED:
@@ -136,56 +343,213 @@ with st.sidebar:
 st.title("📄 AI-Powered Resume Analysis")
 
 if analyze_button and not analyze_button_disabled:
-    st.session_state.analysis_results = {} 
-    with st.spinner("🤖 AI is analyzing your resume... This might take a few moments!"):
-        # Use the current value of job_title and job_description from the widgets
-        current_job_title_for_analysis = st.session_state.get("job_title_input", "") 
-        current_jd_for_analysis = st.session_state.get("jd_input", "")
-
-        analysis_tasks = [
-            ("extracted_details", EXTRACT_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text)),
-            ("strengths_weaknesses_missing", ANALYSIS_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text, job_title=current_job_title_for_analysis)),
-            ("improvement_suggestions", IMPROVEMENT_SUGGESTIONS_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text, job_title=current_job_title_for_analysis)),
-            ("job_match", JOB_MATCH_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text, job_title=current_job_title_for_analysis, job_description_section=f"Job Description:\n```\n{current_jd_for_analysis}\n```" if current_jd_for_analysis else "No job description provided.")),
-            ("ats_check", ATS_CHECK_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text, job_title=current_job_title_for_analysis)),
-            ("grammar_clarity", GRAMMAR_CLARITY_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text))
-        ]
-        if current_jd_for_analysis:
-            analysis_tasks.insert(4, ("skill_gap", SKILL_GAP_PROMPT_TEMPLATE.format(resume_text=st.session_state.resume_text, jd_text=current_jd_for_analysis, job_title=current_job_title_for_analysis)))
-        else:
-             st.session_state.analysis_results["skill_gap"] = {"info": "Job description not provided for skill gap analysis."}
+    # Use the current value of job_title and job_description from the widgets
+    current_job_title_for_analysis = st.session_state.get("job_title_input", "")
+    current_jd_for_analysis = st.session_state.get("jd_input", "")
+    input_fingerprints = task_fingerprints(
+        st.session_state.resume_text, current_job_title_for_analysis, current_jd_for_analysis,
+        mode=ENGINE_MODES[analysis_mode], token_budget=prompt_token_budget, enrich_local=enrich_local_analysis,
+    )
+    previous_results = reusable_results(
+        st.session_state.analysis_results, st.session_state.analysis_input_fingerprints, input_fingerprints
+    ) if reuse_unchanged_results else {}
+    st.session_state.analysis_results = {}
+    try:
+        # The analysis runs on the engine's worker threads; this session only polls it.
+        st.session_state.analysis_job_id = get_default_engine().submit(
+            st.session_state.resume_text, current_job_title_for_analysis, current_jd_for_analysis,
+            mode=ENGINE_MODES[analysis_mode], max_workers=max_parallel_tasks, token_budget=prompt_token_budget,
+            enrich_local=enrich_local_analysis, stream=stream_results and analysis_mode == "Parallel requests",
+            use_cache=use_response_cache, previous_results=previous_results,
+        )
+        st.session_state.analysis_job_context = {
+            "job_title": current_job_title_for_analysis, "job_description": current_jd_for_analysis,
+            "skip_keys": () if enrich_local_analysis else LOCAL_ANALYSIS_KEYS, "token_budget": prompt_token_budget,
+            "input_fingerprints": input_fingerprints, "reused_tasks": list(previous_results),
+            "gemini_tasks": gemini_task_keys(
+                current_jd_for_analysis,
+                skip_keys=tuple(previous_results) + (() if enrich_local_analysis else LOCAL_ANALYSIS_KEYS),
+            ),
+        }
+    except QueueFullError as e:
+        st.error(f"{e} Please try again in a moment.")
 
+# Keeps polling a running analysis across reruns: any widget interaction ends this loop,
+# the job keeps running, and the next run picks it up again.
+if st.session_state.get("analysis_job_id"):
+    engine = get_default_engine()
+    job_id = st.session_state.analysis_job_id
+    job_context = st.session_state.analysis_job_context
+    with st.spinner("🤖 AI is analyzing your resume... This might take a few moments!"):
+        progress_area = st.empty()
+        live_area = st.empty()
+        shown_version = -1
+        job = engine.poll(job_id)
+        while job is not None and job["status"] not in FINISHED_STATES:
+            if job["version"] != shown_version:
+                shown_version = job["version"]
+                with progress_area.container():
+                    if job["status"] == JOB_QUEUED:
+                        st.write("Waiting for a free analysis worker...")
+                    else:
+                        reused_tasks = job_context.get("reused_tasks", [])
+                        if reused_tasks:
+                            st.write(f"Kept {len(reused_tasks)} unchanged result(s); sending "
+                                     f"{len(job_context['gemini_tasks'])} task(s) whose inputs changed to Gemini.")
+                        st.write(f"Running the {analysis_mode.lower()} analysis; finished: "
+                                 f"{', '.join(key.replace('_', ' ').title() for key in job['finished_tasks']) or 'none yet'}")
+                    for level, message in job["notices"]:
+                        getattr(st, level)(message)
+                live_results = {**{key: result for key, result in job["results"].items()
+                                   if key in RESULT_FORMATTERS and "error" not in result},
+                                **job["partials"]}
+                if live_results:
+                    # Live tabs: finished (or kept) results right away, streaming ones filled in item by item;
+                    # replaced by the full results view afterwards.
+                    with live_area.container():
+                        live_keys = list(live_results)
+                        live_tabs = st.tabs([key.replace('_', ' ').title() for key in live_keys])
+                        for i, key in enumerate(live_keys):
+                            live_tabs[i].markdown(RESULT_FORMATTERS[key](live_results[key]))
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
+            job = engine.poll(job_id)
+        progress_area.empty()
+        live_area.empty()
 
-        for key, prompt in analysis_tasks:
-            if key == "skill_gap" and not current_jd_for_analysis: 
-                continue
-            st.write(f"Processing: {key.replace('_', ' ').title()}...") 
-            result = get_gemini_response(prompt)
-            st.session_state.analysis_results[key] = result
+    st.session_state.analysis_job_id = None
+    if job is None:
+        st.error("The analysis is no longer available (the server may have restarted). Please run it again.")
+    elif job["status"] != JOB_DONE:
+        st.error(job["error"] or f"The analysis was {job['status']}.")
+    else:
+        for level, message in job["notices"]:
+            getattr(st, level)(message)
+        for key, result in job["results"].items():
             if isinstance(result, dict) and "error" in result:
                 st.error(f"Error during {key.replace('_', ' ').title()}: {result['error']}")
                 if result.get("raw_response"):
                     with st.expander("Show Raw Error Response"):
                         st.code(result["raw_response"], language='text')
+        st.session_state.analysis_results = job["results"]
+        st.session_state.analysis_fingerprints = {
+            key: result_fingerprint(result) for key, result in st.session_state.analysis_results.items()
+        }
+        st.session_state.analysis_input_fingerprints = job_context.get("input_fingerprints", {})
+        st.session_state.loaded_analysis_id = job["analysis_id"]
+        if job["prompt_size_report"]:
+            with st.expander("📉 Prompt size reduction (extracted details vs. full resume text)"):
+                st.table([
+                    {"Task": key.replace('_', ' ').title(), "Full text prompt (chars)": sizes["raw_chars"],
+                     "Compact prompt (chars)": sizes["compact_chars"], "Reduction (%)": sizes["reduction_pct"]}
+                    for key, sizes in job["prompt_size_report"].items()
+                ])
+        with st.expander("📏 Prompt sizes (before/after text compaction)"):
+            compaction = measure_prompt_compaction(st.session_state.resume_text, job_context["job_title"], job_context["job_description"],
+                                                   job_context["token_budget"], skip_keys=job_context["skip_keys"])
+            st.table([
+                {"Task": key.replace('_', ' ').title(), "Tokens before": sizes["tokens_before"], "Tokens after": sizes["tokens_after"],
+                 "Chars before": sizes["chars_before"], "Chars after": sizes["chars_after"]}
+                for key, sizes in compaction.items()
+            ])
+            st.caption("Each row is the text sent for that task: the shared resume context plus the task prompt.")
+            prefill = measure_contact_prefill(st.session_state.resume_text)
+            if prefill["applied"]:
+                st.caption(
+                    f"Name and contact details ({', '.join(prefill['fields_found'])}) were found locally in {prefill['local_ms']} ms. "
+                    f"The extraction prompt is {prefill['prompt_tokens_saved']} tokens shorter and its response about "
+                    f"{prefill['response_tokens_saved']} tokens shorter (roughly {prefill['estimated_seconds_saved']}s less generation)."
+                )
+            else:
+                st.caption("Name and contact details could not be found reliably on this machine, so Gemini extracts them.")
         st.success("Analysis Complete!")
 
 
+# --- Recruiter Mode ---
+if rank_button:
+    ranking_started = time.perf_counter()
+    st.session_state.recruiter_ranking = resume_index.search(job_description, job_title, top_k=RANKING_LIST_SIZE)
+    st.session_state.recruiter_context = {
+        "job_title": job_title, "job_description": job_description,
+        "search_ms": round((time.perf_counter() - ranking_started) * 1000, 1), "indexed": indexed_count,
+    }
+    st.session_state.recruiter_candidates = None
+
+if st.session_state.recruiter_ranking is not None:
+    recruiter_context = st.session_state.recruiter_context
+    st.header(f"👥 Ranked Candidates for '{recruiter_context['job_title']}'")
+    ranking = st.session_state.recruiter_ranking
+    if not ranking:
+        st.info("No indexed resume shares any term with this job. Try a longer job description.")
+    else:
+        st.caption(f"{recruiter_context['indexed']} indexed resume(s) ranked in {recruiter_context['search_ms']} ms (BM25, no AI calls).")
+        st.dataframe(
+            [
+                {"Rank": rank, "Resume": hit["name"], "Score": hit["score"],
+                 "Matching skills": ", ".join(hit["matched_skills"]), "Missing skills": ", ".join(hit["missing_skills"])}
+                for rank, hit in enumerate(ranking, 1)
+            ],
+            use_container_width=True, hide_index=True
+        )
+        if st.button(f"🎯 Job Match & Skill Gap for the Top {min(shortlist_size, len(ranking))}", key="run_shortlist",
+                     disabled=not st.session_state.api_key_loaded or bool(st.session_state.recruiter_job_id)):
+            try:
+                st.session_state.recruiter_job_id = get_default_engine().submit_shortlist(
+                    resume_index, recruiter_context["job_title"], recruiter_context["job_description"],
+                    top_k=shortlist_size, ranked=ranking, max_workers=max_parallel_tasks,
+                    token_budget=prompt_token_budget, use_cache=use_response_cache,
+                )
+                st.session_state.recruiter_candidates = None
+            except QueueFullError as e:
+                st.error(f"{e} Please try again in a moment.")
+
+    if st.session_state.recruiter_job_id:
+        engine = get_default_engine()
+        with st.spinner("🤖 Analyzing the shortlisted resumes..."):
+            shortlist_progress = st.empty()
+            job = engine.poll(st.session_state.recruiter_job_id)
+            while job is not None and job["status"] not in FINISHED_STATES:
+                shortlist_progress.write(f"{len(job['finished_tasks'])} of {min(shortlist_size, len(ranking))} resume(s) analyzed...")
+                time.sleep(JOB_POLL_INTERVAL_SECONDS)
+                job = engine.poll(st.session_state.recruiter_job_id)
+            shortlist_progress.empty()
+        st.session_state.recruiter_job_id = None
+        if job is None or job["status"] != JOB_DONE:
+            st.error((job or {}).get("error") or "The shortlist analysis did not finish. Please run it again.")
+        else:
+            for level, message in job["notices"]:
+                getattr(st, level)(message)
+            st.session_state.recruiter_candidates = list(job["results"].values())
+
+    for candidate in st.session_state.get("recruiter_candidates") or []:
+        match = candidate["job_match_percentage"]
+        with st.expander(f"{candidate['name']} - {'n/a' if match is None else f'{match:.0f}%'} match (index rank {candidate['index_rank']})"):
+            for key in ("job_match", "skill_gap"):
+                result = candidate["results"].get(key)
+                if isinstance(result, dict) and "info" in result:
+                    st.info(result["info"])
+                elif isinstance(result, dict) and "error" in result:
+                    st.error(f"Error during {key.replace('_', ' ').title()}: {result['error']}")
+                elif result:
+                    st.markdown(render_result(key, result))
+    st.markdown("---")
+
+
 # --- Display Results ---
 if st.session_state.analysis_results:
     tabs_config = [
-        {"title": "📝 Extracted Details", "key": "extracted_details", "formatter": format_extracted_details},
-        {"title": "📊 Strengths & Weaknesses", "key": "strengths_weaknesses_missing", "formatter": format_analysis, "job_title_context": True},
-        {"title": "💡 Improvement Suggestions", "key": "improvement_suggestions", "formatter": format_suggestions, "job_title_context": True},
-        {"title": "🎯 Job Match & Recommendations", "key": "job_match", "formatter": format_job_match, "job_title_context": True},
+        {"title": "📝 Extracted Details", "key": "extracted_details"},
+        {"title": "📊 Strengths & Weaknesses", "key": "strengths_weaknesses_missing", "job_title_context": True},
+        {"title": "💡 Improvement Suggestions", "key": "improvement_suggestions", "job_title_context": True},
+        {"title": "🎯 Job Match & Recommendations", "key": "job_match", "job_title_context": True},
     ]
     # Check if skill_gap analysis was performed and didn't just store an info message
     skill_gap_result = st.session_state.analysis_results.get("skill_gap")
     if skill_gap_result and not (isinstance(skill_gap_result, dict) and "info" in skill_gap_result):
-        tabs_config.append({"title": "↔️ Skill Gap (vs JD)", "key": "skill_gap", "formatter": format_skill_gap, "job_title_context": True})
+        tabs_config.append({"title": "↔️ Skill Gap (vs JD)", "key": "skill_gap", "job_title_context": True})
     
     tabs_config.extend([
-        {"title": "🤖 ATS Compatibility", "key": "ats_check", "formatter": format_ats_check, "job_title_context": True},
-        {"title": "✍️ Grammar & Clarity", "key": "grammar_clarity", "formatter": format_grammar_check},
+        {"title": "🤖 ATS Compatibility", "key": "ats_check", "job_title_context": True},
+        {"title": "✍️ Grammar & Clarity", "key": "grammar_clarity"},
         {"title": "📜 Full Resume Text", "key": "resume_text_display", "is_special": True}
     ])
 
@@ -204,35 +568,27 @@ if st.session_state.analysis_results:
             if tab_info.get("is_special") and tab_info["key"] == "resume_text_display":
                 if st.session_state.resume_text:
                     st.text_area("Resume Content", st.session_state.resume_text, height=400, disabled=True, key=f"resume_display_{i}")
-                    export_text = f"# Resume Analysis for: {current_job_title_display}\n\n"
-                    export_text += f"## Original Resume Text\n\n```\n{st.session_state.resume_text}\n```\n\n---\n\n"
-                    
-                    for res_key_export, res_data_export in st.session_state.analysis_results.items():
-                        # Find corresponding tab info for title and formatter
-                        export_tab_info = next((t for t in tabs_config if t["key"] == res_key_export), None)
-                        if not export_tab_info and res_key_export != "skill_gap": # skill_gap might not have a tab if no JD
-                            continue
-                        
-                        export_title = export_tab_info["title"] if export_tab_info else res_key_export.replace("_", " ").title()
-                        
-                        if isinstance(res_data_export, dict) and "info" in res_data_export : # Skip info messages
-                             export_text += f"## {export_title}\n\n{res_data_export['info']}\n\n---\n\n"
-                             continue
-                        
-                        if isinstance(res_data_export, dict) and "error" not in res_data_export:
-                            formatter_func = export_tab_info.get("formatter") if export_tab_info else None
-                            if formatter_func:
-                                export_text += f"## {export_title}\n\n{formatter_func(res_data_export)}\n\n---\n\n"
-                        elif isinstance(res_data_export, dict) and "error" in res_data_export:
-                            export_text += f"## {export_title}\n\nError: {res_data_export['error']}\nRaw: {res_data_export.get('raw_response', 'N/A')}\n\n---\n\n"
-
-                    st.download_button(
-                        label="📥 Download Full Analysis (Markdown)",
-                        data=export_text,
-                        file_name=f"resume_analysis_{current_job_title_display.replace(' ','_')}.md",
-                        mime="text/markdown",
-                        key=f"download_button_{i}"
-                    )
+                    # The export is only built when asked for, from the cached per-result markdown.
+                    export_fingerprint = result_fingerprint([current_job_title_display, st.session_state.resume_text,
+                                                             st.session_state.analysis_fingerprints])
+                    if st.session_state.get("export_fingerprint") != export_fingerprint:
+                        st.session_state.export_file = None
+                    if st.session_state.get("export_file") is None:
+                        if st.button("📄 Prepare Full Analysis Download", key=f"prepare_export_{i}"):
+                            section_titles = {t["key"]: t["title"] for t in tabs_config if not t.get("is_special")}
+                            st.session_state.export_file = build_export_file(
+                                current_job_title_display, st.session_state.resume_text, st.session_state.analysis_results,
+                                section_titles, st.session_state.analysis_fingerprints
+                            ).getvalue()
+                            st.session_state.export_fingerprint = export_fingerprint
+                    if st.session_state.get("export_file") is not None:
+                        st.download_button(
+                            label="📥 Download Full Analysis (Markdown)",
+                            data=st.session_state.export_file,
+                            file_name=f"resume_analysis_{current_job_title_display.replace(' ','_')}.md",
+                            mime="text/markdown",
+                            key=f"download_button_{i}"
+                        )
                 else:
                     st.info("Upload a resume to see its content here.")
             else: # Regular tabs
@@ -240,7 +596,7 @@ if st.session_state.analysis_results:
                 if res_data and isinstance(res_data, dict) and "info" in res_data:
                     st.info(res_data["info"])
                 elif res_data and isinstance(res_data, dict) and "error" not in res_data:
-                    st.markdown(tab_info["formatter"](res_data))
+                    st.markdown(render_result(tab_info["key"], res_data, st.session_state.analysis_fingerprints.get(tab_info["key"])))
                     if st.toggle(f"Show Raw JSON ({tab_info['title']})", key=f"toggle_json_{tab_info['key']}"):
                         st.json(res_data)
                 elif res_data and isinstance(res_data, dict) and "error" in res_data:
@@ -258,7 +614,7 @@ elif not analyze_button and st.session_state.resume_text:
     if st.session_state.resume_text:
         st.subheader("Preview of Extracted Resume Text:")
         st.text_area("", st.session_state.resume_text, height=300, disabled=True, key="resume_preview_main")
-else:
+elif st.session_state.recruiter_ranking is None:
     st.info("👋 Welcome! Please load your API key, upload your resume, and enter a job title in the sidebar to get started.")
 
 st.markdown("---")
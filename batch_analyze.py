@@ -0,0 +1,209 @@
+# ai_resume_analyzer/batch_analyze.py
+"""
+Headless batch analysis of a folder of resumes.
+
+Runs the same prompts as the Streamlit app against every PDF/TXT file in a folder,
+using a worker pool, and appends one JSON line per resume to the output file as soon
+as it finishes. Re-running with the same output file skips resumes that already
+completed successfully for the same job title and job description.
+
+Example:
+    python batch_analyze.py sample_resumes/ --job-title "Data Scientist" --jd-file jd.txt --output results.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analysis_engine import ANALYSIS_MODES, run_analysis
+from metrics import export_metrics_from_env, get_default_metrics
+from rate_limiter import PRIORITY_BATCH, get_default_scheduler
+from text_compaction import DEFAULT_PROMPT_TOKEN_BUDGET
+from utils import (
+    extract_text_from_pdf, extract_text_from_txt, load_api_key, measure_contact_prefill, DEFAULT_MAX_PARALLEL_TASKS
+)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def find_resumes(folder):
+    """Returns the supported resume files in `folder`, sorted by name."""
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))
+    )
+
+def load_completed(output_path):
+    """Reads an existing output file and returns the checkpoint keys of successful records."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # a partially written last line from an interrupted run
+            if record.get("status") == "ok":
+                completed.add(_checkpoint_key(record["file_sha256"], record["job_title"], record["jd_sha256"]))
+    return completed
+
+def _checkpoint_key(file_sha256, job_title, jd_sha256):
+    return (file_sha256, job_title, jd_sha256)
+
+def extract_resume_text(path):
+    """Extracts text from a resume file. Returns (text, error)."""
+    file_type = "application/pdf" if path.lower().endswith(".pdf") else "text/plain"
+    with open(path, "rb") as f, get_default_metrics().timer("resume_extraction_seconds", file_type=file_type):
+        if file_type == "application/pdf":
+            text = extract_text_from_pdf(f)
+        else:
+            text = extract_text_from_txt(f)
+    if text and "Error extracting" in text:
+        return None, text
+    if not text or not text.strip() or text.strip() == "Could not extract any text from PDF.":
+        return None, "Could not extract any text from the file or the file is empty."
+    return text, None
+
+def analyze_resume(path, file_sha256, job_title, job_description, task_workers=DEFAULT_MAX_PARALLEL_TASKS,
+                   mode="parallel", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, use_cache=True, enrich_local=False):
+    """
+    Runs every analysis task for one resume file and returns its output record.
+    Gemini calls use the batch priority, so they yield to interactive requests.
+    The ATS check and skill gap are computed locally unless `enrich_local` is set,
+    in which case Gemini's answers are merged in.
+    """
+    started = time.time()
+    record = {
+        "file": path,
+        "file_sha256": file_sha256,
+        "job_title": job_title,
+        "jd_sha256": _sha256(job_description.encode("utf-8")),
+    }
+    resume_text, error = extract_resume_text(path)
+    if error:
+        record.update(status="error", error=error, elapsed_seconds=round(time.time() - started, 3))
+        return record
+
+    results, prompt_sizes = run_analysis(resume_text, job_title, job_description, mode=mode, max_workers=task_workers,
+                                         token_budget=token_budget, enrich_local=enrich_local,
+                                         use_cache=use_cache, priority=PRIORITY_BATCH)
+    if mode == "pipeline":
+        record["prompt_sizes"] = prompt_sizes
+    record["contact_prefill"] = measure_contact_prefill(resume_text)
+
+    failed_tasks = [key for key, result in results.items() if isinstance(result, dict) and "error" in result]
+    record.update(
+        status="error" if failed_tasks else "ok",
+        failed_tasks=failed_tasks,
+        results=results,
+        elapsed_seconds=round(time.time() - started, 3),
+    )
+    return record
+
+def run_batch(folder, job_title, job_description, output_path, workers=4, task_workers=DEFAULT_MAX_PARALLEL_TASKS,
+              mode="parallel", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, use_cache=True, enrich_local=False):
+    """
+    Analyzes every resume in `folder` and appends records to `output_path` (JSON lines).
+    Resumes already completed for the same job context are skipped.
+    Returns a summary dict.
+    """
+    completed = load_completed(output_path)
+    jd_sha256 = _sha256(job_description.encode("utf-8"))
+
+    pending = []
+    skipped = 0
+    for path in find_resumes(folder):
+        with open(path, "rb") as f:
+            file_sha256 = _sha256(f.read())
+        if _checkpoint_key(file_sha256, job_title, jd_sha256) in completed:
+            skipped += 1
+            continue
+        pending.append((path, file_sha256))
+
+    print(f"{len(pending)} resume(s) to analyze, {skipped} already done.", file=sys.stderr)
+    summary = {"analyzed": 0, "failed": 0, "skipped": skipped}
+    write_lock = threading.Lock()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(analyze_resume, path, file_sha256, job_title, job_description,
+                            task_workers=task_workers, mode=mode, token_budget=token_budget, use_cache=use_cache,
+                            enrich_local=enrich_local): path
+            for path, file_sha256 in pending
+        }
+        try:
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"file": path, "status": "error", "error": f"Unexpected error: {e}"}
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush() # each finished resume is durable before the next one is reported
+                summary["analyzed" if record["status"] == "ok" else "failed"] += 1
+                print(f"[{record['status']}] {path} ({record.get('elapsed_seconds', 'n/a')}s)", file=sys.stderr)
+        except KeyboardInterrupt:
+            print("Interrupted: waiting for running resumes to stop; re-run to continue where this left off.", file=sys.stderr)
+            for future in futures:
+                future.cancel()
+            raise
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a folder of resumes with Gemini and write JSON lines.")
+    parser.add_argument("folder", help="Folder containing .pdf/.txt resumes (e.g. sample_resumes/)")
+    parser.add_argument("--job-title", required=True, help="Target job title")
+    parser.add_argument("--jd-file", help="Optional text file with the job description")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSON lines output file (appended to; also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="Resumes analyzed at the same time")
+    parser.add_argument("--task-workers", type=int, default=DEFAULT_MAX_PARALLEL_TASKS, help="Parallel Gemini calls per resume")
+    parser.add_argument("--mode", choices=ANALYSIS_MODES, default="parallel",
+                        help="parallel: one request per task; combined: one request per resume; pipeline: extract first, then send the compact details to the role-specific tasks")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET, help="Max estimated tokens per prompt (0 = no limit)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--enrich-local", action="store_true",
+                        help="Also ask Gemini for the ATS check and skill gap (computed locally by default) and merge its answers in")
+    parser.add_argument("--api-key", help="Gemini API key (defaults to GOOGLE_API_KEY_ENV from .env)")
+    args = parser.parse_args(argv)
+
+    # load_api_key looks at st.secrets, and Streamlit only logs noise when there is no running app.
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if not load_api_key(api_key_input=args.api_key):
+        parser.error("No Gemini API key found. Pass --api-key or set GOOGLE_API_KEY_ENV in .env.")
+
+    job_description = ""
+    if args.jd_file:
+        with open(args.jd_file, encoding="utf-8") as f:
+            job_description = f.read().strip()
+
+    summary = run_batch(
+        args.folder, args.job_title, job_description, args.output,
+        workers=args.workers, task_workers=args.task_workers,
+        mode=args.mode, token_budget=args.token_budget, use_cache=not args.no_cache, enrich_local=args.enrich_local,
+    )
+    print(f"Done: {summary['analyzed']} analyzed, {summary['failed']} failed, {summary['skipped']} skipped.", file=sys.stderr)
+    scheduler_stats = get_default_scheduler().stats()
+    print(f"Gemini requests: {scheduler_stats['acquired']} sent, average wait {scheduler_stats['avg_wait_seconds']}s, "
+          f"max wait {scheduler_stats['max_wait_seconds']}s, {scheduler_stats['quota_errors']} quota errors.", file=sys.stderr)
+    for row in get_default_metrics().summary():
+        if row["name"] == "analysis_task_seconds" and row["labels"].get("status") == "ok":
+            print(f"  {row['labels']['task']}: p50 {row['p50']:.2f}s, p95 {row['p95']:.2f}s over {row['count']} run(s)", file=sys.stderr)
+    metrics_path = export_metrics_from_env()
+    if metrics_path:
+        print(f"Metrics written to {metrics_path}.", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
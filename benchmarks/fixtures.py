@@ -0,0 +1,187 @@
+# ai_resume_analyzer/benchmarks/fixtures.py
+"""
+Synthetic inputs for the benchmarks: resume text, PDFs built in memory, large
+analysis results and a fake Gemini model, so nothing touches the network or disk.
+"""
+
+import json
+import random
+from contextlib import contextmanager
+
+SECTION_HEADINGS = ("Professional Summary", "Experience", "Projects", "Education", "Skills", "Certifications")
+SKILLS = ("Python", "SQL", "AWS", "Docker", "Kubernetes", "React", "TypeScript", "Spark", "Airflow", "TensorFlow",
+          "PostgreSQL", "Terraform", "Go", "Java", "Machine Learning", "CI/CD", "GraphQL", "Kafka")
+VERBS = ("Led", "Built", "Designed", "Reduced", "Improved", "Migrated", "Automated", "Launched", "Mentored", "Scaled")
+OBJECTS = ("the data platform", "a customer-facing API", "the CI pipeline", "an ML ranking model", "the billing service",
+           "internal dashboards", "the search backend", "a streaming ingestion job")
+
+
+def make_resume_text(experience_entries=6, bullets_per_entry=6, seed=0, skills=SKILLS):
+    """Returns a plausible plain-text resume; size grows with the number of entries."""
+    rng = random.Random(seed)
+    lines = ["Alex Example", "Berlin, Germany | +49 30 1234 5678 | alex.example@example.com | linkedin.com/in/alexexample", ""]
+    lines += ["Professional Summary", "Engineer with experience building data-heavy web products. " * 3, ""]
+    lines.append("Experience")
+    for i in range(experience_entries):
+        lines.append(f"Senior Engineer, Company {i} - Berlin | 01/{2010 + i} - 12/{2011 + i}")
+        for _ in range(bullets_per_entry):
+            lines.append(
+                f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(skills)} and {rng.choice(skills)}, "
+                f"cutting costs by {rng.randint(5, 60)}%."
+            )
+        lines.append("")
+    lines += ["Education", "M.Sc. Computer Science, Technical University - 2009", ""]
+    lines += ["Skills", ", ".join(skills), ""]
+    return "\n".join(lines)
+
+
+def make_resume_corpus(count, seed=0):
+    """Returns `count` resumes of varying length, each with its own random subset of skills."""
+    rng = random.Random(seed)
+    return [
+        make_resume_text(experience_entries=rng.randint(2, 8), bullets_per_entry=rng.randint(3, 7), seed=seed + i,
+                         skills=rng.sample(SKILLS, rng.randint(3, 8)))
+        for i in range(count)
+    ]
+
+
+def make_pdf(pages_lines):
+    """
+    Builds a minimal text PDF in memory from a list of pages, each a list of lines
+    (Helvetica, one text object per page).
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages_lines))), len(pages_lines))).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages_lines):
+        operations = ["BT /F1 10 Tf 14 TL 50 780 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operations.append(f"({escaped}) Tj T*")
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >>"
+            f" /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_resume_pdf(pages, lines_per_page=50, seed=0):
+    """Returns PDF bytes with `pages` pages of resume-like text."""
+    text_lines = make_resume_text(experience_entries=pages * 6, bullets_per_entry=7, seed=seed).splitlines()
+    pages_lines = [text_lines[i * lines_per_page:(i + 1) * lines_per_page] or ["(blank)"] for i in range(pages)]
+    return make_pdf(pages_lines)
+
+
+def _items(prefix, count):
+    return [f"{prefix} {i}: {VERBS[i % len(VERBS)]} {OBJECTS[i % len(OBJECTS)]} with measurable impact." for i in range(count)]
+
+
+def make_large_results(items=200):
+    """Returns one result per analysis key with `items` entries in every list field."""
+    return {
+        "extracted_details": {
+            "name": "Alex Example",
+            "contact_information": {"email": "alex.example@example.com", "phone": "+49 30 1234 5678",
+                                    "linkedin": "https://linkedin.com/in/alexexample", "github": "N/A", "portfolio": "N/A"},
+            "summary": "Engineer with experience building data-heavy web products.",
+            "skills": [SKILLS[i % len(SKILLS)] + f" {i}" for i in range(items)],
+            "work_experience": [
+                {"job_title": "Senior Engineer", "company": f"Company {i}", "location": "Berlin", "dates": "2019 - 2021",
+                 "responsibilities": _items("Responsibility", 8)}
+                for i in range(items // 4)
+            ],
+            "education": [{"degree": "M.Sc.", "institution": f"University {i}", "location": "Berlin",
+                           "graduation_date": "2009", "details": "N/A"} for i in range(items // 20 or 1)],
+            "projects": [{"project_name": f"Project {i}", "description": "A project.", "technologies_used": list(SKILLS[:4]),
+                          "link": "N/A"} for i in range(items // 4)],
+            "certifications_and_awards": _items("Award", items // 4),
+        },
+        "strengths_weaknesses_missing": {"strengths": _items("Strength", items), "weaknesses": _items("Weakness", items),
+                                         "missing_skills_for_role": _items("Missing", items)},
+        "improvement_suggestions": {
+            "general_suggestions": _items("Suggestion", items),
+            "section_specific_suggestions": {heading.lower(): _items(heading, items // 5) for heading in SECTION_HEADINGS},
+            "tailoring_for_role": _items("Tailoring", items),
+        },
+        "job_match": {"job_match_percentage": 72, "justification": "Strong overlap. " * 20,
+                      "recommendations": _items("Recommendation", items)},
+        "skill_gap": {"matching_skills": _items("Match", items), "missing_skills_from_jd": _items("Gap", items),
+                      "additional_skills_in_resume": _items("Extra", items)},
+        "ats_check": {"overall_ats_friendliness_score_out_of_10": 7, "positive_points": _items("Good", items),
+                      "potential_issues_and_recommendations": _items("Issue", items)},
+        "grammar_clarity": {
+            "overall_assessment": "Mostly clear.",
+            "feedback_points": [{"issue_type": "Clarity", "original_text_snippet": f"snippet {i}", "suggestion": "Rephrase."}
+                                for i in range(items)],
+            "positive_aspects": _items("Aspect", items),
+        },
+    }
+
+
+# --- Offline Gemini stub ---
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel; always answers with the configured text."""
+
+    response_text = "{}"
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return FakeResponse(FakeModel.response_text)
+
+
+def make_gemini_responses(items=50):
+    """Raw response texts (clean and needing each kind of local repair) for one analysis result."""
+    result = make_large_results(items)["strengths_weaknesses_missing"]
+    clean = json.dumps(result, indent=2)
+    return {
+        "clean": clean,
+        "fenced": f"```json\n{clean}\n```",
+        "surrounding_prose": f"Here is the analysis you asked for:\n{clean}\nLet me know if you need more.",
+        "trailing_commas": clean.replace('"\n  ]', '",\n  ]'),
+        "truncated": clean[: int(len(clean) * 0.8)],
+    }
+
+
+@contextmanager
+def offline_gemini(response_text):
+    """
+    Routes utils.get_gemini_response to FakeModel for the duration of the block: no
+    API key is needed, the rate limiter has no limits and the answer is `response_text`.
+    """
+    import utils
+    from rate_limiter import RequestScheduler, get_default_scheduler, set_default_scheduler
+
+    scheduler = get_default_scheduler()
+    FakeModel.response_text = response_text
+    utils.set_model_factory(FakeModel)
+    set_default_scheduler(RequestScheduler(requests_per_minute=0, tokens_per_minute=0))
+    try:
+        yield
+    finally:
+        utils.set_model_factory(None)
+        set_default_scheduler(scheduler)
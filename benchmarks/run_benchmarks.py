@@ -0,0 +1,227 @@
+# ai_resume_analyzer/benchmarks/run_benchmarks.py
+"""
+Offline benchmarks for the local hot paths: PDF text extraction, prompt
+construction, JSON cleanup/parsing in get_gemini_response (with a fake model), the
+result formatters and the resume index. Reports operations per second and peak memory per call, and
+can save the numbers as a baseline and compare later runs against it.
+
+Example (from the repository root):
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baseline.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import string
+import sys
+import time
+import tracemalloc
+
+import prompts
+from benchmarks.fixtures import (
+    make_gemini_responses, make_large_results, make_resume_corpus, make_resume_pdf, make_resume_text, offline_gemini,
+)
+from resume_index import ResumeIndex
+from utils import (
+    RESULT_FORMATTERS, RESULT_SCHEMAS, build_analysis_tasks, build_combined_prompt, build_context_tasks, extract_text_from_pdf,
+    get_gemini_response,
+)
+
+DEFAULT_MIN_SECONDS = 0.5
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.2 # 20% slower (or more memory) than the baseline is a regression
+
+
+class Benchmark:
+    """A named operation. `setup` returns the zero-argument callable to time; `context`
+    (optional) returns a context manager held open while it runs."""
+
+    def __init__(self, name, setup, context=None):
+        self.name = name
+        self.setup = setup
+        self.context = context
+
+
+def _template_fields(template):
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+
+def collect_benchmarks():
+    """Returns every benchmark, grouped by name prefix (pdf/, prompt/, json/, format/, index/)."""
+    benchmarks = []
+
+    # PDF extraction: a one-page resume, and a long document extracted in-process and in a pool.
+    for name, pages, parallel in (("pdf/extract_small_1_page", 1, False),
+                                  ("pdf/extract_large_40_pages", 40, False),
+                                  ("pdf/extract_large_40_pages_parallel", 40, True)):
+        def setup(pages=pages, parallel=parallel):
+            pdf_bytes = make_resume_pdf(pages)
+            return lambda: extract_text_from_pdf(io.BytesIO(pdf_bytes), max_pages=0, max_text_bytes=0, parallel=parallel)
+        benchmarks.append(Benchmark(name, setup))
+
+    # Prompt construction: each template on its own, then the full task lists and combined prompt.
+    resume_text = make_resume_text()
+    job_description = "We need Python, SQL, AWS, Docker and Kafka experience. " * 10
+    values = {"resume_text": resume_text, "job_title": "Data Engineer", "job_description": job_description}
+    for template_name in sorted(name for name in dir(prompts) if name.endswith("_TEMPLATE")):
+        template = getattr(prompts, template_name)
+        fields = {field: values.get(field, f"<{field}>") for field in _template_fields(template)}
+        benchmarks.append(Benchmark(
+            f"prompt/{template_name.lower()}", lambda template=template, fields=fields: lambda: template.format(**fields)
+        ))
+    benchmarks.append(Benchmark(
+        "prompt/build_analysis_tasks",
+        lambda: lambda: build_analysis_tasks(resume_text, "Data Engineer", job_description),
+    ))
+    benchmarks.append(Benchmark(
+        "prompt/build_context_tasks",
+        lambda: lambda: build_context_tasks(resume_text, "Data Engineer", job_description),
+    ))
+    benchmarks.append(Benchmark(
+        "prompt/build_combined_prompt",
+        lambda: lambda: build_combined_prompt(resume_text, "Data Engineer", job_description),
+    ))
+
+    # JSON cleanup and parsing inside get_gemini_response, with the model replaced by a stub.
+    schema = RESULT_SCHEMAS["strengths_weaknesses_missing"]
+    for kind, response_text in make_gemini_responses().items():
+        benchmarks.append(Benchmark(
+            f"json/get_gemini_response_{kind}",
+            lambda: lambda: get_gemini_response("benchmark prompt", use_cache=False, schema=schema),
+            context=lambda response_text=response_text: offline_gemini(response_text),
+        ))
+
+    # Formatters on results with hundreds of items per list.
+    large_results = make_large_results()
+    for key, formatter in RESULT_FORMATTERS.items():
+        benchmarks.append(Benchmark(
+            f"format/{formatter.__name__}", lambda formatter=formatter, key=key: lambda: formatter(large_results[key])
+        ))
+
+    # Recruiter mode: ranking an in-memory index of 5000 resumes, and adding one resume to it.
+    def index_setup(count=5000):
+        index = ResumeIndex()
+        index.add_many({"resume_text": text, "name": f"resume_{i}"} for i, text in enumerate(make_resume_corpus(count)))
+        return index
+    benchmarks.append(Benchmark(
+        "index/search_5000_resumes",
+        lambda: (lambda index: lambda: index.search(job_description, "Data Engineer", top_k=20))(index_setup()),
+    ))
+    benchmarks.append(Benchmark(
+        "index/add_resume",
+        lambda: (lambda index: lambda: index.add_resume(resume_text, name="resume"))(index_setup(500)),
+    ))
+    return benchmarks
+
+
+def measure(operation, min_seconds=DEFAULT_MIN_SECONDS, repeats=DEFAULT_REPEATS):
+    """
+    Times `operation` in batches of at least `min_seconds` and keeps the fastest of
+    `repeats` batches. Peak memory is traced separately over a single call, so
+    tracemalloc does not slow down the timed runs.
+    Returns ops_per_sec, mean_ms and peak_kib.
+    """
+    operation() # warm-up (imports, caches, process pools)
+    best_rate = 0.0
+    for _ in range(repeats):
+        calls = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_seconds:
+            operation()
+            calls += 1
+            elapsed = time.perf_counter() - started
+        best_rate = max(best_rate, calls / elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ops_per_sec": round(best_rate, 2), "mean_ms": round(1000 / best_rate, 4), "peak_kib": round(peak / 1024, 1)}
+
+
+def run_benchmarks(name_filter=None, min_seconds=DEFAULT_MIN_SECONDS, repeats=DEFAULT_REPEATS):
+    """Runs the selected benchmarks and returns {name: measurement}."""
+    results = {}
+    for benchmark in collect_benchmarks():
+        if name_filter and name_filter not in benchmark.name:
+            continue
+        operation = benchmark.setup()
+        # Progress messages printed by the code under test would flood the report.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                (benchmark.context() if benchmark.context else contextlib.nullcontext()):
+            results[benchmark.name] = measure(operation, min_seconds, repeats)
+        print(f"{benchmark.name:<55} {results[benchmark.name]['ops_per_sec']:>12,.1f} ops/s"
+              f" {results[benchmark.name]['mean_ms']:>10.3f} ms {results[benchmark.name]['peak_kib']:>10,.1f} KiB", flush=True)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a list of (name, metric, baseline value, current value, change) for every
+    benchmark that is more than `threshold` slower or uses that much more memory.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if previous["ops_per_sec"] and current["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+            change = current["ops_per_sec"] / previous["ops_per_sec"] - 1
+            regressions.append((name, "ops_per_sec", previous["ops_per_sec"], current["ops_per_sec"], change))
+        # Allocations below 16 KiB are too small for a relative comparison to mean much.
+        if previous["peak_kib"] >= 16 and current["peak_kib"] > previous["peak_kib"] * (1 + threshold):
+            change = current["peak_kib"] / previous["peak_kib"] - 1
+            regressions.append((name, "peak_kib", previous["peak_kib"], current["peak_kib"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks and optionally compare them to a baseline.")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text (e.g. 'format/')")
+    parser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS, help="Minimum duration of each timed batch")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Timed batches per benchmark (the fastest is kept)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results with a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth reported as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    print(f"{'benchmark':<55} {'throughput':>16} {'mean':>13} {'peak memory':>14}")
+    results = run_benchmarks(args.filter, args.min_seconds, args.repeats)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("python"), baseline.get("platform")) != (platform.python_version(), platform.platform()):
+            print(f"Note: the baseline was recorded on Python {baseline.get('python')} / {baseline.get('platform')}; "
+                  "timings from another machine are only a rough guide.")
+        missing = sorted(set(results) - set(baseline.get("results", {})))
+        if missing:
+            print(f"Not in the baseline (skipped): {', '.join(missing)}")
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if not regressions:
+            print(f"No regressions beyond {args.threshold:.0%} compared to {args.compare}.")
+            return 0
+        print(f"{len(regressions)} regression(s) compared to {args.compare}:")
+        for name, metric, previous, current, change in regressions:
+            print(f"  {name}: {metric} {previous} -> {current} ({change:+.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
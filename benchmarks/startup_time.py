@@ -0,0 +1,126 @@
+# ai_resume_analyzer/benchmarks/startup_time.py
+"""
+Cold-start benchmark: how long a fresh Python process takes to import each entry
+module (what every new Streamlit worker or batch run pays before doing any work),
+and which heavy third-party packages that import pulls in.
+
+Each import runs in a new interpreter, so nothing is cached between runs; the median
+of several runs is reported. Baselines work as in run_benchmarks.py.
+
+Example (from the repository root):
+    python -m benchmarks.startup_time --save-baseline benchmarks/baseline_startup.json
+    python -m benchmarks.startup_time --compare benchmarks/baseline_startup.json
+    python -m benchmarks.startup_time --importtime utils   # slowest imports of one module
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run_benchmarks import DEFAULT_THRESHOLD
+
+DEFAULT_RUNS = 7
+ENTRY_MODULES = ("utils", "analysis_engine", "batch_analyze")
+HEAVY_MODULES = ("google.generativeai", "PyPDF2", "dotenv", "streamlit", "pandas")
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"import_ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_python(args):
+    # PYTHONDONTWRITEBYTECODE is left alone: .pyc files exist in any real deployment.
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+
+
+def measure_import(module, runs=DEFAULT_RUNS):
+    """
+    Imports `module` in `runs` fresh interpreters. Returns median_ms, min_ms and the
+    heavy packages loaded by the import.
+    """
+    snippet = _IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES)
+    _run_python(["-c", snippet]) # warm-up: fills the OS file cache and writes .pyc files
+    timings, loaded = [], []
+    for _ in range(runs):
+        result = json.loads(_run_python(["-c", snippet]).strip().splitlines()[-1])
+        timings.append(result["import_ms"])
+        loaded = result["loaded"]
+    return {"median_ms": round(statistics.median(timings), 1), "min_ms": round(min(timings), 1), "loaded": loaded}
+
+
+def slowest_imports(module, limit=15):
+    """Returns the `limit` largest cumulative import times (ms, package) from python -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-import time of the entry modules.")
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_MODULES), help="Modules to import (default: entry modules)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Fresh interpreters per module (the median is kept)")
+    parser.add_argument("--importtime", metavar="MODULE", help="Only list the slowest imports of this module")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results with a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown reported as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        for milliseconds, name in slowest_imports(args.importtime):
+            print(f"{milliseconds:>10.1f} ms  {name}")
+        return 0
+
+    print(f"{'module':<20} {'median':>10} {'min':>10}  heavy packages loaded")
+    results = {}
+    for module in args.modules:
+        results[module] = measure_import(module, args.runs)
+        print(f"{module:<20} {results[module]['median_ms']:>7.1f} ms {results[module]['min_ms']:>7.1f} ms"
+              f"  {', '.join(results[module]['loaded']) or '-'}", flush=True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}.")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("python"), baseline.get("platform")) != (platform.python_version(), platform.platform()):
+            print(f"Note: the baseline was recorded on Python {baseline.get('python')} / {baseline.get('platform')}; "
+                  "timings from another machine are only a rough guide.")
+        baseline = baseline.get("results", {})
+        regressions = []
+        for module, current in results.items():
+            previous = baseline.get(module)
+            if not previous:
+                continue
+            print(f"  {module}: {previous['median_ms']} -> {current['median_ms']} ms"
+                  f" ({current['median_ms'] / previous['median_ms'] - 1:+.0%})")
+            if current["median_ms"] > previous["median_ms"] * (1 + args.threshold):
+                regressions.append(module)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} compared to {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
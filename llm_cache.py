@@ -0,0 +1,317 @@
+# ai_resume_analyzer/llm_cache.py
+"""
+Content-addressed cache for parsed Gemini responses.
+
+Entries are keyed on a hash of (model name, prompt text, generation settings), so the
+same resume/job-title pair analysed twice is only sent to Gemini once. Two backends
+are available: an in-process LRU and an SQLite file that several Streamlit worker
+processes can share. Both support size and TTL eviction and keep hit/miss counters.
+SingleFlight covers the gap before a response is cached: identical requests made
+while one is still running wait for it instead of being sent again.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def make_cache_key(model_name, prompt_text, generation_config=None):
+    """Returns a stable SHA-256 hex digest for a model/prompt/settings combination."""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt_text, "generation_config": generation_config or {}},
+        sort_keys=True, default=str, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BaseCache:
+    """Common hit/miss bookkeeping shared by every backend."""
+
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _is_expired(self, created_at, now=None):
+        if not self.ttl_seconds:
+            return False
+        return ((now or time.time()) - created_at) > self.ttl_seconds
+
+    def stats(self):
+        """Returns a snapshot of the counters plus the current number of entries."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 3) if lookups else 0.0
+        snapshot["entries"] = len(self)
+        return snapshot
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def invalidate(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class NullCache(BaseCache):
+    """A cache that never stores anything. Used when caching is disabled."""
+
+    def get(self, key):
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def invalidate(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemoryLRUCache(BaseCache):
+    """Thread-safe in-process LRU cache with optional TTL."""
+
+    def __init__(self, max_entries=256, ttl_seconds=None):
+        super().__init__(ttl_seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (created_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[0]):
+                del self._entries[key]
+                self._count("evictions")
+                entry = None
+            if entry is None:
+                self._count("misses")
+                return None
+            self._entries.move_to_end(key)
+        self._count("hits")
+        return copy.deepcopy(entry[1]) # callers may mutate results; keep the cached copy intact
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._count("writes")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache(BaseCache):
+    """
+    On-disk cache stored in a single SQLite file. WAL mode lets several processes
+    read and write the same file; each operation uses its own short-lived connection.
+    """
+
+    def __init__(self, path, max_entries=5000, ttl_seconds=None):
+        super().__init__(ttl_seconds=ttl_seconds)
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._is_expired(row[1], now):
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._count("evictions")
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            evicted = 0
+            if self.ttl_seconds:
+                evicted += conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                evicted += conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+        self._count("writes")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def invalidate(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.succeeded = False
+        self.waiters = 0
+        self.result = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function
+    and callers arriving while it runs wait for it and receive a copy of its result
+    instead of repeating the work. If the running call raises or is cancelled, the
+    waiting callers are released and one of them runs the function again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} # key -> _InFlightCall
+        self._stats = {"calls": 0, "coalesced": 0, "takeovers": 0}
+
+    def do(self, key, fn):
+        """Runs fn() once per key at a time. Returns (result, shared), shared being True for waiters."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                is_leader = call is None
+                if is_leader:
+                    call = self._calls[key] = _InFlightCall()
+                    self._stats["calls"] += 1
+                else:
+                    call.waiters += 1
+
+            if is_leader:
+                try:
+                    result = fn()
+                    call.succeeded = True
+                    return result, False
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                        waiters = call.waiters
+                    if call.succeeded and waiters:
+                        call.result = copy.deepcopy(result) # the leader's caller may mutate its own copy
+                    call.done.set()
+
+            call.done.wait()
+            with self._lock:
+                self._stats["coalesced" if call.succeeded else "takeovers"] += 1
+            if call.succeeded:
+                return copy.deepcopy(call.result), True
+            # The leader failed or was cancelled: try again, possibly as the new leader.
+
+    def stats(self):
+        """Returns the number of calls made, calls saved by coalescing, takeovers and calls in flight."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = len(self._calls)
+        return snapshot
+
+
+# --- Process-wide default cache ---
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def create_cache_from_env():
+    """
+    Builds a cache from environment variables:
+    LLM_CACHE_BACKEND ("memory", "sqlite" or "none"), LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ENTRIES and LLM_CACHE_TTL_SECONDS.
+    """
+    backend = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", "0")) or None
+    if backend == "none":
+        return NullCache()
+    if backend == "sqlite":
+        path = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+        return SQLiteCache(path, max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")), ttl_seconds=ttl)
+    return MemoryLRUCache(max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")), ttl_seconds=ttl)
+
+def get_default_cache():
+    """Returns the shared cache used by get_gemini_response, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = create_cache_from_env()
+        return _default_cache
+
+def set_default_cache(cache):
+    """Replaces the shared cache (e.g. to switch backends at runtime)."""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -0,0 +1,366 @@
+# ai_resume_analyzer/llm_json.py
+"""
+Helpers for turning raw Gemini output into JSON.
+"""
+
+import copy
+import json
+import re
+import threading
+from collections import Counter
+
+
+def strip_json_fence(text):
+    """Removes surrounding whitespace and a ```json ... ``` wrapper if present."""
+    cleaned_text = text.strip()
+    if cleaned_text.startswith("```json"):
+        cleaned_text = cleaned_text[7:]
+    if cleaned_text.endswith("```"):
+        cleaned_text = cleaned_text[:-3]
+    return cleaned_text
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object that arrives in chunks (e.g. a streamed Gemini response) and
+    keeps a `partial` dict that is updated as soon as each piece is complete:
+    scalar fields when their value ends, list items one by one as each item closes,
+    and nested objects once they close. Anything before the first "{" (such as a
+    ```json fence) is ignored.
+
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            if parser.feed(chunk):
+                render(parser.partial)
+    """
+
+    def __init__(self):
+        self.partial = {}
+        self._buffer = ""
+        self._pos = 0
+        self._stack = [] # frames for the containers currently open
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._done = False
+
+    def feed(self, chunk):
+        """Consumes the next chunk of text. Returns True if `partial` changed."""
+        self._buffer += chunk
+        changed = False
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self._done:
+            i = self._pos
+            c = buffer[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string_end(i)
+                continue
+
+            if not self._stack:
+                if c == "{":
+                    self._push("object", i, ())
+                continue
+
+            top = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._mark_value_start(top, i)
+            elif c == ":" and top["type"] == "object":
+                top["key"] = top["pending_key"]
+                top["expect_key"] = False
+                top["value_start"] = None
+                top["value_is_container"] = False
+            elif c in "{[":
+                self._mark_value_start(top, i, is_container=True)
+                self._push("object" if c == "{" else "array", i, self._child_path(top))
+            elif c == ",":
+                changed |= self._finish_scalar(top, i)
+                if top["type"] == "object":
+                    top["expect_key"] = True
+            elif c in "}]":
+                changed |= self._finish_scalar(top, i)
+                frame = self._stack.pop()
+                changed |= self._on_container_closed(frame, i)
+            elif not c.isspace():
+                self._mark_value_start(top, i)
+        return changed
+
+    def snapshot(self):
+        """Returns a deep copy of the current partial result."""
+        return copy.deepcopy(self.partial)
+
+    # --- internals ---
+    def _push(self, frame_type, start, path):
+        self._stack.append({
+            "type": frame_type, "start": start, "path": path,
+            "key": None, "pending_key": None, "expect_key": True,
+            "value_start": None, "value_is_container": False, "index": 0,
+        })
+
+    def _child_path(self, frame):
+        if frame["type"] == "object":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def _mark_value_start(self, frame, i, is_container=False):
+        if frame["type"] == "object" and frame["expect_key"]:
+            return
+        if frame["value_start"] is None:
+            frame["value_start"] = i
+            frame["value_is_container"] = is_container
+
+    def _on_string_end(self, end):
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top["type"] == "object" and top["expect_key"]:
+            try:
+                top["pending_key"] = json.loads(self._buffer[self._string_start:end + 1])
+            except ValueError:
+                top["pending_key"] = None
+
+    def _finish_scalar(self, frame, end):
+        """Completes a scalar value/list item that ends at `end` (a ',', '}' or ']')."""
+        changed = False
+        start = frame["value_start"]
+        if start is not None and not frame["value_is_container"]:
+            try:
+                value = json.loads(self._buffer[start:end])
+            except ValueError:
+                value = None
+            else:
+                changed = self._assign(frame, value)
+        if frame["type"] == "array" and start is not None:
+            frame["index"] += 1
+        frame["value_start"] = None
+        frame["value_is_container"] = False
+        return changed
+
+    def _on_container_closed(self, frame, end):
+        if not self._stack: # the top-level object is complete
+            self._done = True
+            try:
+                self.partial = json.loads(self._buffer[frame["start"]:end + 1])
+            except ValueError:
+                return False
+            return True
+        parent = self._stack[-1]
+        try:
+            value = json.loads(self._buffer[frame["start"]:end + 1])
+        except ValueError:
+            return False
+        changed = self._assign(parent, value)
+        if parent["type"] == "array":
+            parent["index"] += 1
+        parent["value_start"] = None
+        parent["value_is_container"] = False
+        return changed
+
+    def _assign(self, frame, value):
+        """Stores a completed value into `partial`. Values nested inside lists are only
+        stored once the enclosing list item completes."""
+        path = self._child_path(frame)
+        if any(not isinstance(part, str) for part in path[:-1]):
+            return False
+        target = self.partial
+        for part in path[:-2] if frame["type"] == "array" else path[:-1]:
+            target = target.setdefault(part, {})
+            if not isinstance(target, dict):
+                return False
+        if frame["type"] == "object":
+            target[path[-1]] = value
+        else:
+            items = target.setdefault(path[-2], [])
+            if not isinstance(items, list):
+                return False
+            if path[-1] < len(items):
+                items[path[-1]] = value
+            else:
+                items.append(value)
+        return True
+
+
+# --- Tolerant Parsing & Local Repair ---
+# Cheap local fixes tried, in order, before a response is considered unusable.
+# Each entry's name is what parse_llm_json() reports and what repair_stats() counts.
+_FENCED_BLOCK = re.compile(r"```[A-Za-z0-9_-]*\s*\n?(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CURLY_QUOTES = "“”"
+_CLOSING_QUOTE_CONTEXT = re.compile(r"\s*(?:[:,}\]]|$)") # what follows a quote that ends a key or value
+
+_repair_counts = Counter()
+_repair_counts_lock = threading.Lock()
+
+def _record_repair(name):
+    with _repair_counts_lock:
+        _repair_counts[name] += 1
+
+def repair_stats():
+    """Returns how often each parse/repair step produced the final JSON, plus failures."""
+    with _repair_counts_lock:
+        return dict(_repair_counts)
+
+def _fenced_content(text):
+    match = _FENCED_BLOCK.search(text)
+    return match.group(1) if match else text
+
+def _outermost_object(text):
+    """Drops prose before the first "{" and after the object it starts, if it is complete."""
+    start = text.find("{")
+    if start == -1:
+        return text
+    try:
+        _, end = json.JSONDecoder().raw_decode(text, start)
+        return text[start:end]
+    except json.JSONDecodeError:
+        return text[start:]
+
+def _remove_trailing_commas(text):
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+def _normalize_quotes(text):
+    """
+    Replaces curly quotes that delimit JSON strings with straight ones. Curly quotes
+    inside a string value (e.g. a quoted project name) are text and are kept.
+    """
+    if "“" not in text and "”" not in text:
+        return text
+    out = []
+    in_string = escape = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            elif c in _CURLY_QUOTES and _CLOSING_QUOTE_CONTEXT.match(text, i + 1):
+                c, in_string = '"', False
+        elif c in _CURLY_QUOTES:
+            c, in_string = '"', True
+        elif c == '"':
+            in_string = True
+        out.append(c)
+    return "".join(out)
+
+def _close_truncated(text):
+    """
+    Completes JSON that was cut off mid-way: closes an open string and any open
+    brackets, or falls back to the last complete element before a comma.
+    Returns the first candidate that parses, else the input.
+    """
+    stack = []
+    in_string = escape = False
+    cut_points = [] # (position of a comma outside strings, brackets open at that point)
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+        elif c == ",":
+            cut_points.append((i, list(stack)))
+
+    candidates = [text + ('"' if in_string else "") + "".join(reversed(stack))]
+    for position, open_brackets in reversed(cut_points[-50:]):
+        candidates.append(text[:position] + "".join(reversed(open_brackets)))
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+    return text
+
+def _close_truncated_any_quotes(text):
+    # The text as received first: quote normalization can misread a curly quote inside a
+    # value as the end of the string, which would leave the brackets wrongly balanced.
+    repaired = _close_truncated(text)
+    return repaired if repaired is not text else _close_truncated(_normalize_quotes(text))
+
+# (name, transform, carry_forward) triples. Each transform gets the output of the last
+# carried-forward step, so smart-quote normalization is tried but not built upon.
+_REPAIR_STEPS = (
+    ("code_fence", _fenced_content, True),
+    ("surrounding_prose", _outermost_object, True),
+    ("trailing_commas", _remove_trailing_commas, True),
+    ("smart_quotes", _normalize_quotes, False),
+    ("truncated", _close_truncated_any_quotes, True),
+)
+
+
+def apply_schema(parsed, schema):
+    """
+    Coerces a parsed object towards `schema`, a dict mapping expected top-level keys to
+    their type (list, dict, str or int). Single strings become one-item lists and
+    numeric strings such as "75%" become ints; missing keys are left to the formatters.
+    Raises ValueError if `parsed` is not an object or has none of the schema's keys.
+    """
+    if not isinstance(parsed, dict):
+        raise ValueError(f"Expected a JSON object, got {type(parsed).__name__}.")
+    if schema and not set(parsed) & set(schema):
+        raise ValueError("JSON object has none of the expected keys.")
+    for key, expected_type in (schema or {}).items():
+        value = parsed.get(key)
+        if value is None or isinstance(value, expected_type):
+            continue
+        if expected_type is list and isinstance(value, str):
+            parsed[key] = [value]
+        elif expected_type is int and isinstance(value, (str, float)):
+            digits = re.search(r"-?\d+(?:\.\d+)?", str(value))
+            if digits:
+                parsed[key] = int(round(float(digits.group())))
+        elif expected_type is str and isinstance(value, (int, float)):
+            parsed[key] = str(value)
+    return parsed
+
+
+def parse_llm_json(text, schema=None):
+    """
+    Parses JSON from an LLM response, trying cheap local repairs before giving up:
+    stripping any code fence, dropping surrounding prose, removing trailing commas,
+    normalizing smart quotes and closing truncated output. If `schema` is given the
+    result is also checked and coerced with apply_schema().
+    Returns (parsed, repair_name), where repair_name is "strict" when no repair was
+    needed. Raises the original json.JSONDecodeError when nothing works.
+    """
+    candidate = strip_json_fence(text)
+    try:
+        parsed = apply_schema(json.loads(candidate), schema) if schema else json.loads(candidate)
+        _record_repair("strict")
+        return parsed, "strict"
+    except json.JSONDecodeError as e:
+        original_error = e
+    except ValueError as e:
+        original_error = json.JSONDecodeError(str(e), candidate, 0)
+
+    candidate = text
+    for name, transform, carry_forward in _REPAIR_STEPS:
+        repaired = transform(candidate)
+        if carry_forward:
+            candidate = repaired
+        try:
+            parsed = json.loads(repaired)
+            if schema:
+                parsed = apply_schema(parsed, schema)
+        except ValueError:
+            continue
+        _record_repair(name)
+        return parsed, name
+    _record_repair("failed")
+    raise original_error
@@ -0,0 +1,418 @@
+# ai_resume_analyzer/local_analysis.py
+"""
+Deterministic, offline skill-gap and ATS checks.
+
+Both analyses are mostly keyword work, so they are computed locally in milliseconds:
+a skill dictionary is compiled into an Aho-Corasick automaton that finds every known
+skill in one pass over the text, and the ATS check looks for standard headings,
+contact details, date formats, action verbs and layout problems. Results have the
+same JSON shape as the SKILL_GAP and ATS_CHECK prompts, so format_skill_gap and
+format_ats_check render them unchanged, and Gemini's answers can be merged in as
+optional enrichment. The candidate's name and contact details are also pre-extracted
+here, so the extraction prompt does not have to ask Gemini for them.
+"""
+
+import re
+from collections import deque
+
+from text_compaction import split_sections
+
+# Canonical skill name -> lowercase aliases matched as whole words.
+# Very short or ambiguous names (e.g. "R", "Go", "C") are only matched in unambiguous forms.
+SKILL_DICTIONARY = {
+    # Programming languages
+    "Python": ["python"], "Java": ["java"], "JavaScript": ["javascript", "ecmascript"], "TypeScript": ["typescript"],
+    "C++": ["c++", "cpp"], "C#": ["c#", "csharp"], "Go": ["golang"], "Rust": ["rust"], "Ruby": ["ruby"], "PHP": ["php"],
+    "Kotlin": ["kotlin"], "Swift": ["swift"], "Scala": ["scala"], "R": ["r programming", "rstudio", "tidyverse"],
+    "MATLAB": ["matlab"], "SQL": ["sql"], "Bash": ["bash", "shell scripting"], "Perl": ["perl"],
+    # Web and mobile
+    "HTML": ["html", "html5"], "CSS": ["css", "css3"], "React": ["react", "react.js", "reactjs"], "Angular": ["angular", "angularjs"],
+    "Vue.js": ["vue", "vue.js", "vuejs"], "Node.js": ["node.js", "nodejs"], "Django": ["django"], "Flask": ["flask"],
+    "FastAPI": ["fastapi"], "Spring": ["spring boot", "spring framework"], ".NET": [".net", "asp.net", "dotnet"],
+    "REST APIs": ["rest api", "rest apis", "restful", "restful apis"], "GraphQL": ["graphql"],
+    "Android": ["android"], "iOS": ["ios"], "React Native": ["react native"], "Flutter": ["flutter"],
+    # Data and machine learning
+    "Machine Learning": ["machine learning", "ml models"], "Deep Learning": ["deep learning", "neural networks"],
+    "Natural Language Processing": ["natural language processing", "nlp"], "Computer Vision": ["computer vision"],
+    "Statistics": ["statistics", "statistical analysis", "statistical modeling"], "Data Analysis": ["data analysis", "data analytics"],
+    "Data Visualization": ["data visualization", "data visualisation"], "A/B Testing": ["a/b testing", "ab testing"],
+    "pandas": ["pandas"], "NumPy": ["numpy"], "scikit-learn": ["scikit-learn", "sklearn"], "TensorFlow": ["tensorflow"],
+    "PyTorch": ["pytorch"], "Keras": ["keras"], "Spark": ["spark", "pyspark", "apache spark"], "Hadoop": ["hadoop"],
+    "Airflow": ["airflow"], "Kafka": ["kafka"], "dbt": ["dbt"], "ETL": ["etl", "elt", "data pipelines"],
+    "Tableau": ["tableau"], "Power BI": ["power bi", "powerbi"], "Excel": ["excel", "microsoft excel"], "Looker": ["looker"],
+    "LLMs": ["llm", "llms", "large language models", "generative ai", "genai"],
+    # Databases
+    "PostgreSQL": ["postgresql", "postgres"], "MySQL": ["mysql"], "MongoDB": ["mongodb"], "Redis": ["redis"],
+    "Elasticsearch": ["elasticsearch"], "Snowflake": ["snowflake"], "BigQuery": ["bigquery"], "Oracle": ["oracle"],
+    "NoSQL": ["nosql"],
+    # Cloud and DevOps
+    "AWS": ["aws", "amazon web services"], "Azure": ["azure", "microsoft azure"], "Google Cloud": ["gcp", "google cloud"],
+    "Docker": ["docker"], "Kubernetes": ["kubernetes", "k8s"], "Terraform": ["terraform"], "Ansible": ["ansible"],
+    "CI/CD": ["ci/cd", "continuous integration", "continuous delivery", "continuous deployment"],
+    "Jenkins": ["jenkins"], "GitHub Actions": ["github actions"], "Git": ["git", "github", "gitlab"], "Linux": ["linux", "unix"],
+    "Microservices": ["microservices", "microservice"], "Serverless": ["serverless", "lambda functions"],
+    # Practices and tools
+    "Agile": ["agile", "scrum", "kanban"], "Jira": ["jira"], "Unit Testing": ["unit testing", "unit tests", "pytest", "junit"],
+    "Test Automation": ["test automation", "selenium", "cypress"], "System Design": ["system design", "distributed systems"],
+    "Security": ["cybersecurity", "information security", "application security"], "Figma": ["figma"],
+    "SEO": ["seo", "search engine optimization"], "Salesforce": ["salesforce"], "SAP": ["sap"],
+    "Project Management": ["project management", "pmp"], "Product Management": ["product management", "product roadmap"],
+    # Soft skills
+    "Leadership": ["leadership", "led a team", "team lead", "mentored", "mentoring"],
+    "Communication": ["communication skills", "communication", "presentations", "public speaking"],
+    "Collaboration": ["collaboration", "cross-functional", "teamwork"], "Problem Solving": ["problem solving", "problem-solving"],
+    "Stakeholder Management": ["stakeholder management", "stakeholders"],
+}
+
+# Verbs that make experience bullets read well for both ATS keyword matching and recruiters.
+ACTION_VERBS = {
+    "achieved", "analyzed", "architected", "automated", "built", "collaborated", "created", "delivered", "designed",
+    "developed", "drove", "enhanced", "established", "executed", "implemented", "improved", "increased", "launched",
+    "led", "managed", "mentored", "migrated", "optimized", "orchestrated", "owned", "reduced", "redesigned",
+    "resolved", "scaled", "shipped", "spearheaded", "streamlined", "supported", "trained", "coordinated",
+    "deployed", "engineered", "evaluated", "facilitated", "generated", "identified", "initiated", "integrated",
+    "maintained", "modeled", "negotiated", "organized", "oversaw", "planned", "produced", "refactored", "researched",
+}
+
+STANDARD_SECTIONS = {
+    "experience": ("experience", "work experience", "professional experience", "employment", "employment history"),
+    "education": ("education",),
+    "skills": ("skills", "technical skills", "core competencies"),
+}
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"(?:\+\d{1,3}[\s.-]?)?\(?\d{2,4}\)?[\s.-]?\d{3,4}[\s.-]?\d{3,4}")
+_LINKEDIN = re.compile(r"linkedin\.com/", re.IGNORECASE)
+_LINKEDIN_URL = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/(?:in|pub)/[\w%-]+/?", re.IGNORECASE)
+_GITHUB_URL = re.compile(r"(?:https?://)?(?:www\.)?github\.com/[\w-]+(?:/[\w.-]+)?/?", re.IGNORECASE)
+_WEB_URL = re.compile(r"(?:https?://|www\.)[^\s,;|<>()]+|\b[\w-]+(?:\.[\w-]+)*\.(?:com|io|dev|me|net|org|site|page|app)(?:/[^\s,;|<>()]*)?", re.IGNORECASE)
+_NAME_WORD = re.compile(r"^[A-Z][A-Za-z'’.-]*$|^[A-Z]\.?$")
+_BULLET = re.compile(r"^\s*(?:[-*•▪◦●‣–]|\d+[.)])\s+")
+_DATE_FORMATS = {
+    "MM/YYYY": re.compile(r"\b(?:0?[1-9]|1[0-2])/(?:19|20)\d{2}\b"),
+    "Month YYYY": re.compile(r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+(?:19|20)\d{2}\b", re.IGNORECASE),
+    "YYYY-MM": re.compile(r"\b(?:19|20)\d{2}-(?:0[1-9]|1[0-2])\b"),
+}
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_UNUSUAL_SYMBOL = re.compile(r"[^\w\s.,;:!?'\"()\[\]{}/\\@#$%&*+=<>|~`^\-–—•·’‘“”€£]")
+_TABLE_LIKE = re.compile(r"\S(?: {4,}|\t+|\s\|\s)\S")
+_TITLE_STOP_WORDS = {"senior", "junior", "lead", "principal", "staff", "intern", "the", "and", "for", "with"}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over lowercase keyword aliases. find() scans a text once
+    and returns the canonical names of every alias found as a whole word.
+    """
+
+    def __init__(self, dictionary):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]] # per state: (alias length, canonical name)
+        for canonical, aliases in dictionary.items():
+            for alias in aliases:
+                self._add(alias.lower(), canonical)
+        self._build_failure_links()
+
+    def _add(self, alias, canonical):
+        state = 0
+        for char in alias:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(alias), canonical))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Returns {canonical name: number of places it is mentioned} for `text`."""
+        text = text.lower()
+        found = {}
+        seen = set() # (canonical, start): overlapping aliases of one skill count once
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, canonical in self._output[state]:
+                start = end - length + 1
+                if (canonical, start) not in seen and _is_word_boundary(text, start - 1) and _is_word_boundary(text, end + 1):
+                    seen.add((canonical, start))
+                    found[canonical] = found.get(canonical, 0) + 1
+        return found
+
+
+def _is_word_boundary(text, index):
+    return index < 0 or index >= len(text) or not (text[index].isalnum() or text[index] in "+#")
+
+
+_default_matcher = None
+
+def get_skill_matcher():
+    """Returns the matcher for SKILL_DICTIONARY, compiling it on first use."""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = KeywordMatcher(SKILL_DICTIONARY)
+    return _default_matcher
+
+
+def local_skill_gap(resume_text, job_description, matcher=None):
+    """
+    Compares the known skills found in the resume and the job description.
+    Returns a dict shaped like the SKILL_GAP prompt's JSON output.
+    """
+    matcher = matcher or get_skill_matcher()
+    resume_skills = matcher.find(resume_text)
+    jd_skills = matcher.find(job_description)
+    # Skills the JD repeats are usually the important ones, so list them first.
+    by_jd_emphasis = sorted(jd_skills, key=lambda skill: (-jd_skills[skill], skill))
+    return {
+        "matching_skills": [
+            f"{skill} - mentioned {_times(resume_skills[skill])} in the resume and {_times(jd_skills[skill])} in the job description."
+            for skill in by_jd_emphasis if skill in resume_skills
+        ],
+        "missing_skills_from_jd": [
+            f"{skill} - required by the job description ({_times(jd_skills[skill])}) but not found in the resume."
+            for skill in by_jd_emphasis if skill not in resume_skills
+        ],
+        "additional_skills_in_resume": [
+            f"{skill} - listed in the resume but not mentioned in the job description."
+            for skill in sorted(resume_skills) if skill not in jd_skills
+        ],
+    }
+
+def _times(count):
+    return "once" if count == 1 else f"{count} times"
+
+
+def local_ats_check(resume_text, job_title, job_description="", matcher=None):
+    """
+    Scores ATS friendliness from the resume text alone: standard section headings,
+    plain-text contact details, consistent date formats, action verbs in bullets,
+    role keywords and layout that parses poorly (symbols, table-like spacing).
+    Returns a dict shaped like the ATS_CHECK prompt's JSON output.
+    """
+    positives, issues = [], []
+    score = 10
+
+    section_names = {section["name"] for section in split_sections(resume_text)}
+    missing_sections = [label for label, names in STANDARD_SECTIONS.items() if not section_names.intersection(names)]
+    if missing_sections:
+        score -= len(missing_sections)
+        issues.append(
+            f"No standard heading found for: {', '.join(name.title() for name in missing_sections)}. "
+            "Use conventional section titles such as 'Experience', 'Education' and 'Skills' so ATS parsers can map your content."
+        )
+    else:
+        positives.append("Standard section headings (Experience, Education, Skills) are used.")
+
+    has_email = bool(_EMAIL.search(resume_text))
+    has_phone = any(len(re.sub(r"\D", "", match)) >= 9 for match in _PHONE.findall(resume_text))
+    if has_email and has_phone:
+        positives.append("Email and phone number are present as plain text.")
+    else:
+        score -= 2
+        missing = [label for label, present in (("email address", has_email), ("phone number", has_phone)) if not present]
+        issues.append(f"Could not find a plain-text {' or '.join(missing)}. Put contact details in the body text, not in a header image or graphic.")
+    if _LINKEDIN.search(resume_text):
+        positives.append("A LinkedIn profile URL is included.")
+
+    date_formats = [name for name, pattern in _DATE_FORMATS.items() if pattern.search(resume_text)]
+    if len(date_formats) > 1:
+        score -= 1
+        issues.append(f"Dates use several formats ({', '.join(date_formats)}). Pick one format (e.g. MM/YYYY - MM/YYYY) and use it throughout.")
+    elif date_formats:
+        positives.append(f"Dates consistently use the {date_formats[0]} format.")
+    elif _YEAR.search(resume_text):
+        positives.append("Dates are given as years, which ATS systems parse reliably.")
+    else:
+        score -= 1
+        issues.append("No dates were found for experience or education. Add start and end dates (e.g. MM/YYYY - MM/YYYY).")
+
+    bullets = [line for line in resume_text.split("\n") if _BULLET.match(line)]
+    if bullets:
+        with_action_verb = sum(1 for line in bullets if _BULLET.sub("", line).split(" ", 1)[0].lower().strip(",.") in ACTION_VERBS)
+        share = with_action_verb / len(bullets)
+        if share >= 0.5:
+            positives.append(f"{with_action_verb} of {len(bullets)} bullet points start with an action verb.")
+        else:
+            score -= 1
+            issues.append(f"Only {with_action_verb} of {len(bullets)} bullet points start with an action verb (e.g. 'Led', 'Built', 'Reduced'). Start each achievement with one.")
+    else:
+        score -= 1
+        issues.append("No bullet points were detected. Describe experience as bulleted achievements rather than paragraphs.")
+
+    resume_lower = resume_text.lower()
+    if job_description:
+        matcher = matcher or get_skill_matcher()
+        jd_skills = matcher.find(job_description)
+        resume_skills = matcher.find(resume_text)
+        found = [skill for skill in jd_skills if skill in resume_skills]
+        if jd_skills and len(found) < len(jd_skills) / 2:
+            score -= 2
+            issues.append(f"Only {len(found)} of {len(jd_skills)} skills named in the job description appear in the resume. Mirror the JD's wording for skills you have.")
+        elif jd_skills:
+            positives.append(f"{len(found)} of {len(jd_skills)} skills named in the job description appear in the resume.")
+    title_words = [word for word in re.findall(r"[a-z][a-z+#]*", job_title.lower()) if len(word) > 2 and word not in _TITLE_STOP_WORDS]
+    if title_words and all(word in resume_lower for word in title_words):
+        positives.append(f"Keywords from the target title '{job_title}' appear in the resume.")
+    elif title_words:
+        score -= 1
+        issues.append(f"The target title '{job_title}' (or its keywords) does not appear in the resume. Use it in your summary or headline if it fits your experience.")
+
+    symbols = _UNUSUAL_SYMBOL.findall(resume_text)
+    if len(symbols) > 5:
+        score -= 1
+        issues.append(f"Found {len(symbols)} special symbols or icons (e.g. {' '.join(sorted(set(symbols))[:5])}). Replace them with plain text; ATS parsers may drop or garble them.")
+    table_lines = sum(1 for line in resume_text.split("\n") if _TABLE_LIKE.search(line))
+    if table_lines > 5:
+        score -= 1
+        issues.append(f"{table_lines} lines look like tables or multiple columns. Use a single-column layout so text is read in the right order.")
+
+    word_count = len(resume_text.split())
+    if word_count < 150:
+        score -= 1
+        issues.append(f"The resume is short ({word_count} words); ATS ranking relies on relevant keywords, so describe your experience in more detail.")
+    elif word_count > 1500:
+        issues.append(f"The resume is long ({word_count} words). Keep the most relevant experience up front; recruiters and some ATS systems weight the first page.")
+
+    return {
+        "overall_ats_friendliness_score_out_of_10": max(0, min(10, score)),
+        "positive_points": positives,
+        "potential_issues_and_recommendations": issues,
+    }
+
+
+def merge_enrichment(local_result, llm_result):
+    """
+    Merges an LLM answer into a local result of the same shape: the LLM's list items
+    come first, followed by local items it did not already cover, and the LLM's score
+    is used when it gave one. Returns the local result if the LLM call failed.
+    """
+    if not isinstance(llm_result, dict) or "error" in llm_result or not llm_result:
+        return local_result
+    merged = dict(llm_result)
+    for key, local_value in local_result.items():
+        llm_value = llm_result.get(key)
+        if isinstance(local_value, list) and isinstance(llm_value, list):
+            llm_text = " ".join(str(item).lower() for item in llm_value)
+            merged[key] = llm_value + [item for item in local_value if str(item).split(" - ")[0].lower() not in llm_text]
+        elif llm_value in (None, "", []):
+            merged[key] = local_value
+    return merged
+
+
+# --- Contact Pre-extraction ---
+CONTACT_FIELDS = ("email", "phone", "linkedin", "github", "portfolio")
+# Fields whose local value is matched by a strict pattern, so it is preferred over
+# Gemini's. The name and personal site are heuristic guesses and only fill gaps.
+_VALIDATED_CONTACT_FIELDS = ("email", "phone", "linkedin", "github")
+_HEADER_LINES = 8 # the name and contact details are expected near the top
+# Words that show an early capitalized line is a title or heading rather than a name.
+_NON_NAME_WORDS = {
+    "resume", "résumé", "cv", "curriculum", "vitae", "contact", "profile", "summary", "objective", "experience",
+    "education", "skills", "engineer", "developer", "manager", "scientist", "analyst", "designer", "consultant",
+    "intern", "senior", "junior", "lead", "director", "specialist", "architect", "administrator", "officer",
+}
+
+def _full_url(url):
+    url = url.rstrip("/.")
+    return url if url.lower().startswith(("http://", "https://")) else f"https://{url}"
+
+def _name_candidate(lines):
+    """Returns the first early line that looks like a person's name (2-4 capitalized words)."""
+    for line in lines[:_HEADER_LINES]:
+        candidate = re.split(r"\s[|•·,–-]\s", line.strip())[0].strip()
+        words = candidate.split()
+        if not 2 <= len(words) <= 4 or candidate.lower().strip(":") in STANDARD_SECTIONS:
+            continue
+        if any(char.isdigit() for char in candidate) or "@" in candidate or "/" in candidate:
+            continue
+        if any(word.lower().strip(".,:") in _NON_NAME_WORDS for word in words):
+            continue
+        normalized = candidate.title() if candidate.isupper() else candidate
+        if all(_NAME_WORD.match(word) for word in normalized.split()):
+            return normalized
+    return None
+
+def extract_contact_details(resume_text):
+    """
+    Finds the candidate's name (a best guess from the first lines) and contact details
+    with regular expressions. Returns {"name", "contact_information"} shaped like the
+    EXTRACT prompt's output, with "N/A" for anything not found.
+    """
+    lines = [line for line in resume_text.split("\n") if line.strip()]
+    contact = dict.fromkeys(CONTACT_FIELDS, "N/A")
+
+    email = _EMAIL.search(resume_text)
+    if email:
+        contact["email"] = email.group().rstrip(".")
+    for match in _PHONE.finditer(resume_text):
+        if len(re.sub(r"\D", "", match.group())) >= 9:
+            contact["phone"] = match.group().strip()
+            break
+    linkedin = _LINKEDIN_URL.search(resume_text)
+    if linkedin:
+        contact["linkedin"] = _full_url(linkedin.group())
+    github = _GITHUB_URL.search(resume_text)
+    if github:
+        contact["github"] = _full_url(github.group())
+    # A personal site is any other URL in the header that is not an email domain.
+    header = "\n".join(lines[:_HEADER_LINES])
+    email_domain = email.group().split("@")[1].lower() if email else None
+    for match in _WEB_URL.finditer(header):
+        url = match.group()
+        lowered = url.lower()
+        if "linkedin.com" in lowered or "github.com" in lowered or "@" in header[max(0, match.start() - 1):match.start()]:
+            continue
+        if email_domain and lowered.rstrip("/.").endswith(email_domain):
+            continue
+        contact["portfolio"] = _full_url(url)
+        break
+
+    return {"name": _name_candidate(lines) or "N/A", "contact_information": contact}
+
+def is_confident_contact_extraction(details):
+    """True when a name and at least one way to reach the candidate were found."""
+    contact = details["contact_information"]
+    return details["name"] != "N/A" and (contact["email"] != "N/A" or contact["phone"] != "N/A")
+
+def merge_contact_details(local_details, extracted_details):
+    """
+    Fills in `extracted_details` (Gemini's extraction result) with the locally found
+    name and contact fields. Regex-validated local fields (email, phone, LinkedIn,
+    GitHub) win; for the name and personal site Gemini's value is kept when it has one,
+    and the local guess only fills the gap (e.g. when the slim extraction prompt did not
+    ask for it). Returns a new dict, or `extracted_details` unchanged if it is an error.
+    """
+    if not isinstance(extracted_details, dict) or "error" in extracted_details:
+        return extracted_details
+
+    def found(value):
+        return bool(value) and value != "N/A"
+
+    merged = {"name": extracted_details.get("name") if found(extracted_details.get("name")) else local_details["name"]}
+    llm_contact = extracted_details.get("contact_information")
+    llm_contact = llm_contact if isinstance(llm_contact, dict) else {}
+    merged["contact_information"] = {}
+    for field, value in local_details["contact_information"].items():
+        if not (found(value) and field in _VALIDATED_CONTACT_FIELDS) and found(llm_contact.get(field)):
+            value = llm_contact[field]
+        merged["contact_information"][field] = value
+    merged.update((key, value) for key, value in extracted_details.items() if key not in merged)
+    return merged
@@ -0,0 +1,205 @@
+# ai_resume_analyzer/metrics.py
+"""
+In-process timing and counter metrics.
+
+Durations and sizes are recorded per (metric name, labels) series; each series keeps
+its count and sum plus the most recent samples, from which p50/p95/max are computed.
+The same data can be exported as Prometheus text (for the node_exporter textfile
+collector or any scraper that reads a file). When METRICS_JSONL_PATH is set, one JSON
+line per Gemini attempt and per analysis task (with all of its timings) is appended
+to that file as well.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MAX_SAMPLES_PER_SERIES = int(os.getenv("METRICS_MAX_SAMPLES", "2000"))
+
+# Label attached to metrics recorded while an analysis task runs on this thread.
+_current_task = threading.local()
+
+
+@contextmanager
+def task_label(task):
+    """Attributes metrics recorded on this thread inside the block to analysis task `task`."""
+    previous = getattr(_current_task, "name", None)
+    _current_task.name = task
+    try:
+        yield
+    finally:
+        _current_task.name = previous
+
+
+def current_task():
+    """Returns the analysis task running on this thread, or "none"."""
+    return getattr(_current_task, "name", None) or "none"
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRecorder:
+    """
+    Thread-safe recorder of observations (durations, sizes) and counters.
+
+        metrics.observe("gemini_generation_seconds", 1.7, model="gemini-1.5-flash")
+        metrics.increment("gemini_cache_lookups_total", result="hit")
+        with metrics.timer("resume_extraction_seconds", file_type="pdf"):
+            ...
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES_PER_SERIES, jsonl_path=None):
+        self.max_samples = max_samples
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._observations = {} # (name, labels) -> {"count", "sum", "max", "samples"}
+        self._counters = {} # (name, labels) -> value
+
+    @staticmethod
+    def _series(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, value, **labels):
+        """Records one observation (e.g. a duration in seconds or a token count)."""
+        series = self._series(name, labels)
+        with self._lock:
+            entry = self._observations.get(series)
+            if entry is None:
+                entry = self._observations[series] = {
+                    "count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=self.max_samples),
+                }
+            entry["count"] += 1
+            entry["sum"] += value
+            entry["max"] = max(entry["max"], value)
+            entry["samples"].append(value)
+
+    def percentile(self, name, fraction, min_count=1, **labels):
+        """
+        Returns the `fraction` quantile (e.g. 0.95) of the recent samples of one series,
+        or None if it has fewer than `min_count` observations.
+        """
+        with self._lock:
+            entry = self._observations.get(self._series(name, labels))
+            if entry is None or entry["count"] < min_count:
+                return None
+            samples = sorted(entry["samples"])
+        return _percentile(samples, fraction)
+
+    def increment(self, name, amount=1, **labels):
+        series = self._series(name, labels)
+        with self._lock:
+            self._counters[series] = self._counters.get(series, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the duration of the block in seconds, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def event(self, kind, **fields):
+        """Appends one structured record (e.g. a finished Gemini attempt) to the JSON lines file, if enabled."""
+        if not self.jsonl_path:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": kind, **fields}, default=str)
+        with self._file_lock: # keeps lines from different threads whole
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def summary(self):
+        """
+        Returns a list of dicts, one per series: name, labels and either count, sum,
+        mean, p50, p95, max (observations) or value (counters), sorted by name.
+        """
+        with self._lock:
+            observations = [(series, dict(entry, samples=sorted(entry["samples"]))) for series, entry in self._observations.items()]
+            counters = list(self._counters.items())
+        rows = []
+        for (name, labels), entry in observations:
+            rows.append({
+                "name": name, "labels": dict(labels), "count": entry["count"], "sum": round(entry["sum"], 6),
+                "mean": round(entry["sum"] / entry["count"], 6) if entry["count"] else 0.0,
+                "p50": round(_percentile(entry["samples"], 0.5), 6), "p95": round(_percentile(entry["samples"], 0.95), 6),
+                "max": round(entry["max"], 6),
+            })
+        for (name, labels), value in counters:
+            rows.append({"name": name, "labels": dict(labels), "value": value})
+        return sorted(rows, key=lambda row: (row["name"], sorted(row["labels"].items())))
+
+    def prometheus_text(self):
+        """Returns every series in the Prometheus text exposition format (observations as summaries)."""
+        lines = []
+        declared = set()
+        for row in self.summary():
+            name = row["name"]
+            label_parts = [f'{key}="{_escape_label(value)}"' for key, value in sorted(row["labels"].items())]
+            if "value" in row:
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                lines.append(f"{name}{{{','.join(label_parts)}}} {row['value']}")
+                continue
+            if name not in declared:
+                lines.append(f"# TYPE {name} summary")
+                declared.add(name)
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                quantile_labels = ",".join(label_parts + ['quantile="%s"' % quantile])
+                lines.append(f"{name}{{{quantile_labels}}} {row[key]}")
+            lines.append(f"{name}_sum{{{','.join(label_parts)}}} {row['sum']}")
+            lines.append(f"{name}_count{{{','.join(label_parts)}}} {row['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes prometheus_text() to `path` atomically (write to a temp file, then rename)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._observations.clear()
+            self._counters.clear()
+
+
+# --- Process-wide default recorder ---
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+def get_default_metrics():
+    """Returns the shared recorder, creating it on first use (METRICS_JSONL_PATH enables the event log)."""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = MetricsRecorder(jsonl_path=os.getenv("METRICS_JSONL_PATH") or None)
+        return _default_metrics
+
+def set_default_metrics(recorder):
+    """Replaces the shared recorder."""
+    global _default_metrics
+    with _default_metrics_lock:
+        _default_metrics = recorder
+
+def export_metrics_from_env():
+    """Writes the Prometheus text file to METRICS_PROMETHEUS_PATH, if set. Returns the path or None."""
+    path = os.getenv("METRICS_PROMETHEUS_PATH")
+    if path:
+        get_default_metrics().write_prometheus(path)
+    return path or None
@@ -0,0 +1,150 @@
+# ai_resume_analyzer/model_routing.py
+"""
+Which Gemini model answers each analysis task, and how long it may take.
+
+MODEL_ROUTES maps each analysis key to a primary model, a fallback model and a
+latency budget: the time the task may spend across all of its attempts, including
+waiting for a rate-limit slot and backing off between retries.
+Calls run on a shared pool of call threads, so the caller stops waiting when the
+budget is spent instead of hanging on a stuck request. A call that is still running
+after the recent p95 latency of its task and model is hedged: the same request is
+sent to the fallback model and the first answer wins. Retries after a failed attempt
+also go to the fallback model. Hedge delays come from the latencies measured in this
+process, so they adapt without per-deployment tuning.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import current_task, get_default_metrics
+
+DEFAULT_GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+# Smaller and faster; set GEMINI_FALLBACK_MODEL to "" to hedge and retry with the primary model.
+DEFAULT_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-1.5-flash-8b-latest")
+
+HEDGING_ENABLED = os.getenv("GEMINI_HEDGING", "on").lower() not in ("0", "off", "false", "no")
+HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))
+# Calls measured per task and model before their quantile is trusted; until then a
+# call is hedged halfway through its budget.
+HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = 0.1 # keeps near-instant (cached or stand-in) calls from being hedged on scheduling jitter
+CALL_WORKERS = int(os.getenv("GEMINI_CALL_WORKERS", "64"))
+
+
+def _route(deadline_seconds, model=DEFAULT_GEMINI_MODEL, fallback=DEFAULT_FALLBACK_MODEL):
+    return {"model": model, "fallback": fallback or None, "deadline_seconds": deadline_seconds}
+
+# Latency budgets in seconds (0 = no limit). Extraction, suggestions and grammar feedback
+# produce the longest answers; the combined prompt answers every task at once.
+MODEL_ROUTES = {
+    "extracted_details": _route(60),
+    "strengths_weaknesses_missing": _route(45),
+    "improvement_suggestions": _route(60),
+    "job_match": _route(45),
+    "skill_gap": _route(45),
+    "ats_check": _route(45),
+    "grammar_clarity": _route(60),
+    "combined": _route(120),
+}
+DEFAULT_ROUTE = _route(60)
+
+def model_route(task=None):
+    """
+    Returns the route of analysis task `task` (by default the task running on this
+    thread, see metrics.task_label): {"model", "fallback", "deadline_seconds"}.
+    """
+    return MODEL_ROUTES.get(task or current_task(), DEFAULT_ROUTE)
+
+
+def hedge_delay(task, model_name, timeout=None):
+    """
+    Seconds after which a call of `task` to `model_name` is hedged: the HEDGE_QUANTILE
+    of its recent call times, but never later than halfway through `timeout`, so the
+    hedge still has time to answer. None when hedging is off, or when neither the
+    quantile nor a timeout is known.
+    """
+    if not HEDGING_ENABLED:
+        return None
+    delay = get_default_metrics().percentile("gemini_call_seconds", HEDGE_QUANTILE, min_count=HEDGE_MIN_SAMPLES,
+                                             task=task, model=model_name, status="ok")
+    if timeout:
+        delay = timeout / 2 if delay is None else min(delay, timeout / 2)
+    return None if delay is None else max(delay, HEDGE_MIN_DELAY_SECONDS)
+
+
+_call_pool = None
+_call_pool_lock = threading.Lock()
+
+def _get_call_pool():
+    global _call_pool
+    with _call_pool_lock:
+        if _call_pool is None:
+            _call_pool = ThreadPoolExecutor(max_workers=CALL_WORKERS, thread_name_prefix="gemini-call")
+        return _call_pool
+
+def _timed_call(send, task, model_name):
+    # Measured on the call thread when the call ends, so calls that lose a hedge or
+    # outlive the caller's budget are counted too. Hedge delays use the status="ok"
+    # series; failed calls (often ended by the timeout itself) would only push it up.
+    started = time.perf_counter()
+    status = "error"
+    try:
+        result = send()
+        status = "ok"
+        return result
+    finally:
+        get_default_metrics().observe("gemini_call_seconds", time.perf_counter() - started, task=task, model=model_name,
+                                      status=status)
+
+def first_response(send, model_name, hedge=None, hedge_model=None, timeout=None):
+    """
+    Runs `send()`, a request to `model_name`, on a call thread and waits at most
+    `timeout` seconds (None: no limit) for it. If `hedge` is given and `send` has not
+    answered after hedge_delay(), `hedge()` (the same request to `hedge_model`) is
+    started as well, and the first successful answer wins.
+    Returns (answer, hedged). Raises TimeoutError when nothing answered in time, or the
+    last error when every call failed. Calls still running are abandoned (counted in
+    gemini_calls_abandoned_total; each keeps a call-pool thread until it ends), so give
+    them the timeout as well so that they end on their own.
+    """
+    task = current_task()
+    metrics = get_default_metrics()
+    pool = _get_call_pool()
+    started = time.monotonic()
+    deadline = None if timeout is None else started + timeout
+    hedge_at = None
+    if hedge is not None:
+        delay = hedge_delay(task, model_name, timeout)
+        hedge_at = None if delay is None else started + delay
+    pending = {pool.submit(_timed_call, send, task, model_name): False}
+    error = None
+    while pending:
+        wake_at = min((moment for moment in (deadline, hedge_at) if moment is not None), default=None)
+        done, _ = wait(pending, timeout=None if wake_at is None else max(0.0, wake_at - time.monotonic()),
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            hedged = pending.pop(future)
+            try:
+                answer = future.result()
+            except Exception as e:
+                error = e
+                continue
+            for loser in pending:
+                if not loser.cancel(): # cancel() only stops a call that has not started yet
+                    metrics.increment("gemini_calls_abandoned_total", task=task, reason="hedge_lost")
+            if hedged:
+                metrics.increment("gemini_hedge_wins_total", task=task, model=hedge_model)
+            return answer, hedged
+        now = time.monotonic()
+        if hedge_at is not None and now >= hedge_at and pending:
+            pending[pool.submit(_timed_call, hedge, task, hedge_model)] = True
+            hedge_at = None
+            metrics.increment("gemini_hedged_requests_total", task=task, model=model_name)
+        if deadline is not None and now >= deadline and pending:
+            for future in pending:
+                if not future.cancel():
+                    metrics.increment("gemini_calls_abandoned_total", task=task, reason="deadline")
+            raise TimeoutError(f"no answer from {model_name} within {timeout:g}s")
+    raise error
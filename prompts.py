@@ -63,6 +63,62 @@ Ensure the JSON is valid.
 """
 
 
+# --- SLIMMER EXTRACTION PROMPT (name and contact details found locally) ---
+EXTRACT_SLIM_PROMPT_TEMPLATE = """
+Analyze the following resume text and extract the information in a structured JSON format.
+If a field is not found, use "N/A" as the value for strings, or an empty list [] for lists.
+The candidate's name and contact details have already been extracted; do not include them.
+
+Resume Text:
+'''{resume_text}'''
+
+Desired JSON Structure:
+{{
+  "summary": "A brief professional summary or objective. If not present, provide 'N/A'.",
+  "skills": [
+    "Skill 1",
+    "Skill 2"
+  ],
+  "work_experience": [
+    {{
+      "job_title": "Job Title",
+      "company": "Company Name",
+      "location": "Location (City, State)",
+      "dates": "Employment Dates (e.g., MM/YYYY - MM/YYYY or MM/YYYY - Present)",
+      "responsibilities": [
+        "Responsibility/Accomplishment 1 (use action verbs)",
+        "Responsibility/Accomplishment 2 (quantify if possible)"
+      ]
+    }}
+  ],
+  "education": [
+    {{
+      "degree": "Degree Name (e.g., Bachelor of Science in Computer Science)",
+      "institution": "Institution Name",
+      "location": "Location (City, State)",
+      "graduation_date": "Graduation Date (e.g., MM/YYYY or Expected MM/YYYY)",
+      "details": "Optional: GPA, relevant coursework, honors. If none, 'N/A'."
+    }}
+  ],
+  "projects": [
+    {{
+      "project_name": "Project Name",
+      "description": "Brief description of the project, highlighting your role and impact.",
+      "technologies_used": ["Tech 1", "Tech 2"],
+      "link": "Project URL (if available, full URL)"
+    }}
+  ],
+  "certifications_and_awards": [
+      "Certification/Award 1",
+      "Certification/Award 2"
+  ]
+}}
+
+Provide ONLY the JSON object as a single block of text, without any surrounding text or markdown formatting like ```json ... ```.
+Ensure the JSON is valid.
+"""
+
+
 # --- PROMPT FOR STRENGTHS, WEAKNESSES, MISSING SKILLS ---
 ANALYSIS_PROMPT_TEMPLATE = """
 Analyze the following resume text specifically for the job role of '{job_title}'.
@@ -258,4 +314,41 @@ Provide feedback in the following structured JSON format:
 }}
 Provide ONLY the JSON object as a single block of text, without any surrounding text or markdown formatting like ```json ... ```.
 Ensure the JSON is valid.
-"""
\ No newline at end of file
+"""
+
+# --- PROMPT FOR COMBINED (SINGLE-CALL) ANALYSIS ---
+# Wraps the individual task prompts above so the resume (and JD) are sent only once.
+# {task_sections} holds each task prompt, with the resume/JD replaced by the references below.
+COMBINED_RESUME_REFERENCE = "(see the Resume Text at the top of this prompt)"
+COMBINED_JD_REFERENCE = "(see the Job Description at the top of this prompt)"
+
+COMBINED_ANALYSIS_PROMPT_TEMPLATE = """
+You will perform several independent analyses of the same resume in a single response.
+Each task below describes one analysis and the JSON structure it must produce.
+Whenever a task refers to the resume text or job description, use the ones given here.
+
+Resume Text:
+'''{resume_text}'''
+
+{job_description_section}
+
+{task_sections}
+
+Return ONE JSON object whose top-level keys are exactly: {result_keys}.
+The value of each key must be the JSON object requested by the task of the same name.
+Provide ONLY the JSON object as a single block of text, without any surrounding text or markdown formatting like ```json ... ```.
+Ensure the JSON is valid.
+"""
+
+# --- SHARED RESUME CONTEXT ---
+# Standalone task prompts are sent after this block, with the resume/JD in the task
+# replaced by the COMBINED_*_REFERENCE texts above. The block is the same for every task
+# of one analysis, so it forms a common prompt prefix, or is stored once as Gemini
+# cached content (see utils.shared_context).
+SHARED_CONTEXT_TEMPLATE = """
+The resume below will be analyzed by several independent tasks.
+A task follows this context; perform only that task.
+
+Resume Text:
+'''{resume_text}'''
+"""
@@ -0,0 +1,154 @@
+# ai_resume_analyzer/rank_resumes.py
+"""
+Recruiter mode from the command line: maintain the local resume index and rank it
+against a job description.
+
+Indexing and ranking run entirely on this machine (see resume_index.py); only with
+--analyze are the best-ranked resumes sent through the job match and skill gap
+prompts, so a pool of thousands of resumes costs a handful of Gemini calls.
+
+Examples:
+    python rank_resumes.py add sample_resumes/ --batch-results results.jsonl
+    python rank_resumes.py rank --job-title "Data Engineer" --jd-file jd.txt --top 20 --analyze 5
+    python rank_resumes.py list
+    python rank_resumes.py remove sample_resume_1.txt
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from analysis_engine import DEFAULT_SHORTLIST_SIZE, run_shortlist_analysis
+from batch_analyze import extract_resume_text, find_resumes
+from rate_limiter import PRIORITY_BATCH
+from resume_index import DEFAULT_INDEX_PATH, ResumeIndex, index_path_from_env
+from utils import load_api_key, DEFAULT_MAX_PARALLEL_TASKS
+
+
+def load_batch_skills(results_path):
+    """Maps file SHA-256 -> extracted_details skills from a batch_analyze.py output file."""
+    skills = {}
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            details = (record.get("results") or {}).get("extracted_details")
+            if isinstance(details, dict) and isinstance(details.get("skills"), list) and record.get("file_sha256"):
+                skills[record["file_sha256"]] = details["skills"]
+    return skills
+
+
+def add_folder(index, folder, batch_results=None):
+    """Indexes every resume in `folder` (re-adding a file replaces it). Returns (added, failed)."""
+    batch_skills = load_batch_skills(batch_results) if batch_results else {}
+    documents, failed = [], 0
+    for path in find_resumes(folder):
+        with open(path, "rb") as f:
+            file_sha256 = hashlib.sha256(f.read()).hexdigest()
+        resume_text, error = extract_resume_text(path)
+        if error:
+            print(f"[error] {path}: {error}", file=sys.stderr)
+            failed += 1
+            continue
+        documents.append({"resume_text": resume_text, "name": os.path.basename(path), "skills": batch_skills.get(file_sha256),
+                          "metadata": {"file": path, "file_sha256": file_sha256}})
+    index.add_many(documents)
+    return len(documents), failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index resumes locally and rank them against a job description.")
+    parser.add_argument("--index", help="Index file (defaults to RESUME_INDEX_PATH or .cache/resume_index.sqlite3)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="Index every .pdf/.txt resume in a folder")
+    add_parser.add_argument("folder")
+    add_parser.add_argument("--batch-results", help="batch_analyze.py output whose extracted skills are indexed as well")
+
+    remove_parser = commands.add_parser("remove", help="Remove resumes by file name or document id")
+    remove_parser.add_argument("names", nargs="+")
+
+    commands.add_parser("list", help="List the indexed resumes")
+
+    rank_parser = commands.add_parser("rank", help="Rank the indexed resumes against a job")
+    rank_parser.add_argument("--job-title", required=True, help="Target job title")
+    rank_parser.add_argument("--jd-file", help="Text file with the job description (strongly recommended)")
+    rank_parser.add_argument("--top", type=int, default=20, help="Resumes to list")
+    rank_parser.add_argument("--analyze", type=int, default=0, metavar="K",
+                             help=f"Send the best K resumes through the job match and skill gap prompts (e.g. {DEFAULT_SHORTLIST_SIZE})")
+    rank_parser.add_argument("--workers", type=int, default=DEFAULT_MAX_PARALLEL_TASKS, help="Resumes analyzed at the same time")
+    rank_parser.add_argument("--output", help="Also write the ranking (and analyses) to this JSON file")
+    rank_parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    rank_parser.add_argument("--api-key", help="Gemini API key (defaults to GOOGLE_API_KEY_ENV from .env)")
+    args = parser.parse_args(argv)
+
+    index = ResumeIndex(args.index or index_path_from_env() or DEFAULT_INDEX_PATH)
+
+    if args.command == "add":
+        started = time.time()
+        added, failed = add_folder(index, args.folder, args.batch_results)
+        print(f"Indexed {added} resume(s) in {time.time() - started:.1f}s ({failed} failed); {len(index)} in the index.",
+              file=sys.stderr)
+        return 0 if failed == 0 else 1
+
+    if args.command == "list":
+        for document in index.documents():
+            print(f"{document['doc_id'][:12]}  {document['name']}  ({document['length']} words)")
+        return 0
+
+    if args.command == "remove":
+        by_name = {}
+        for document in index.documents():
+            by_name.setdefault(document["name"], []).append(document["doc_id"])
+        doc_ids = []
+        for name in args.names:
+            matches = by_name.get(name) or [doc_id for ids in by_name.values() for doc_id in ids if doc_id.startswith(name)]
+            if not matches:
+                print(f"Not in the index: {name}", file=sys.stderr)
+            doc_ids.extend(matches)
+        removed = index.remove_many(doc_ids)
+        print(f"Removed {removed} resume(s); {len(index)} left.", file=sys.stderr)
+        return 0
+
+    job_description = ""
+    if args.jd_file:
+        with open(args.jd_file, encoding="utf-8") as f:
+            job_description = f.read().strip()
+    started = time.perf_counter()
+    ranked = index.search(job_description, args.job_title, top_k=max(args.top, args.analyze))
+    print(f"Ranked {len(index)} resume(s) in {(time.perf_counter() - started) * 1000:.1f} ms.", file=sys.stderr)
+    for rank, hit in enumerate(ranked[:args.top], 1):
+        print(f"{rank:>3}. {hit['name']:<40} {hit['score']:>8.2f}  skills: {', '.join(hit['matched_skills']) or '-'}"
+              f"{'  missing: ' + ', '.join(hit['missing_skills']) if hit['missing_skills'] else ''}")
+
+    candidates = []
+    if args.analyze:
+        # load_api_key looks at st.secrets, and Streamlit only logs noise when there is no running app.
+        logging.getLogger("streamlit").setLevel(logging.ERROR)
+        if not load_api_key(api_key_input=args.api_key):
+            parser.error("No Gemini API key found. Pass --api-key or set GOOGLE_API_KEY_ENV in .env.")
+        print(f"Analyzing the best {min(args.analyze, len(ranked))} resume(s) with Gemini...", file=sys.stderr)
+        candidates = run_shortlist_analysis(index, args.job_title, job_description, top_k=args.analyze, ranked=ranked,
+                                            max_workers=args.workers, use_cache=not args.no_cache, priority=PRIORITY_BATCH)
+        print("\nShortlist by job match:")
+        for candidate in candidates:
+            match = candidate["job_match_percentage"]
+            print(f"  {candidate['name']:<40} match {'n/a' if match is None else f'{match:.0f}%'}"
+                  f"  (index rank {candidate['index_rank']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"job_title": args.job_title, "ranked": ranked[:args.top], "shortlist": candidates}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
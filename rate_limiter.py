@@ -0,0 +1,219 @@
+# ai_resume_analyzer/rate_limiter.py
+"""
+Process-wide rate limiting and scheduling for Gemini calls.
+
+Every request first acquires a slot from a shared scheduler that enforces
+requests-per-minute and tokens-per-minute limits with token buckets. Waiting
+requests are served by priority class (interactive clicks before batch jobs) and
+then in arrival order. When the API reports a quota error, the whole scheduler
+pauses for an exponentially growing, jittered delay instead of letting every
+caller retry immediately. Queue depth and wait times are kept for capacity sizing.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+# Limits per minute; 0 disables the corresponding limit.
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "60.0"))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """
+    Returns an exponential backoff delay for a 0-based retry attempt: half of
+    min(cap, base * 2**attempt) plus a random part of up to the other half.
+    """
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# A 429 status code as API errors print it ("429 Resource has been exhausted", "HTTP 429",
+# "status code 429"), or quota wording; not any message that happens to contain "429".
+_QUOTA_MESSAGE = re.compile(
+    r"^\s*429\b|\b(?:http|status|code|error)\W{0,3}(?:code\W{0,3})?429\b|\bquota\b|\brate[ -]limit|"
+    r"\bresource(?: has been)? exhausted\b|\btoo many requests\b",
+    re.IGNORECASE,
+)
+
+def is_quota_error(error):
+    """True if `error` looks like an HTTP 429 / resource-exhausted response from the API."""
+    code = getattr(error, "code", None)
+    if code == 429 or getattr(code, "value", None) == 429:
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    return bool(_QUOTA_MESSAGE.search(str(error)))
+
+
+class TokenBucket:
+    """A bucket holding up to `capacity` units that refills at `per_minute` units per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.available = float(per_minute)
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill(now)
+        # A request larger than the whole bucket only waits for a full bucket.
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_per_second
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Returns (positive) or charges (negative) units after the real cost is known."""
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RequestScheduler:
+    """
+    Hands out request slots under per-minute request and token limits, serving
+    waiting callers by (priority, arrival order). Thread-safe; share one per process.
+
+        scheduler.acquire(estimated_tokens, priority=PRIORITY_INTERACTIVE)
+        response = model.generate_content(...)
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._condition = threading.Condition()
+        self._waiting = [] # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._stats = {
+            "acquired": 0, "quota_errors": 0, "timed_out": 0,
+            "total_wait_seconds": 0.0, "max_wait_seconds": 0.0,
+        }
+        self._acquired_by_priority = {}
+
+    def _wait_time(self, tokens, now):
+        wait = max(0.0, self._paused_until - now)
+        if self._request_bucket:
+            wait = max(wait, self._request_bucket.wait_time(1, now))
+        if self._token_bucket:
+            wait = max(wait, self._token_bucket.wait_time(tokens, now))
+        return wait
+
+    def acquire(self, tokens=0, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        Blocks until a request costing `tokens` may be sent. Returns the seconds waited.
+        Raises TimeoutError if that is not possible within `timeout` seconds (None: no limit).
+        """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    left = None if deadline is None else deadline - now
+                    if self._waiting[0] == entry:
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            break
+                        if left is not None and wait > left: # the slot cannot come in time
+                            self._stats["timed_out"] += 1
+                            raise TimeoutError(f"no rate-limit slot within {timeout:g}s")
+                        self._condition.wait(wait)
+                    else:
+                        if left is not None and left <= 0:
+                            self._stats["timed_out"] += 1
+                            raise TimeoutError(f"no rate-limit slot within {timeout:g}s")
+                        self._condition.wait(left)
+            except BaseException: # e.g. a timeout or KeyboardInterrupt while waiting: leave the queue
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            if self._request_bucket:
+                self._request_bucket.take(1)
+            if self._token_bucket:
+                self._token_bucket.take(tokens)
+            self._condition.notify_all() # the next caller in line re-checks the limits
+
+            waited = time.monotonic() - started
+            self._stats["acquired"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            self._acquired_by_priority[priority] = self._acquired_by_priority.get(priority, 0) + 1
+        return waited
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Corrects the token bucket once the real token count of a request is known."""
+        if self._token_bucket and actual_tokens is not None:
+            with self._condition:
+                self._token_bucket.adjust(estimated_tokens - actual_tokens)
+                self._condition.notify_all()
+
+    def report_quota_error(self, attempt):
+        """
+        Pauses all callers after the API rejected a request for exceeding its quota.
+        Returns the pause in seconds (exponential in `attempt`, with jitter).
+        """
+        delay = backoff_delay(attempt)
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._stats["quota_errors"] += 1
+        return delay
+
+    def stats(self):
+        """Returns queue depth, wait-time and quota-error counters."""
+        with self._condition:
+            snapshot = dict(self._stats)
+            depth_by_priority = {}
+            for priority, _ in self._waiting:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth_by_priority[name] = depth_by_priority.get(name, 0) + 1
+            snapshot["queue_depth"] = len(self._waiting)
+            snapshot["queue_depth_by_priority"] = depth_by_priority
+            snapshot["acquired_by_priority"] = {
+                PRIORITY_NAMES.get(priority, str(priority)): count for priority, count in self._acquired_by_priority.items()
+            }
+            snapshot["paused_for_seconds"] = round(max(0.0, self._paused_until - time.monotonic()), 3)
+        snapshot["avg_wait_seconds"] = round(snapshot["total_wait_seconds"] / snapshot["acquired"], 3) if snapshot["acquired"] else 0.0
+        snapshot["total_wait_seconds"] = round(snapshot["total_wait_seconds"], 3)
+        snapshot["max_wait_seconds"] = round(snapshot["max_wait_seconds"], 3)
+        return snapshot
+
+
+# --- Process-wide default scheduler ---
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_default_scheduler():
+    """Returns the shared scheduler used by get_gemini_response, creating it on first use."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+def set_default_scheduler(scheduler):
+    """Replaces the shared scheduler (e.g. with different limits)."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = scheduler
@@ -0,0 +1,416 @@
+# ai_resume_analyzer/resume_index.py
+"""
+Local full-text index of many resumes, for ranking them against a job description.
+
+Resumes are tokenized into an inverted index (term -> {row: term frequency}). Known
+skills (local_analysis.SKILL_DICTIONARY, plus any skills Gemini extracted) are indexed
+as extra "skill:" terms, so a JD that asks for "Kubernetes" also finds "k8s". A query
+is scored with Okapi BM25, one NumPy operation per query term over that term's
+posting arrays, so ranking thousands of resumes takes milliseconds and only the
+shortlist needs Gemini (see analysis_engine.run_shortlist_analysis).
+
+With a path, documents are stored in an SQLite file (WAL mode, short-lived
+connections, as in analysis_store) and the in-memory index is rebuilt from it on
+open; adds and removals are written through, and other processes' changes are picked
+up by the next call.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from analysis_store import decode_value, encode_value, text_hash
+from local_analysis import get_skill_matcher
+from metrics import get_default_metrics
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SKILL_TERM_PREFIX = "skill:"
+SKILL_QUERY_WEIGHT = 2.0 # a skill named in the JD counts twice as much as a plain word
+TITLE_QUERY_WEIGHT = 1.5 # extra weight for words of the job title
+
+_TERM = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[./-][a-z0-9+#]+)*")
+STOP_WORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can could did do does
+during each etc for from had has have having he her his how i if in into is it its may me more most
+my no not of on or our out over own per she should so some such than that the their them then there
+these they this those through to too under up us very was we were what when where which while who
+will with within would you your
+ability able experience experienced years year work working worked team teams strong including
+using used use across plus etc knowledge understanding responsibilities requirements required
+preferred role position candidate looking join company new well good great excellent
+""".split())
+
+
+def tokenize(text):
+    """Lowercase words of `text` (keeping terms like c++, c#, node.js, ci/cd), without stop words and bare numbers."""
+    return [term for term in _TERM.findall((text or "").lower()) if term not in STOP_WORDS and not term.isdigit()]
+
+
+def _skill_term(skill):
+    return SKILL_TERM_PREFIX + " ".join(skill.split()).casefold()
+
+
+def document_terms(resume_text, skills=None, matcher=None):
+    """
+    Returns ({term: frequency}, length) for one resume. The length counts word terms
+    only; skills from the dictionary (and from `skills`, e.g. extracted_details["skills"])
+    are added as "skill:" terms.
+    """
+    terms = {}
+    words = tokenize(resume_text)
+    for word in words:
+        terms[word] = terms.get(word, 0) + 1
+    matcher = matcher or get_skill_matcher()
+    for skill, mentions in matcher.find(resume_text or "").items():
+        terms[_skill_term(skill)] = terms.get(_skill_term(skill), 0) + mentions
+    for skill in skills or ():
+        if not isinstance(skill, str) or not skill.strip():
+            continue
+        for canonical in matcher.find(skill) or {skill: 1}:
+            terms.setdefault(_skill_term(canonical), 1)
+    return terms, len(words)
+
+
+def query_terms(job_description, job_title="", matcher=None):
+    """
+    Returns ({term: weight}, {skill term: skill name}) for a job: words weighted by
+    1 + log(count), job title words and dictionary skills weighted extra.
+    """
+    counts = {}
+    for word in tokenize(job_description):
+        counts[word] = counts.get(word, 0) + 1
+    weights = {term: 1.0 + math.log(count) for term, count in counts.items()}
+    for word in set(tokenize(job_title)):
+        weights[word] = weights.get(word, 1.0) + TITLE_QUERY_WEIGHT
+    matcher = matcher or get_skill_matcher()
+    skills = {}
+    for skill in matcher.find(f"{job_title or ''}\n{job_description or ''}"):
+        skills[_skill_term(skill)] = skill
+        weights[_skill_term(skill)] = SKILL_QUERY_WEIGHT
+    return weights, skills
+
+
+class ResumeIndex:
+    """
+    BM25 index of resumes, kept in memory and optionally persisted to an SQLite file.
+
+        index = ResumeIndex(".cache/resume_index.sqlite3")
+        doc_id = index.add_resume(resume_text, name="jane_doe.pdf")
+        shortlist = index.search(job_description, job_title="Data Engineer", top_k=20)
+        index.remove(doc_id)
+
+    Document ids default to the SHA-256 of the resume text, the same key the analysis
+    store uses, so adding a resume twice replaces it instead of duplicating it.
+    """
+
+    def __init__(self, path=None, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._generation = None # last change seen in the SQLite file
+        self._texts = {} # doc_id -> text, only without a path
+        self._stats = {"searches": 0, "last_search_ms": 0.0, "reloads": 0}
+        self._reset()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS documents ("
+                    " doc_id TEXT PRIMARY KEY,"
+                    " name TEXT NOT NULL,"
+                    " text BLOB NOT NULL,"
+                    " terms BLOB NOT NULL,"
+                    " length INTEGER NOT NULL,"
+                    " metadata BLOB NOT NULL,"
+                    " added_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO index_meta (key, value) VALUES ('generation', 0)")
+            self._sync()
+
+    # --- In-memory structures ---
+    def _reset(self, capacity=64):
+        self._doc_ids = [] # row -> doc_id (None once removed)
+        self._rows = {} # doc_id -> row
+        self._docs = [] # row -> {"name", "terms", "length", "metadata", "added_at"} (None once removed)
+        self._lengths = np.zeros(capacity, dtype=np.float32)
+        self._postings = {} # term -> {row: frequency}
+        self._arrays = {} # term -> (rows, frequencies) as arrays; dropped when the term's postings change
+        self._total_length = 0
+
+    def _insert(self, doc_id, doc):
+        if doc_id in self._rows:
+            self._delete(doc_id)
+        row = len(self._doc_ids)
+        if row == len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(row, dtype=np.float32)])
+        self._doc_ids.append(doc_id)
+        self._docs.append(doc)
+        self._rows[doc_id] = row
+        self._lengths[row] = doc["length"]
+        self._total_length += doc["length"]
+        for term, frequency in doc["terms"].items():
+            self._postings.setdefault(term, {})[row] = frequency
+            self._arrays.pop(term, None)
+
+    def _delete(self, doc_id):
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        doc = self._docs[row]
+        for term in doc["terms"]:
+            postings = self._postings[term]
+            del postings[row]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= doc["length"]
+        self._lengths[row] = 0
+        self._doc_ids[row] = None
+        self._docs[row] = None
+        # Removed rows stay empty until there are more of them than live documents.
+        if len(self._doc_ids) > 64 and len(self._rows) * 2 < len(self._doc_ids):
+            self._compact()
+        return True
+
+    def _compact(self):
+        live = [(doc_id, doc) for doc_id, doc in zip(self._doc_ids, self._docs) if doc_id is not None]
+        self._reset(capacity=max(64, len(live)))
+        for doc_id, doc in live:
+            self._insert(doc_id, doc)
+
+    def _posting_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            arrays = self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+        return arrays
+
+    # --- Persistence ---
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _write(self):
+        """Write transaction that bumps the generation; yields the connection."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE") # no other writer between reading and bumping the generation
+            generation = conn.execute("SELECT value FROM index_meta WHERE key = 'generation'").fetchone()[0]
+            yield conn
+            conn.execute("UPDATE index_meta SET value = ? WHERE key = 'generation'", (generation + 1,))
+        # Another process changed the file since the last sync: reload instead of applying our change alone.
+        stale = generation != self._generation
+        self._generation = generation + 1
+        if stale:
+            self._load()
+
+    def _sync(self):
+        """Reloads the index if the SQLite file was changed by another process (or never loaded)."""
+        if not self.path:
+            return
+        with self._connect() as conn:
+            generation = conn.execute("SELECT value FROM index_meta WHERE key = 'generation'").fetchone()[0]
+        if generation != self._generation:
+            self._load()
+            self._generation = generation
+
+    def _load(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT doc_id, name, terms, length, metadata, added_at FROM documents ORDER BY added_at").fetchall()
+        self._reset(capacity=max(64, len(rows)))
+        for doc_id, name, terms, length, metadata, added_at in rows:
+            self._insert(doc_id, {"name": name, "terms": decode_value(terms), "length": length,
+                                  "metadata": decode_value(metadata), "added_at": added_at})
+        self._stats["reloads"] += 1
+
+    # --- Public API ---
+    def add_resume(self, resume_text, name=None, doc_id=None, skills=None, metadata=None):
+        """Indexes one resume (replacing any document with the same id) and returns its id."""
+        return self.add_many([{"resume_text": resume_text, "name": name, "doc_id": doc_id,
+                               "skills": skills, "metadata": metadata}])[0]
+
+    def add_many(self, documents):
+        """
+        Indexes several resumes in one transaction. Each document is a dict with
+        resume_text and optionally name, doc_id, skills and metadata. Returns their ids.
+        """
+        matcher = get_skill_matcher()
+        prepared = []
+        for document in documents:
+            resume_text = document["resume_text"] or ""
+            doc_id = document.get("doc_id") or text_hash(resume_text)
+            terms, length = document_terms(resume_text, document.get("skills"), matcher)
+            prepared.append((doc_id, resume_text, {
+                "name": document.get("name") or doc_id[:12], "terms": terms, "length": length,
+                "metadata": document.get("metadata") or {}, "added_at": time.time(),
+            }))
+        with self._lock:
+            if self.path:
+                self._sync()
+                with self._write() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO documents (doc_id, name, text, terms, length, metadata, added_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(doc_id, doc["name"], encode_value(resume_text), encode_value(doc["terms"]), doc["length"],
+                          encode_value(doc["metadata"]), doc["added_at"]) for doc_id, resume_text, doc in prepared],
+                    )
+            else:
+                self._texts.update((doc_id, resume_text) for doc_id, resume_text, _ in prepared)
+            for doc_id, _, doc in prepared:
+                self._insert(doc_id, doc)
+        return [doc_id for doc_id, _, _ in prepared]
+
+    def remove(self, doc_id):
+        """Removes a resume from the index. Returns True if it was there."""
+        return self.remove_many([doc_id]) == 1
+
+    def remove_many(self, doc_ids):
+        """Removes several resumes in one transaction. Returns how many were indexed."""
+        doc_ids = list(doc_ids)
+        with self._lock:
+            self._sync()
+            existing = [doc_id for doc_id in doc_ids if doc_id in self._rows]
+            if self.path:
+                with self._write() as conn:
+                    conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+            for doc_id in doc_ids:
+                self._texts.pop(doc_id, None)
+                self._delete(doc_id)
+            return len(existing)
+
+    def clear(self):
+        with self._lock:
+            if self.path:
+                with self._write() as conn:
+                    conn.execute("DELETE FROM documents")
+            self._texts.clear()
+            self._reset()
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._rows)
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            self._sync()
+            return doc_id in self._rows
+
+    def get_text(self, doc_id):
+        """Returns the indexed resume text, or None."""
+        if not self.path:
+            return self._texts.get(doc_id)
+        with self._connect() as conn:
+            row = conn.execute("SELECT text FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return decode_value(row[0]) if row else None
+
+    def documents(self):
+        """Lists the indexed resumes (doc_id, name, length, added_at), oldest first."""
+        with self._lock:
+            self._sync()
+            return [
+                {"doc_id": doc_id, "name": doc["name"], "length": doc["length"], "added_at": doc["added_at"]}
+                for doc_id, doc in zip(self._doc_ids, self._docs) if doc_id is not None
+            ]
+
+    def search(self, job_description, job_title="", top_k=20):
+        """
+        Ranks the indexed resumes against a job with BM25. Returns up to `top_k` dicts
+        (best first) with doc_id, name, score, and the JD's skills the resume has
+        (matched_skills) and lacks (missing_skills). Resumes sharing no term with the
+        job are left out.
+        """
+        started = time.perf_counter()
+        weights, query_skills = query_terms(job_description, job_title)
+        with self._lock:
+            self._sync()
+            count = len(self._rows)
+            if not count or not weights or top_k <= 0:
+                return []
+            rows_used = len(self._doc_ids)
+            average_length = max(self._total_length / count, 1.0)
+            # Per-row length normalization, computed once per query; removed rows have length 0 and no postings.
+            normalization = self.k1 * (1 - self.b + self.b * self._lengths[:rows_used] / average_length)
+            scores = np.zeros(rows_used, dtype=np.float32)
+            for term, weight in weights.items():
+                arrays = self._posting_arrays(term)
+                if arrays is None:
+                    continue
+                rows, frequencies = arrays
+                idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += (weight * idf) * frequencies * (self.k1 + 1) / (frequencies + normalization[rows])
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            results = []
+            for row in candidates.tolist():
+                doc = self._docs[row]
+                results.append({
+                    "doc_id": self._doc_ids[row], "name": doc["name"], "score": round(float(scores[row]), 4),
+                    "matched_skills": sorted(skill for term, skill in query_skills.items() if term in doc["terms"]),
+                    "missing_skills": sorted(skill for term, skill in query_skills.items() if term not in doc["terms"]),
+                })
+        elapsed = time.perf_counter() - started
+        get_default_metrics().observe("resume_index_search_seconds", elapsed)
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["last_search_ms"] = round(elapsed * 1000, 2)
+        return results
+
+    def stats(self):
+        """Returns document and term counts, rows kept for removed documents, and search counters."""
+        with self._lock:
+            return dict(self._stats, documents=len(self._rows), terms=len(self._postings),
+                        removed_rows=len(self._doc_ids) - len(self._rows), path=self.path)
+
+
+# --- Process-wide default index ---
+_default_index = None
+_default_index_lock = threading.Lock()
+
+# Where rank_resumes.py keeps its index when neither --index nor RESUME_INDEX_PATH is given.
+DEFAULT_INDEX_PATH = os.path.join(".cache", "resume_index.sqlite3")
+
+def index_path_from_env():
+    """Returns RESUME_INDEX_PATH, or None when it is unset or "none"."""
+    path = os.getenv("RESUME_INDEX_PATH", "")
+    return None if path.lower() in ("", "none") else path
+
+def create_index_from_env():
+    """Builds an index at RESUME_INDEX_PATH, or an in-memory index when it is not set."""
+    return ResumeIndex(index_path_from_env())
+
+def get_default_index():
+    """Returns the shared resume index, loading it on first use."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = create_index_from_env()
+        return _default_index
+
+def set_default_index(index):
+    """Replaces the shared resume index."""
+    global _default_index
+    with _default_index_lock:
+        _default_index = index
@@ -0,0 +1,204 @@
+# ai_resume_analyzer/text_compaction.py
+"""
+Normalization and token-budget enforcement for extracted resume text.
+
+PDF extraction leaves runs of whitespace, running page headers/footers, page numbers
+and words hyphenated across line breaks. None of that helps the model, and long
+academic CVs can make prompts very large. This module cleans the text up and trims it
+section by section so each prompt stays within a configurable token budget.
+"""
+
+import os
+import re
+import unicodedata
+from collections import Counter
+
+# Maximum estimated tokens per prompt (template + resume). 0 disables truncation.
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+
+_PAGE_NUMBER_LINE = re.compile(r"^\s*(?:-\s*)?(?:page\s*)?\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?(?:\s*-)?\s*$", re.IGNORECASE)
+_PAGE_LABEL = re.compile(r"\bpage\s+\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?\s*$", re.IGNORECASE)
+_HYPHENATED_BREAK = re.compile(r"([a-z])-\n[ \t]*([a-z])")
+_HORIZONTAL_SPACE = re.compile(r"[ \t\f\v\u00a0\u2000-\u200b\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Headings recognised when splitting a resume into sections, and how important each
+# section is when the text has to be shortened (higher is kept longer).
+SECTION_PRIORITIES = {
+    "summary": 5, "profile": 5, "objective": 5, "professional summary": 5,
+    "experience": 5, "work experience": 5, "professional experience": 5, "employment": 5, "employment history": 5,
+    "skills": 5, "technical skills": 5, "core competencies": 5,
+    "education": 4,
+    "projects": 3, "selected projects": 3,
+    "certifications": 3, "certifications and awards": 3, "awards": 2, "honors": 2, "honors and awards": 2,
+    "research": 2, "research experience": 2, "teaching": 2, "teaching experience": 2,
+    "publications": 1, "selected publications": 1, "presentations": 1, "talks": 1, "conferences": 1,
+    "volunteer": 1, "volunteering": 1, "languages": 1, "interests": 1, "hobbies": 1, "references": 1,
+}
+DEFAULT_SECTION_PRIORITY = 2
+HEADER_SECTION_PRIORITY = 6 # name and contact details before the first heading
+MIN_KEPT_LINES = 4 # lines kept from important sections before they are cut further
+
+
+def count_tokens(text):
+    """
+    Estimates the number of model tokens in `text` without calling the API:
+    the larger of one token per word/punctuation mark and one token per 4 characters.
+    """
+    if not text:
+        return 0
+    return max(len(_TOKEN_PATTERN.findall(text)), (len(text) + 3) // 4)
+
+
+def _page_furniture(pages):
+    """
+    Returns the digit-insensitive shapes of lines that recur at the top or bottom of
+    most pages (running headers/footers such as "Jane Doe - CV - 2").
+    """
+    edge_shapes = Counter()
+    for page in pages:
+        page_lines = [line for line in page.split("\n") if line]
+        edges = set(page_lines[:2] + page_lines[-2:])
+        edge_shapes.update({re.sub(r"\d+", "#", line) for line in edges if len(line) <= 80})
+    min_pages = max(2, (len(pages) + 1) // 2)
+    return {shape for shape, count in edge_shapes.items() if count >= min_pages}
+
+
+def normalize_resume_text(text):
+    """
+    Cleans up extracted resume text: unifies Unicode forms (e.g. ligatures), joins words
+    hyphenated across line breaks, drops page-number lines and (when pages are separated
+    by form feeds) running page headers/footers, and collapses runs of spaces and blank lines.
+    """
+    if not text:
+        return text
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHENATED_BREAK.sub(r"\1\2", text)
+    pages = [
+        "\n".join(_HORIZONTAL_SPACE.sub(" ", line).strip() for line in page.split("\n"))
+        for page in text.split("\f")
+    ]
+    furniture = _page_furniture(pages) if len(pages) > 1 else set()
+
+    kept_lines = []
+    seen_furniture = set()
+    for page in pages:
+        for line in page.split("\n"):
+            if line and (_PAGE_NUMBER_LINE.match(line) or (len(line) <= 80 and _PAGE_LABEL.search(line))):
+                continue
+            shape = re.sub(r"\d+", "#", line)
+            if line and shape in furniture:
+                if shape in seen_furniture: # keep the first copy; it is often the name/contact line
+                    continue
+                seen_furniture.add(shape)
+            kept_lines.append(line)
+    return _BLANK_LINES.sub("\n\n", "\n".join(kept_lines)).strip()
+
+
+def _heading_name(line):
+    """Returns the normalized heading name if `line` looks like a section heading, else None."""
+    candidate = line.strip().strip(":").strip()
+    if not candidate or len(candidate) > 40:
+        return None
+    name = re.sub(r"[^a-z ]", "", candidate.lower().replace("&", "and")).strip()
+    name = re.sub(r"\s+", " ", name)
+    if name in SECTION_PRIORITIES:
+        return name
+    # Unknown short ALL-CAPS lines are treated as headings too (e.g. "LEADERSHIP").
+    if candidate.isupper() and len(candidate.split()) <= 4 and name:
+        return name
+    return None
+
+
+def split_sections(text):
+    """
+    Splits resume text into a list of dicts with "name", "priority" and "lines".
+    The first section holds whatever precedes the first heading (usually name/contact).
+    """
+    sections = [{"name": "header", "priority": HEADER_SECTION_PRIORITY, "lines": []}]
+    for line in text.split("\n"):
+        heading = _heading_name(line)
+        if heading:
+            sections.append({"name": heading, "priority": SECTION_PRIORITIES.get(heading, DEFAULT_SECTION_PRIORITY), "lines": [line]})
+        else:
+            sections[-1]["lines"].append(line)
+    return [section for section in sections if section["lines"]]
+
+
+def truncate_to_token_budget(text, max_tokens):
+    """
+    Shortens `text` to roughly `max_tokens` estimated tokens, section by section:
+    lines are removed from the end of the least important sections first (publications,
+    references, ...) before more important ones, the opening lines of important sections
+    are kept as long as possible, and each shortened section gets a
+    "[... N lines omitted ...]" marker. Headings are always kept. Text still over the
+    budget after that (e.g. one long line) is cut off at the budget.
+    """
+    if not max_tokens or count_tokens(text) <= max_tokens:
+        return text
+    sections = split_sections(text)
+    for section in sections:
+        section["kept"] = len(section["lines"])
+        section["line_tokens"] = [count_tokens(line) + 1 for line in section["lines"]]
+        section["kept_tokens"] = sum(section["line_tokens"])
+    marker_tokens = 8 # the omission marker added to a shortened section
+    total_tokens = sum(section["kept_tokens"] for section in sections)
+
+    def drop_last_line(section):
+        nonlocal total_tokens
+        if section["kept"] == len(section["lines"]):
+            total_tokens += marker_tokens
+        section["kept"] -= 1
+        section["kept_tokens"] -= section["line_tokens"][section["kept"]]
+        total_tokens -= section["line_tokens"][section["kept"]]
+
+    def trim(min_lines_for):
+        # Lowest priority first; within a priority, trim the longest section first.
+        for priority in sorted({section["priority"] for section in sections}):
+            same_priority = [section for section in sections if section["priority"] == priority]
+            while total_tokens > max_tokens:
+                trimmable = [section for section in same_priority if section["kept"] > min_lines_for(section)]
+                if not trimmable:
+                    break
+                drop_last_line(max(trimmable, key=lambda section: section["kept_tokens"]))
+            if total_tokens <= max_tokens:
+                return
+
+    # First keep the opening lines of every important section, then cut down to headings only.
+    trim(lambda section: MIN_KEPT_LINES if section["priority"] >= 3 else 1)
+    trim(lambda section: 1)
+
+    output_lines = []
+    for section in sections:
+        output_lines.extend(section["lines"][:section["kept"]])
+        omitted = len(section["lines"]) - section["kept"]
+        if omitted:
+            output_lines.append(f"[... {omitted} lines omitted to fit the length limit ...]")
+    result = "\n".join(output_lines)
+    if count_tokens(result) > max_tokens:
+        # Headings and single long lines (e.g. PDF text without line breaks) cannot be
+        # dropped line by line: cut the remaining text itself.
+        cut_marker = "\n[... text cut to fit the length limit ...]"
+        result = _cut_to_tokens(result, max_tokens - count_tokens(cut_marker)) + cut_marker
+    return result
+
+
+def _cut_to_tokens(text, max_tokens):
+    """Returns the longest prefix of `text` (cut at whitespace where possible) within `max_tokens`."""
+    end = len(text)
+    tokens = count_tokens(text)
+    while end and tokens > max_tokens:
+        end = min(end - 1, end * max(max_tokens, 0) // tokens)
+        boundary = max(text.rfind(" ", 0, end), text.rfind("\n", 0, end))
+        if boundary > end * 0.9:
+            end = boundary
+        tokens = count_tokens(text[:end])
+    return text[:end].rstrip()
+
+
+def fit_text_to_prompt(template_overhead_tokens, text, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
+    """Truncates `text` so that it plus `template_overhead_tokens` fits in `token_budget`."""
+    if not token_budget:
+        return text
+    return truncate_to_token_budget(text, max(token_budget - template_overhead_tokens, 200))
@@ -1,12 +1,34 @@
 # ai_resume_analyzer/utils.py
 
-import PyPDF2
-import google.generativeai as genai
 import os
+import io
+import hashlib
 import json
-import streamlit as st # For st.secrets access
-# Ensure dotenv is imported here if you use it directly in this function
-from dotenv import load_dotenv
+import time
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from llm_cache import MemoryLRUCache, SingleFlight, get_default_cache, make_cache_key
+from llm_json import IncrementalJSONParser, parse_llm_json
+from metrics import current_task, get_default_metrics, task_label
+from model_routing import DEFAULT_GEMINI_MODEL, first_response, model_route
+from local_analysis import (
+    local_ats_check, local_skill_gap, merge_enrichment,
+    extract_contact_details, is_confident_contact_extraction, merge_contact_details
+)
+from rate_limiter import PRIORITY_INTERACTIVE, backoff_delay, get_default_scheduler, is_quota_error
+from text_compaction import DEFAULT_PROMPT_TOKEN_BUDGET, count_tokens, fit_text_to_prompt, normalize_resume_text
+from prompts import (
+    EXTRACT_PROMPT_TEMPLATE, EXTRACT_SLIM_PROMPT_TEMPLATE, ANALYSIS_PROMPT_TEMPLATE,
+    IMPROVEMENT_SUGGESTIONS_PROMPT_TEMPLATE, JOB_MATCH_PROMPT_TEMPLATE,
+    SKILL_GAP_PROMPT_TEMPLATE, ATS_CHECK_PROMPT_TEMPLATE,
+    GRAMMAR_CLARITY_PROMPT_TEMPLATE, COMBINED_ANALYSIS_PROMPT_TEMPLATE,
+    COMBINED_RESUME_REFERENCE, COMBINED_JD_REFERENCE, SHARED_CONTEXT_TEMPLATE
+)
 
 
 # --- API Key and Gemini Configuration ---
@@ -19,6 +41,7 @@ def load_api_key(api_key_input=None):
     # Check if st.secrets has items before trying to access a specific key
     # This avoids the StreamlitSecretNotFoundError if no secrets file exists locally.
     try:
+        import streamlit as st # only for st.secrets; imported here so batch runs and the engine don't load it
         if hasattr(st, 'secrets') and st.secrets and "GOOGLE_API_KEY_FROM_SECRETS" in st.secrets:
             key_from_secrets = st.secrets.get("GOOGLE_API_KEY_FROM_SECRETS")
             if key_from_secrets:
@@ -39,6 +62,7 @@ def load_api_key(api_key_input=None):
         return api_key_input
 
     # 3. Try from .env file (for local development)
+    from dotenv import load_dotenv
     load_dotenv() # Make sure this is called to load .env variables
     env_key = os.getenv("GOOGLE_API_KEY_ENV") # Use a distinct name for .env variable
     if env_key:
@@ -50,76 +74,847 @@ def load_api_key(api_key_input=None):
     return None
 
 
+# --- Notices ---
+# Warnings from the analysis code (retries, configuration errors) are printed and passed
+# to the handler installed on the current thread, e.g. a job in analysis_engine that
+# shows them in the UI later. run_analysis_tasks hands the handler on to its workers.
+_notice_state = threading.local()
+
+@contextmanager
+def notice_handler(handler):
+    """Sends notices raised on this thread inside the block to `handler(level, message)`,
+    where level is "info", "warning" or "error"."""
+    previous = getattr(_notice_state, "handler", None)
+    _notice_state.handler = handler
+    try:
+        yield
+    finally:
+        _notice_state.handler = previous
+
+def current_notice_handler():
+    """Returns the handler installed on this thread (or None), e.g. to install it on worker threads."""
+    return getattr(_notice_state, "handler", None)
+
+def _notify(level, message):
+    print(message)
+    handler = getattr(_notice_state, "handler", None)
+    if handler is not None:
+        handler(level, message)
+
+
+# The Gemini SDK takes about half a second to import, so it is loaded on the first
+# configure/model call rather than with this module: starting the app, a batch run or the
+# engine with a stand-in model does not pay for it.
+def _genai():
+    import google.generativeai as genai
+    return genai
+
+# genai.configure() replaces the SDK's shared clients, so it is only called when the key
+# changes; GenerativeModel objects are kept per model name so their underlying client
+# (and its open connection) is reused across calls, sessions and threads.
+_configured_api_key = None
+_gemini_models = {}
+_gemini_registry_lock = threading.Lock()
+# When set, models come from this factory instead of the SDK (see set_model_factory).
+_model_factory = None
+
+def set_model_factory(factory):
+    """
+    Replaces the Gemini SDK with `factory(model_name)`, which must return an object with
+    the GenerativeModel.generate_content interface (e.g. analysis_engine.StandInModel),
+    so the whole analysis runs without an API key or network. Pass None to restore the SDK.
+    """
+    global _model_factory
+    with _gemini_registry_lock:
+        _model_factory = factory
+        _gemini_models.clear()
+
 def configure_gemini_api():
     """
     Configures the Gemini API using the GOOGLE_API_KEY environment variable.
     This should be called after load_api_key has set the environment variable.
+    Configuration happens once per API key; later calls with the same key are no-ops.
     """
+    global _configured_api_key
+    if _model_factory is not None:
+        return True
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         # This case should ideally be handled by UI preventing analysis without a key
-        st.error("Google API Key is not configured. Please provide it.")
+        _notify("error", "Google API Key is not configured. Please provide it.")
         return False
-    try:
-        genai.configure(api_key=api_key)
+    with _gemini_registry_lock:
+        if api_key == _configured_api_key:
+            return True
+        try:
+            _genai().configure(api_key=api_key)
+        except Exception as e:
+            _notify("error", f"Failed to configure Gemini API: {e}")
+            return False
+        _configured_api_key = api_key
+        _gemini_models.clear() # models built for the previous key hold its client
         return True
-    except Exception as e:
-        st.error(f"Failed to configure Gemini API: {e}")
-        return False
 
-def get_gemini_response(prompt_text, model_name="gemini-1.5-flash-latest", retries=3):
+def get_gemini_model(model_name):
+    """
+    Returns the shared GenerativeModel for `model_name`, creating it on first use.
+    Call configure_gemini_api() first.
+    """
+    with _gemini_registry_lock:
+        model = _gemini_models.get(model_name)
+        if model is None:
+            model = _model_factory(model_name) if _model_factory is not None else _genai().GenerativeModel(model_name)
+            _gemini_models[model_name] = model
+        return model
+
+# Output tokens reserved per request when generation_config sets no max_output_tokens.
+ESTIMATED_OUTPUT_TOKENS = 1024
+
+def _estimate_request_tokens(prompt_text, generation_config=None):
+    """Prompt plus expected output tokens, reserved from the tokens-per-minute limit."""
+    max_output_tokens = None
+    if isinstance(generation_config, dict):
+        max_output_tokens = generation_config.get("max_output_tokens")
+    elif generation_config is not None:
+        max_output_tokens = getattr(generation_config, "max_output_tokens", None)
+    return count_tokens(prompt_text) + (max_output_tokens or ESTIMATED_OUTPUT_TOKENS)
+
+def _response_token_count(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+def _generate_content(model, request_text, generation_config=None, timeout=None, stream=False):
+    kwargs = {"stream": True} if stream else {}
+    if timeout and _model_factory is None: # the SDK ends the request itself once the caller stops waiting
+        kwargs["request_options"] = {"timeout": timeout}
+    return model.generate_content(request_text, generation_config=generation_config, **kwargs)
+
+def _time_left(deadline):
+    """
+    Seconds until `deadline` (a time.monotonic() value; None means no limit). Raises
+    TimeoutError once it has passed.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("the latency budget is spent")
+    return left
+
+def _hedged_call(model_name, request_text, generation_config, deadline, estimated_tokens, priority):
+    """
+    A hedged request (see model_routing.first_response): waits for its own rate-limiter
+    slot, within the caller's `deadline` like everything else. Returns the text.
+    """
+    scheduler = get_default_scheduler()
+    scheduler.acquire(estimated_tokens, priority=priority, timeout=_time_left(deadline))
+    response = _generate_content(get_gemini_model(model_name), request_text, generation_config, _time_left(deadline))
+    scheduler.settle(estimated_tokens, _response_token_count(response))
+    return response.text
+
+def _deadline_error(route):
+    return {"error": f"No response from Gemini within the {route['deadline_seconds']}s latency budget of this task.",
+            "raw_response": None}
+
+def _approx_tokens(text):
+    # One token per 4 characters: close enough for size metrics and, unlike count_tokens,
+    # cheap enough to run on every response.
+    return (len(text) + 3) // 4 if text else 0
+
+def _record_gemini_attempt(model_name, attempt, outcome, timings, prompt_text, response_text=None, repair=None, streamed=False,
+                           context_cached=False):
+    """
+    Records one Gemini attempt: queue/generation/parse seconds (whichever were reached),
+    approximate prompt and response token counts, and the outcome ("ok", "json_error",
+    "quota_error", "api_error" or "timeout"), labelled with the analysis task running on
+    this thread and the model that answered.
+    `prompt_text` is the text actually sent, so it leaves out a cached shared context.
+    """
+    metrics = get_default_metrics()
+    labels = {"task": current_task(), "model": model_name}
+    for name, seconds in timings.items():
+        if seconds is not None:
+            metrics.observe(f"gemini_{name}", seconds, **labels)
+    metrics.increment("gemini_attempts_total", outcome=outcome, **labels)
+    if attempt:
+        metrics.increment("gemini_retries_total", **labels)
+    prompt_tokens = _approx_tokens(prompt_text)
+    response_tokens = _approx_tokens(response_text)
+    metrics.observe("gemini_prompt_tokens", prompt_tokens, **labels)
+    if response_text:
+        metrics.observe("gemini_response_tokens", response_tokens, **labels)
+    metrics.event(
+        "gemini_attempt", attempt=attempt + 1, outcome=outcome, repair=repair, streamed=streamed, context_cached=context_cached,
+        prompt_tokens=prompt_tokens, prompt_chars=len(prompt_text), response_tokens=response_tokens,
+        response_chars=len(response_text or ""), **labels,
+        **{name: round(seconds, 4) for name, seconds in timings.items() if seconds is not None},
+    )
+
+def _record_cache_lookup(hit):
+    get_default_metrics().increment("gemini_cache_lookups_total", result="hit" if hit else "miss", task=current_task())
+
+# Identical (model, prompt, settings) requests made while one is already running share
+# its result instead of being sent again (e.g. a double-clicked Analyze button).
+_in_flight_requests = SingleFlight()
+
+def in_flight_stats():
+    """Returns Gemini request coalescing counters (see llm_cache.SingleFlight.stats)."""
+    return _in_flight_requests.stats()
+
+def get_gemini_response(prompt_text, model_name=None, retries=3,
+                        generation_config=None, use_cache=True, schema=None, priority=PRIORITY_INTERACTIVE, context=None):
     """
     Sends a prompt to the configured Gemini API and returns the parsed JSON response.
-    Handles potential errors and retries.
+    Handles potential errors and retries. The model, the fallback model for hedged
+    requests and retries, and the latency budget come from the route of the task running
+    on this thread (see model_routing); `model_name` overrides the primary model.
+    Malformed JSON is first repaired locally (see llm_json.parse_llm_json, which also
+    checks the result against `schema` if given); the prompt is only re-sent when
+    the response cannot be repaired.
+    Each request waits for a slot from the shared rate limiter (see rate_limiter.py);
+    `priority` is PRIORITY_INTERACTIVE or PRIORITY_BATCH. Quota errors pause all
+    callers with exponential backoff, other errors back off this call only.
+    Successful responses are cached on (model_name, prompt_text, generation_config),
+    except answers from the fallback model; pass use_cache=False to bypass the cache
+    for this call. Concurrent identical
+    requests are coalesced into one, whether or not the cache is used.
+    `context` is a shared context block (see build_context_tasks) that the prompt is
+    sent after: from Gemini's context cache inside shared_context(), otherwise as a
+    prefix of the prompt.
+    """
+    model_name = model_name or model_route()["model"]
+    cache = get_default_cache() if use_cache else None
+    cache_key = make_cache_key(model_name, context_prompt(context, prompt_text), generation_config)
+    if cache is not None:
+        cached_result = cache.get(cache_key)
+        _record_cache_lookup(cached_result is not None)
+        if cached_result is not None:
+            return cached_result
+
+    result, shared = _in_flight_requests.do(cache_key, lambda: _request_gemini_response(
+        prompt_text, model_name, retries, generation_config, cache, cache_key, schema, priority, context
+    ))
+    if shared:
+        get_default_metrics().increment("gemini_coalesced_total", task=current_task())
+    return result
+
+def _request_gemini_response(prompt_text, model_name, retries, generation_config, cache, cache_key, schema, priority,
+                             context=None, budget=None):
+    """
+    Sends the request for get_gemini_response (no cache lookup or coalescing). All
+    attempts share the latency budget of the task's route (or `budget` seconds): one
+    deadline covers the rate-limit queue, each call and each backoff. Retries and hedged
+    requests go to the route's fallback model.
     """
     if not configure_gemini_api(): # Ensure API is configured before making a call
         return {"error": "Gemini API not configured.", "raw_response": None}
 
-    model = genai.GenerativeModel(model_name)
+    route = model_route()
+    fallback_model = route["fallback"] or model_name
+    if budget is None:
+        budget = route["deadline_seconds"] or None
+    deadline = None if budget is None else time.monotonic() + budget
+    cached_model = _context_model(model_name, context)
+    scheduler = get_default_scheduler()
+    full_text = context_prompt(context, prompt_text)
+    # Cached context tokens still count towards the per-minute token limit.
+    estimated_tokens = _estimate_request_tokens(full_text, generation_config)
     for attempt in range(retries):
+        if deadline is not None and time.monotonic() >= deadline:
+            return _deadline_error(route)
+        timings = {"queue_seconds": None, "generation_seconds": None, "parse_seconds": None}
+        response_text = None
+        attempt_model = model_name if attempt == 0 else fallback_model
+        attempt_cached_model = cached_model if attempt_model == model_name else None
+        model = attempt_cached_model or get_gemini_model(attempt_model)
+        request_text = prompt_text if attempt_cached_model else full_text
+
+        def send(model=model, request_text=request_text):
+            response = _generate_content(model, request_text, generation_config, _time_left(deadline))
+            scheduler.settle(estimated_tokens, _response_token_count(response))
+            return response.text
+        hedge = functools.partial(_hedged_call, fallback_model, full_text, generation_config, deadline, estimated_tokens, priority)
+        call_seconds = None
         try:
-            response = model.generate_content(prompt_text)
-            cleaned_response_text = response.text.strip()
-
-            # Remove markdown ```json ... ``` if present
-            if cleaned_response_text.startswith("```json"):
-                cleaned_response_text = cleaned_response_text[7:]
-            if cleaned_response_text.endswith("```"):
-                cleaned_response_text = cleaned_response_text[:-3]
-            
-            # Attempt to parse as JSON
-            parsed_json = json.loads(cleaned_response_text)
+            timings["queue_seconds"] = scheduler.acquire(estimated_tokens, priority=priority, timeout=_time_left(deadline))
+            started = time.perf_counter()
+            try:
+                response_text, hedged = first_response(send, attempt_model, hedge=hedge, hedge_model=fallback_model,
+                                                       timeout=_time_left(deadline))
+            finally:
+                call_seconds = time.perf_counter() - started
+            timings["generation_seconds"] = call_seconds
+            if hedged:
+                attempt_model, attempt_cached_model, request_text = fallback_model, None, full_text
+            # Parse as JSON, repairing fences, stray prose, trailing commas or truncation locally
+            started = time.perf_counter()
+            parsed_json, repair = parse_llm_json(response_text, schema=schema)
+            timings["parse_seconds"] = time.perf_counter() - started
+            _record_gemini_attempt(attempt_model, attempt, "ok", timings, request_text, response_text, repair,
+                                   context_cached=attempt_cached_model is not None)
+            if repair != "strict":
+                print(f"Repaired malformed JSON response locally ({repair}).")
+            # A cut-off answer should not be reused next time, and cache_key names the primary
+            # model, so an answer from the fallback model is not stored under it.
+            if cache is not None and repair != "truncated" and attempt_model == model_name:
+                cache.set(cache_key, parsed_json)
             return parsed_json
         except json.JSONDecodeError as e:
-            error_message = f"JSONDecodeError on attempt {attempt + 1}/{retries}: {e}. Response: '{cleaned_response_text[:500]}...'"
-            st.warning(error_message) # Show warning in UI for easier debugging
-            print(error_message)
+            timings["parse_seconds"] = time.perf_counter() - started
+            _record_gemini_attempt(attempt_model, attempt, "json_error", timings, request_text, response_text,
+                                   context_cached=attempt_cached_model is not None)
+            error_message = f"JSONDecodeError on attempt {attempt + 1}/{retries}: {e}. Response: '{response_text[:500]}...'"
+            _notify("warning", error_message) # shown in the UI for easier debugging
             if attempt == retries - 1:
-                return {"error": "Failed to parse LLM response as JSON after multiple retries.", "raw_response": response.text}
+                return {"error": "Failed to parse LLM response as JSON after multiple retries.", "raw_response": response_text}
+        except TimeoutError as e:
+            timings["generation_seconds"] = call_seconds
+            _record_gemini_attempt(attempt_model, attempt, "timeout", timings, request_text,
+                                   context_cached=attempt_cached_model is not None)
+            get_default_metrics().increment("gemini_deadline_exceeded_total", task=current_task())
+            _notify("warning", f"Gemini did not answer in time ({e}).")
+            return _deadline_error(route)
         except Exception as e:
+            quota_error = is_quota_error(e)
+            _record_gemini_attempt(attempt_model, attempt, "quota_error" if quota_error else "api_error",
+                                   timings, request_text, response_text, context_cached=attempt_cached_model is not None)
             error_message = f"Error calling Gemini API (attempt {attempt + 1}/{retries}): {e}"
-            st.warning(error_message)
-            print(error_message)
+            _notify("warning", error_message)
+            if quota_error: # reported on the last attempt too, so every other caller waits
+                delay = scheduler.report_quota_error(attempt)
+                print(f"Gemini quota exceeded; pausing requests for {delay:.1f}s.")
+            elif cached_model is not None:
+                cached_model = None # e.g. the cached content expired: send the context with the prompt from now on
             if attempt == retries - 1:
                 return {"error": f"Failed to get response from Gemini after {retries} attempts: {e}", "raw_response": None}
+            if not quota_error: # after a quota error, the next acquire() waits out the pause, within the deadline
+                delay = backoff_delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    return {"error": f"Failed to get response from Gemini: {e} (no time left in the latency budget to retry).",
+                            "raw_response": None}
+                time.sleep(delay)
         
         if attempt < retries - 1:
-            st.info(f"Retrying Gemini call (attempt {attempt + 2}/{retries})...")
-            print(f"Retrying Gemini call ({attempt+2})...")
+            _notify("info", f"Retrying Gemini call (attempt {attempt + 2}/{retries})...")
 
     return {"error": f"Failed to get valid response from Gemini after {retries} attempts.", "raw_response": None}
 
 
+def stream_gemini_response(prompt_text, on_partial=None, model_name=None,
+                           generation_config=None, use_cache=True, schema=None, priority=PRIORITY_INTERACTIVE, context=None):
+    """
+    Streaming variant of get_gemini_response. `on_partial(partial_dict)` is called each
+    time another field or list item of the JSON response has fully arrived, so results
+    can be rendered before generation finishes. Returns the final parsed JSON.
+    Falls back to a regular request (with its retries) if the stream fails or the
+    streamed text is not valid JSON even after local repair. Callers that join an
+    identical request already in flight get `on_partial` once, with the final result.
+    `context` and the model route are used as in get_gemini_response.
+    """
+    model_name = model_name or model_route()["model"]
+    cache = get_default_cache() if use_cache else None
+    cache_key = make_cache_key(model_name, context_prompt(context, prompt_text), generation_config)
+    if cache is not None:
+        cached_result = cache.get(cache_key)
+        _record_cache_lookup(cached_result is not None)
+        if cached_result is not None:
+            if on_partial:
+                on_partial(cached_result)
+            return cached_result
+
+    result, shared = _in_flight_requests.do(cache_key, lambda: _stream_gemini_response(
+        prompt_text, on_partial, model_name, generation_config, cache, cache_key, schema, priority, context
+    ))
+    if shared:
+        get_default_metrics().increment("gemini_coalesced_total", task=current_task())
+        if on_partial:
+            on_partial(result)
+    return result
+
+def _deliver_partial(on_partial, partial):
+    # An error in the caller's callback is not a stream failure: falling back to a regular
+    # request would send (and bill) the same prompt a second time.
+    try:
+        on_partial(partial)
+    except Exception as e:
+        print(f"on_partial callback failed ({e}); continuing the stream.")
+
+def _stream_gemini_response(prompt_text, on_partial, model_name, generation_config, cache, cache_key, schema, priority,
+                            context=None):
+    """
+    Streams the request for stream_gemini_response (no cache lookup or coalescing).
+    A stream that is still running after the hedge delay races a regular request to the
+    fallback model (see model_routing.first_response); the stream stops once it loses.
+    """
+    if not configure_gemini_api():
+        return {"error": "Gemini API not configured.", "raw_response": None}
+
+    route = model_route()
+    fallback_model = route["fallback"] or model_name
+    budget = route["deadline_seconds"] or None
+    deadline = None if budget is None else time.monotonic() + budget
+    cached_model = _context_model(model_name, context)
+    model = cached_model or get_gemini_model(model_name)
+    full_text = context_prompt(context, prompt_text)
+    request_text = prompt_text if cached_model else full_text
+    parser = IncrementalJSONParser()
+    chunks = []
+    stopped = threading.Event()
+    scheduler = get_default_scheduler()
+    estimated_tokens = _estimate_request_tokens(full_text, generation_config)
+
+    def consume():
+        response = _generate_content(model, request_text, generation_config, _time_left(deadline), stream=True)
+        for chunk in response:
+            if stopped.is_set(): # the caller has moved on (hedge answered first, or out of time)
+                return None
+            chunks.append(chunk.text)
+            if parser.feed(chunk.text) and on_partial:
+                _deliver_partial(on_partial, parser.snapshot())
+        scheduler.settle(estimated_tokens, _response_token_count(response))
+        return "".join(chunks)
+    hedge = functools.partial(_hedged_call, fallback_model, full_text, generation_config, deadline, estimated_tokens, priority)
+
+    # The generation time of a stream includes the time spent in on_partial callbacks.
+    timings = {"queue_seconds": None, "generation_seconds": None, "parse_seconds": None}
+    try:
+        timings["queue_seconds"] = scheduler.acquire(estimated_tokens, priority=priority, timeout=_time_left(deadline))
+        started = time.perf_counter()
+        try:
+            response_text, hedged = first_response(consume, model_name, hedge=hedge, hedge_model=fallback_model,
+                                                   timeout=_time_left(deadline))
+        finally:
+            stopped.set()
+            timings["generation_seconds"] = time.perf_counter() - started
+        started = time.perf_counter()
+        parsed_json, repair = parse_llm_json(response_text, schema=schema)
+        timings["parse_seconds"] = time.perf_counter() - started
+        if hedged:
+            _record_gemini_attempt(fallback_model, 0, "ok", timings, full_text, response_text, repair)
+            if on_partial:
+                _deliver_partial(on_partial, parsed_json) # the hedged answer was not streamed
+        else:
+            _record_gemini_attempt(model_name, 0, "ok", timings, request_text, response_text, repair, streamed=True,
+                                   context_cached=cached_model is not None)
+    except TimeoutError as e:
+        _record_gemini_attempt(model_name, 0, "timeout", timings, request_text, "".join(chunks), streamed=True,
+                               context_cached=cached_model is not None)
+        get_default_metrics().increment("gemini_deadline_exceeded_total", task=current_task())
+        _notify("warning", f"Gemini did not answer in time ({e}).")
+        return _deadline_error(route)
+    except Exception as e:
+        outcome = "json_error" if isinstance(e, json.JSONDecodeError) else "quota_error" if is_quota_error(e) else "api_error"
+        _record_gemini_attempt(model_name, 0, outcome, timings, request_text, "".join(chunks), streamed=True,
+                               context_cached=cached_model is not None)
+        print(f"Streaming Gemini call failed ({e}); falling back to a regular request.")
+        if is_quota_error(e):
+            scheduler.report_quota_error(0)
+        # Not get_gemini_response: this request is the in-flight one its callers would wait for.
+        return _request_gemini_response(prompt_text, model_name, 3, generation_config, cache, cache_key, schema, priority,
+                                        context, budget=None if deadline is None else max(0.0, deadline - time.monotonic()))
+    if repair != "strict":
+        print(f"Repaired malformed streamed JSON response locally ({repair}).")
+
+    if cache is not None and repair != "truncated" and (not hedged or fallback_model == model_name):
+        cache.set(cache_key, parsed_json)
+    return parsed_json
+
+
+# --- Shared Context Caching ---
+# Gemini can store a prompt prefix as cached content and answer later prompts after it,
+# so the shared resume context is processed once per analysis instead of once per task.
+# Cached content has a minimum size (thousands of tokens, depending on the model), needs
+# a model version that supports it and is billed for storage, so it is off by default;
+# without it the context is sent as the identical first part of every task prompt.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "off").lower() in ("1", "on", "true", "yes")
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "600"))
+
+_context_caches = {} # (model name, context digest) -> [model, delete, users]
+_context_cache_unavailable = set() # models whose cache creation failed; they send the context with each prompt
+_context_cache_lock = threading.Lock()
+
+def context_prompt(context, prompt_text):
+    """The full text of `prompt_text` sent after the shared `context` (if any)."""
+    return context + prompt_text if context else prompt_text
+
+def _context_key(model_name, context):
+    return model_name, hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+def _create_context_cache(model_name, context):
+    """
+    Stores `context` as Gemini cached content. Returns (model, delete): a model that
+    answers prompts as if they followed `context`, and a callable deleting the cache.
+    """
+    if _model_factory is not None:
+        model = get_gemini_model(model_name)
+        if not hasattr(model, "cache_context"):
+            raise NotImplementedError("the model factory does not support context caching")
+        return model.cache_context(context, GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+    from google.generativeai import caching
+    cached_content = caching.CachedContent.create(model=model_name, contents=[context],
+                                                  ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS))
+    return _genai().GenerativeModel.from_cached_content(cached_content=cached_content), cached_content.delete
+
+def _delete_context_cache(model_name, delete):
+    try:
+        delete()
+    except Exception as e: # the cache expires on its own after its TTL
+        print(f"Could not delete cached Gemini context for {model_name}: {e}")
+
+def _acquire_context_cache(model_name, context):
+    """Creates (or joins) the cached content for `context`. Returns True if it can be used."""
+    key = _context_key(model_name, context)
+    metrics = get_default_metrics()
+    with _context_cache_lock:
+        entry = _context_caches.get(key)
+        if entry is not None:
+            entry[2] += 1
+            return True
+        if model_name in _context_cache_unavailable:
+            return False
+    if count_tokens(context) < GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        metrics.increment("gemini_context_caches_total", outcome="too_small", model=model_name)
+        return False
+    if not configure_gemini_api():
+        return False
+    started = time.perf_counter()
+    try:
+        model, delete = _create_context_cache(model_name, context)
+    except Exception as e:
+        metrics.increment("gemini_context_caches_total", outcome="failed", model=model_name)
+        with _context_cache_lock:
+            _context_cache_unavailable.add(model_name)
+        print(f"Gemini context caching is not available for {model_name} ({e}); sending the shared context with each prompt.")
+        return False
+    metrics.observe("gemini_context_cache_create_seconds", time.perf_counter() - started, model=model_name)
+    metrics.increment("gemini_context_caches_total", outcome="created", model=model_name)
+    with _context_cache_lock:
+        entry = _context_caches.setdefault(key, [model, delete, 0])
+        entry[2] += 1
+    if entry[0] is not model: # another analysis of the same context created one meanwhile
+        _delete_context_cache(model_name, delete)
+    return True
+
+def _release_context_cache(model_name, context):
+    key = _context_key(model_name, context)
+    with _context_cache_lock:
+        entry = _context_caches[key]
+        entry[2] -= 1
+        if entry[2]:
+            return
+        del _context_caches[key]
+    _delete_context_cache(model_name, entry[1])
+
+def _context_model(model_name, context):
+    """The model answering after the cached `context`, or None when it is not cached."""
+    if not context:
+        return None
+    with _context_cache_lock:
+        entry = _context_caches.get(_context_key(model_name, context))
+    return entry[0] if entry else None
+
+@contextmanager
+def shared_context(context, model_name=DEFAULT_GEMINI_MODEL, enabled=None):
+    """
+    While the block runs, Gemini calls made with `context` (see get_gemini_response)
+    send only their task prompt and reuse one cached content holding the context. It is
+    created on entry and deleted when the last analysis using the same context leaves.
+    Nothing is cached when caching is off (`enabled`, default GEMINI_CONTEXT_CACHE),
+    the context is shorter than GEMINI_CONTEXT_CACHE_MIN_TOKENS, or creating it failed
+    (after which this process stops trying for that model); the calls then send the
+    context as a prompt prefix. Yields whether the cached content is used.
+    """
+    enabled = GEMINI_CONTEXT_CACHE if enabled is None else enabled
+    cached = bool(context) and enabled and _acquire_context_cache(model_name, context)
+    try:
+        yield cached
+    finally:
+        if cached:
+            _release_context_cache(model_name, context)
+
+
+# --- Analysis Tasks ---
+def gemini_task_keys(job_description="", skip_keys=()):
+    """The result keys build_analysis_tasks() sends to Gemini for these inputs, in order."""
+    keys = ["extracted_details", "strengths_weaknesses_missing", "improvement_suggestions", "job_match", "ats_check",
+            "grammar_clarity"]
+    if job_description:
+        keys.insert(4, "skill_gap")
+    return [key for key in keys if key not in skip_keys]
+
+def build_analysis_tasks(resume_text, job_title, job_description="", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, compact=True,
+                         skip_keys=(), slim_extraction=None):
+    """
+    Builds the list of (result_key, prompt) pairs for one analysis.
+    The skill gap task is only included when a job description is provided.
+    With compact=True the resume text is normalized first and, if `token_budget` is set,
+    trimmed section by section so that each full prompt stays within that many tokens.
+    Tasks in `skip_keys` (e.g. LOCAL_ANALYSIS_KEYS when they are computed locally) are left out.
+    The extraction prompt leaves out the name and contact details when they can be
+    found locally (see add_local_analysis); `slim_extraction` forces that choice.
+    """
+    if compact:
+        resume_text = normalize_resume_text(resume_text)
+    if slim_extraction is None:
+        slim_extraction = is_confident_contact_extraction(extract_contact_details(resume_text))
+
+    def fill(template, **fields):
+        if not compact or not token_budget:
+            return template.format(resume_text=resume_text, **fields)
+        overhead_tokens = count_tokens(template.format(resume_text="", **fields))
+        return template.format(resume_text=fit_text_to_prompt(overhead_tokens, resume_text, token_budget), **fields)
+
+    job_description_section = f"Job Description:\n```\n{job_description}\n```" if job_description else "No job description provided."
+    analysis_tasks = [
+        ("extracted_details", fill(EXTRACT_SLIM_PROMPT_TEMPLATE if slim_extraction else EXTRACT_PROMPT_TEMPLATE)),
+        ("strengths_weaknesses_missing", fill(ANALYSIS_PROMPT_TEMPLATE, job_title=job_title)),
+        ("improvement_suggestions", fill(IMPROVEMENT_SUGGESTIONS_PROMPT_TEMPLATE, job_title=job_title)),
+        ("job_match", fill(JOB_MATCH_PROMPT_TEMPLATE, job_title=job_title, job_description_section=job_description_section)),
+        ("ats_check", fill(ATS_CHECK_PROMPT_TEMPLATE, job_title=job_title)),
+        ("grammar_clarity", fill(GRAMMAR_CLARITY_PROMPT_TEMPLATE))
+    ]
+    if job_description:
+        analysis_tasks.insert(4, ("skill_gap", fill(SKILL_GAP_PROMPT_TEMPLATE, jd_text=job_description, job_title=job_title)))
+    return [(key, prompt) for key, prompt in analysis_tasks if key not in skip_keys]
+
+def build_context_tasks(resume_text, job_title, job_description="", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, compact=True,
+                        skip_keys=(), slim_extraction=None):
+    """
+    Like build_analysis_tasks, but the resume goes into one shared context block
+    (SHARED_CONTEXT_TEMPLATE) and each task prompt refers to it; send them with
+    get_gemini_response(prompt, context=context). The job description stays in the
+    prompts of the tasks that use it (job match, skill gap), so the other tasks do not
+    pay for its tokens. The resume is trimmed once, so that the context plus the longest
+    task prompt stays within `token_budget`.
+    Returns (context, [(result_key, task_prompt), ...]).
+    """
+    if compact:
+        resume_text = normalize_resume_text(resume_text)
+    if slim_extraction is None:
+        slim_extraction = is_confident_contact_extraction(extract_contact_details(resume_text))
+    tasks = build_analysis_tasks(COMBINED_RESUME_REFERENCE, job_title, job_description,
+                                 compact=False, skip_keys=skip_keys, slim_extraction=slim_extraction)
+    if compact and token_budget and tasks:
+        overhead_tokens = (count_tokens(SHARED_CONTEXT_TEMPLATE.format(resume_text=""))
+                           + max(count_tokens(task_prompt) for _, task_prompt in tasks))
+        resume_text = fit_text_to_prompt(overhead_tokens, resume_text, token_budget)
+    return SHARED_CONTEXT_TEMPLATE.format(resume_text=resume_text), tasks
+
+def measure_prompt_compaction(resume_text, job_title, job_description="", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, skip_keys=()):
+    """
+    Returns per-task prompt sizes before (verbatim resume text) and after normalization
+    and token-budget enforcement, as {key: {"tokens_before", "tokens_after", "chars_before", "chars_after"}}.
+    Sizes are those of the text sent for each task: the shared context plus the task
+    prompt (see build_context_tasks).
+    """
+    raw_context, raw_tasks = build_context_tasks(resume_text, job_title, job_description, compact=False, skip_keys=skip_keys)
+    context, tasks = build_context_tasks(resume_text, job_title, job_description, token_budget, skip_keys=skip_keys)
+    before = [(key, context_prompt(raw_context, prompt)) for key, prompt in raw_tasks]
+    after = {key: context_prompt(context, prompt) for key, prompt in tasks}
+    return {
+        key: {
+            "tokens_before": count_tokens(prompt), "tokens_after": count_tokens(after[key]),
+            "chars_before": len(prompt), "chars_after": len(after[key]),
+        }
+        for key, prompt in before
+    }
+
+# --- Concurrent Analysis ---
+# Upper bound on simultaneous Gemini calls for one analysis; override with MAX_PARALLEL_TASKS.
+DEFAULT_MAX_PARALLEL_TASKS = int(os.getenv("MAX_PARALLEL_TASKS", "4"))
+
+def _timed_task(key, fn, *args, **kwargs):
+    """Runs one analysis task, recording its duration and status under analysis_task_seconds."""
+    started = time.perf_counter()
+    status = "exception"
+    try:
+        with task_label(key):
+            result = fn(*args, **kwargs)
+        status = "error" if isinstance(result, dict) and "error" in result else "ok"
+        return result
+    finally:
+        seconds = time.perf_counter() - started
+        metrics = get_default_metrics()
+        metrics.observe("analysis_task_seconds", seconds, task=key, status=status)
+        metrics.event("analysis_task", task=key, status=status, seconds=round(seconds, 4))
+
+def run_analysis_tasks(analysis_tasks, max_workers=DEFAULT_MAX_PARALLEL_TASKS, on_task_done=None,
+                       on_partial=None, context=None, **gemini_kwargs):
+    """
+    Runs independent (key, prompt) analysis tasks concurrently through get_gemini_response.
+    `on_task_done(key, result)` is called on the calling thread as each task finishes.
+    If `on_partial(key, partial_result)` is given, responses are streamed and it is called
+    from the worker threads as each piece of a result arrives.
+    `context` is the shared context of the task prompts (see build_context_tasks); it is
+    cached once per primary model of their routes when context caching is on (see
+    shared_context).
+    Extra keyword arguments (e.g. use_cache) are passed on to get_gemini_response.
+    Returns a dict of results in the same order as `analysis_tasks`.
+    """
+    if not analysis_tasks:
+        return {}
+    # Notices raised in the worker threads go to the caller's notice handler.
+    handler = current_notice_handler()
+    def _attach_notice_handler():
+        _notice_state.handler = handler
+
+    results = {}
+    max_workers = max(1, min(int(max_workers), len(analysis_tasks)))
+    model_names = {gemini_kwargs.get("model_name") or model_route(key)["model"] for key, _ in analysis_tasks}
+    with ExitStack() as context_caches, \
+         ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis", initializer=_attach_notice_handler) as executor:
+        for model_name in sorted(model_names):
+            context_caches.enter_context(shared_context(context, model_name))
+        if on_partial:
+            futures = {
+                executor.submit(_timed_task, key, stream_gemini_response, prompt, on_partial=functools.partial(on_partial, key),
+                                schema=RESULT_SCHEMAS.get(key), context=context, **gemini_kwargs): key
+                for key, prompt in analysis_tasks
+            }
+        else:
+            futures = {
+                executor.submit(_timed_task, key, get_gemini_response, prompt, schema=RESULT_SCHEMAS.get(key), context=context,
+                                **gemini_kwargs): key
+                for key, prompt in analysis_tasks
+            }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e: # get_gemini_response handles its own errors; this is a safety net
+                result = {"error": f"Unexpected error while running task: {e}", "raw_response": None}
+            results[key] = result
+            if on_task_done:
+                on_task_done(key, result)
+    return {key: results[key] for key, _ in analysis_tasks}
+
+
 # --- Text Extraction ---
-def extract_text_from_pdf(uploaded_file):
-    """Extracts text from an uploaded PDF file."""
+# Limits for PDF extraction; extraction stops early once a limit is reached.
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_MAX_FILE_BYTES = int(os.getenv("PDF_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+PDF_MAX_TEXT_BYTES = int(os.getenv("PDF_MAX_TEXT_BYTES", str(500 * 1024)))
+# PDFs with at least this many pages are extracted in a process pool (0, the default,
+# disables it). Each worker re-parses the whole PDF and the pages arrive pickled, so for
+# typical text pages the pool is slower than extracting in-process (see the pdf/
+# benchmarks); it only pays off for long PDFs whose pages are slow to extract.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "0"))
+PDF_SLOW_PAGE_SECONDS = float(os.getenv("PDF_SLOW_PAGE_SECONDS", "1.0"))
+# Pages are separated by a form feed so later stages can tell where page breaks were.
+PDF_PAGE_SEPARATOR = "\n\f"
+
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+_pdf_process_pool = None
+_pdf_process_pool_lock = threading.Lock()
+
+def _get_pdf_process_pool():
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            # Not fork: the server process runs engine, call-pool and scheduler threads, and a
+            # forked child could inherit one of their locks while it is held.
+            _pdf_process_pool = ProcessPoolExecutor(max_workers=PDF_PROCESS_WORKERS,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_process_pool
+
+def _discard_pdf_process_pool(pool):
+    # A broken pool (a worker crashed or could not start) rejects every later submit;
+    # drop it so the next parallel extraction starts a fresh one.
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is pool:
+            _pdf_process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _open_pdf(pdf_bytes):
+    import PyPDF2 # loaded on the first PDF (here and in each pool process), not for TXT resumes
+    return PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+def _extract_pdf_page_range(pdf_bytes, start, stop):
+    """Process-pool worker: returns [(page_num, text, seconds)] for pages start..stop-1."""
+    pdf_reader = _open_pdf(pdf_bytes)
+    pages = []
+    for page_num in range(start, stop):
+        started = time.perf_counter()
+        text = pdf_reader.pages[page_num].extract_text() or "" # Ensure None is handled
+        pages.append((page_num, text, time.perf_counter() - started))
+    return pages
+
+def _iter_pdf_pages(pdf_bytes, pdf_reader, page_count, parallel):
+    """
+    Yields (page_num, text, seconds) in page order, one page (or one chunk of pages) at a time.
+    If the process pool breaks, the remaining pages are extracted in this process.
+    """
+    next_page = 0
+    if parallel:
+        pool = _get_pdf_process_pool()
+        chunk_size = max(1, -(-page_count // (PDF_PROCESS_WORKERS * 2)))
+        futures = []
+        try:
+            futures = [pool.submit(_extract_pdf_page_range, pdf_bytes, start, min(start + chunk_size, page_count))
+                       for start in range(0, page_count, chunk_size)]
+            for future in futures:
+                for page in future.result():
+                    yield page
+                    next_page = page[0] + 1
+        except BrokenProcessPool as e:
+            print(f"PDF process pool failed ({e}); extracting the remaining pages in this process.")
+            _discard_pdf_process_pool(pool)
+        finally:
+            for future in futures: # the caller stopped early (limit reached)
+                future.cancel()
+    for page_num in range(next_page, page_count):
+        started = time.perf_counter()
+        text = pdf_reader.pages[page_num].extract_text() or ""
+        yield page_num, text, time.perf_counter() - started
+
+def extract_text_from_pdf(uploaded_file, max_pages=PDF_MAX_PAGES, max_text_bytes=PDF_MAX_TEXT_BYTES,
+                          max_file_bytes=PDF_MAX_FILE_BYTES, parallel=None, stats=None):
+    """
+    Extracts text from an uploaded PDF file, page by page.
+    Stops after `max_pages` pages or once `max_text_bytes` of text have been collected.
+    Large PDFs (PDF_PARALLEL_MIN_PAGES or more pages) are extracted in a process pool
+    unless `parallel` is set explicitly.
+    If a `stats` dict is given it is filled with page counts, per-page timings and
+    the reason extraction stopped early (if any).
+    """
+    stats = stats if stats is not None else {}
     try:
-        pdf_reader = PyPDF2.PdfReader(uploaded_file)
-        text = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text += page.extract_text() or "" # Ensure None is handled
-        return text if text else "Could not extract any text from PDF."
+        pdf_bytes = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.read()
+        if max_file_bytes and len(pdf_bytes) > max_file_bytes:
+            return f"Error extracting PDF: file is {len(pdf_bytes) / 1024 / 1024:.1f} MB, the limit is {max_file_bytes / 1024 / 1024:.1f} MB."
+        pdf_reader = _open_pdf(pdf_bytes)
+        page_count = len(pdf_reader.pages)
+        pages_to_read = min(page_count, max_pages) if max_pages else page_count
+        if parallel is None:
+            parallel = bool(PDF_PARALLEL_MIN_PAGES) and pages_to_read >= PDF_PARALLEL_MIN_PAGES
+        stats.update(pages_total=page_count, pages_extracted=0, page_seconds=[], stopped_early=None, parallel=parallel)
+        if pages_to_read < page_count:
+            stats["stopped_early"] = f"page limit ({max_pages} of {page_count} pages)"
+
+        page_texts = []
+        text_bytes = 0
+        started = time.perf_counter()
+        pages = _iter_pdf_pages(pdf_bytes, pdf_reader, pages_to_read, parallel)
+        try:
+            for page_num, page_text, seconds in pages:
+                stats["page_seconds"].append(round(seconds, 4))
+                if seconds > PDF_SLOW_PAGE_SECONDS:
+                    print(f"Slow PDF page: page {page_num + 1} took {seconds:.2f}s to extract.")
+                page_texts.append(page_text)
+                stats["pages_extracted"] += 1
+                text_bytes += len(page_text.encode("utf-8"))
+                if max_text_bytes and text_bytes >= max_text_bytes:
+                    stats["stopped_early"] = f"text size limit ({max_text_bytes} bytes after {page_num + 1} pages)"
+                    break
+        finally:
+            pages.close() # cancels outstanding page chunks when stopping early
+        stats["total_seconds"] = round(time.perf_counter() - started, 4)
+
+        text = PDF_PAGE_SEPARATOR.join(page_texts)
+        return text if text.strip() else "Could not extract any text from PDF."
     except Exception as e:
         return f"Error extracting PDF: {e}"
 
@@ -131,6 +926,45 @@ def extract_text_from_txt(uploaded_file):
         return f"Error extracting TXT: {e}"
 
 
+# --- Extraction Cache ---
+# Process-wide LRU of extracted resume text keyed by a digest of the uploaded bytes, so
+# Streamlit reruns and other sessions uploading the same file don't re-parse it.
+_extraction_cache = MemoryLRUCache(max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "64")))
+
+def file_digest(file_bytes):
+    """Returns the SHA-256 hex digest of an uploaded file's bytes."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def extract_resume_text(file_bytes, file_type, digest=None):
+    """
+    Extracts text from uploaded resume bytes ("application/pdf" or "text/plain"),
+    reusing the result of a previous extraction of identical bytes.
+    Returns (text, pdf_stats); `text` uses the same error strings as the extractors.
+    """
+    cache_key = (file_type, digest or file_digest(file_bytes), PDF_MAX_PAGES, PDF_MAX_TEXT_BYTES, PDF_MAX_FILE_BYTES)
+    metrics = get_default_metrics()
+    cached = _extraction_cache.get(cache_key)
+    metrics.increment("resume_extraction_cache_lookups_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+    pdf_stats = {}
+    with metrics.timer("resume_extraction_seconds", file_type=file_type):
+        if file_type == "application/pdf":
+            text = extract_text_from_pdf(io.BytesIO(file_bytes), stats=pdf_stats)
+        elif file_type == "text/plain":
+            text = extract_text_from_txt(io.BytesIO(file_bytes))
+        else:
+            text = f"Error extracting file: unsupported file type '{file_type}'."
+    if pdf_stats.get("pages_extracted"):
+        metrics.observe("resume_extraction_pages", pdf_stats["pages_extracted"], file_type=file_type)
+    _extraction_cache.set(cache_key, (text, pdf_stats))
+    return text, pdf_stats
+
+def extraction_cache_stats():
+    """Returns hit/miss counters of the process-wide extraction cache."""
+    return _extraction_cache.stats()
+
+
 # --- Formatting Functions for Display ---
 def format_extracted_details(details_json):
     """Formats the extracted JSON details into a readable markdown string."""
@@ -342,4 +1176,369 @@ def format_grammar_check(grammar_json):
             fb_md.append("") # spacing
         if len(fb_md) > 1 : md_parts.append("\n".join(fb_md))
         
-    return "\n\n".join(md_parts) if md_parts else "No grammar check data available."
\ No newline at end of file
+    return "\n\n".join(md_parts) if md_parts else "No grammar check data available."
+
+# Formatter used to render each analysis result key.
+RESULT_FORMATTERS = {
+    "extracted_details": format_extracted_details,
+    "strengths_weaknesses_missing": format_analysis,
+    "improvement_suggestions": format_suggestions,
+    "job_match": format_job_match,
+    "skill_gap": format_skill_gap,
+    "ats_check": format_ats_check,
+    "grammar_clarity": format_grammar_check,
+}
+
+# Expected top-level fields of each result, used to check and coerce repaired JSON
+# (see llm_json.apply_schema). Only fields the formatters depend on are listed.
+RESULT_SCHEMAS = {
+    "extracted_details": {"name": str, "contact_information": dict, "skills": list, "work_experience": list,
+                          "education": list, "projects": list, "certifications_and_awards": list},
+    "strengths_weaknesses_missing": {"strengths": list, "weaknesses": list, "missing_skills_for_role": list},
+    "improvement_suggestions": {"general_suggestions": list, "section_specific_suggestions": dict, "tailoring_for_role": list},
+    "job_match": {"job_match_percentage": int, "justification": str, "recommendations": list},
+    "skill_gap": {"matching_skills": list, "missing_skills_from_jd": list, "additional_skills_in_resume": list},
+    "ats_check": {"overall_ats_friendliness_score_out_of_10": int, "positive_points": list,
+                  "potential_issues_and_recommendations": list},
+    "grammar_clarity": {"overall_assessment": str, "feedback_points": list, "positive_aspects": list},
+}
+
+
+# --- Rendering & Export ---
+# Process-wide LRU of formatted markdown keyed by (result key, result fingerprint), so
+# reruns and other sessions showing the same result don't format it again.
+_rendered_markdown_cache = MemoryLRUCache(max_entries=int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "512")))
+
+def result_fingerprint(result):
+    """Returns a SHA-256 hex digest of a result's content (independent of key order)."""
+    payload = json.dumps(result, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def render_result(key, result, fingerprint=None):
+    """
+    Returns the markdown for one analysis result, formatting it only the first time a
+    given result is seen. Pass a precomputed `fingerprint` to skip hashing the result.
+    """
+    cache_key = (key, fingerprint or result_fingerprint(result))
+    markdown = _rendered_markdown_cache.get(cache_key)
+    if markdown is None:
+        markdown = RESULT_FORMATTERS[key](result)
+        _rendered_markdown_cache.set(cache_key, markdown)
+    return markdown
+
+def render_cache_stats():
+    """Returns hit/miss counters of the rendered markdown cache."""
+    return _rendered_markdown_cache.stats()
+
+def iter_export_sections(job_title, resume_text, results, section_titles, fingerprints=None):
+    """
+    Yields the markdown export of an analysis one section at a time: a title, the
+    original resume text, then each result under its title from `section_titles`.
+    Results without a title are skipped, except the skill gap (which has no tab when
+    no job description was given).
+    """
+    fingerprints = fingerprints or {}
+    yield f"# Resume Analysis for: {job_title}\n\n"
+    yield f"## Original Resume Text\n\n```\n{resume_text}\n```\n\n---\n\n"
+    for key, result in results.items():
+        if key not in section_titles and key != "skill_gap":
+            continue
+        title = section_titles.get(key, key.replace("_", " ").title())
+        if not isinstance(result, dict):
+            continue
+        if "info" in result:
+            yield f"## {title}\n\n{result['info']}\n\n---\n\n"
+        elif "error" in result:
+            yield f"## {title}\n\nError: {result['error']}\nRaw: {result.get('raw_response', 'N/A')}\n\n---\n\n"
+        elif key in RESULT_FORMATTERS:
+            yield f"## {title}\n\n{render_result(key, result, fingerprints.get(key))}\n\n---\n\n"
+
+def build_export_file(job_title, resume_text, results, section_titles, fingerprints=None):
+    """Writes the markdown export section by section into a UTF-8 file object (io.BytesIO)."""
+    export_file = io.BytesIO()
+    for section in iter_export_sections(job_title, resume_text, results, section_titles, fingerprints):
+        export_file.write(section.encode("utf-8"))
+    export_file.seek(0)
+    return export_file
+
+
+# --- Combined (Single-Call) Analysis ---
+_JSON_ONLY_INSTRUCTIONS = (
+    "Provide ONLY the JSON object as a single block of text, without any surrounding text or markdown formatting like ```json ... ```.",
+    "Ensure the JSON is valid.",
+)
+
+def build_combined_prompt(resume_text, job_title, job_description="", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, skip_keys=()):
+    """
+    Builds one composite prompt covering every analysis task (except `skip_keys`),
+    with the resume (and job description) included only once. The resume text is
+    normalized and trimmed to `token_budget` like in build_analysis_tasks.
+    Returns (prompt, result_keys).
+    """
+    # Format each task prompt against references instead of the real text, so the
+    # task wording stays exactly in sync with the standalone templates.
+    resume_text = normalize_resume_text(resume_text)
+    slim_extraction = is_confident_contact_extraction(extract_contact_details(resume_text))
+    reference_tasks = build_analysis_tasks(COMBINED_RESUME_REFERENCE, job_title, COMBINED_JD_REFERENCE if job_description else "",
+                                           compact=False, skip_keys=skip_keys, slim_extraction=slim_extraction)
+    task_sections = []
+    for key, task_prompt in reference_tasks:
+        for instruction in _JSON_ONLY_INSTRUCTIONS: # the combined prompt states this once at the end
+            task_prompt = task_prompt.replace(instruction, "")
+        task_sections.append(f"### TASK \"{key}\"\n{task_prompt.strip()}")
+    result_keys = [key for key, _ in reference_tasks]
+    fields = dict(
+        job_description_section=f"Job Description:\n'''{job_description}'''" if job_description else "No job description provided.",
+        task_sections="\n\n".join(task_sections),
+        result_keys=", ".join(f'"{key}"' for key in result_keys),
+    )
+    overhead_tokens = count_tokens(COMBINED_ANALYSIS_PROMPT_TEMPLATE.format(resume_text="", **fields))
+    prompt = COMBINED_ANALYSIS_PROMPT_TEMPLATE.format(resume_text=fit_text_to_prompt(overhead_tokens, resume_text, token_budget), **fields)
+    return prompt, result_keys
+
+def _salvage_combined_sections(raw_text, result_keys):
+    """
+    Recovers the sections that are still valid JSON from a combined response that
+    failed to parse as a whole (e.g. one section is truncated or malformed).
+    """
+    decoder = json.JSONDecoder()
+    sections = {}
+    for key in result_keys:
+        marker = f'"{key}"'
+        start = raw_text.find(marker)
+        if start == -1:
+            continue
+        colon = raw_text.find(":", start + len(marker))
+        if colon == -1:
+            continue
+        value_start = colon + 1
+        while value_start < len(raw_text) and raw_text[value_start].isspace():
+            value_start += 1
+        try:
+            sections[key], _ = decoder.raw_decode(raw_text, value_start)
+        except json.JSONDecodeError:
+            continue
+    return sections
+
+def _is_usable_section(section):
+    return isinstance(section, dict) and bool(section) and "error" not in section
+
+def run_combined_analysis(resume_text, job_title, job_description="", max_workers=DEFAULT_MAX_PARALLEL_TASKS,
+                          on_task_done=None, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, skip_keys=(), **gemini_kwargs):
+    """
+    Runs every analysis task through a single Gemini call. Sections that are missing
+    or fail to parse are retried individually with their standalone prompts.
+    Returns a dict of results keyed like build_analysis_tasks.
+    """
+    prompt, result_keys = build_combined_prompt(resume_text, job_title, job_description, token_budget=token_budget, skip_keys=skip_keys)
+    if not result_keys: # every task was skipped (e.g. all reused from an earlier analysis)
+        return {}
+    # One attempt only: a bad section is cheaper to retry on its own than the whole prompt.
+    combined = _timed_task("combined", get_gemini_response, prompt, retries=1, schema={key: dict for key in result_keys}, **gemini_kwargs)
+    if isinstance(combined, dict) and "error" in combined:
+        sections = _salvage_combined_sections(combined.get("raw_response") or "", result_keys)
+    else:
+        sections = combined if isinstance(combined, dict) else {}
+
+    results = {}
+    for key in result_keys:
+        if _is_usable_section(sections.get(key)):
+            results[key] = sections[key]
+            if on_task_done:
+                on_task_done(key, results[key])
+
+    context, context_tasks = build_context_tasks(resume_text, job_title, job_description, token_budget, skip_keys=skip_keys)
+    retry_tasks = [(key, task_prompt) for key, task_prompt in context_tasks if key not in results]
+    if retry_tasks:
+        print(f"Combined analysis: retrying {len(retry_tasks)} section(s) individually: {[key for key, _ in retry_tasks]}")
+        results.update(run_analysis_tasks(retry_tasks, max_workers=max_workers, on_task_done=on_task_done, context=context,
+                                          **gemini_kwargs))
+    return {key: results[key] for key in result_keys}
+
+
+# --- Extraction-First Pipeline ---
+# Role-specific tasks that can work from the extracted details instead of the raw resume text.
+# Grammar/clarity feedback needs the original wording, so it always gets the raw text.
+EXTRACTED_DETAILS_TASKS = ("strengths_weaknesses_missing", "improvement_suggestions", "job_match", "skill_gap", "ats_check")
+
+def _drop_empty_fields(value):
+    if isinstance(value, dict):
+        cleaned = {k: _drop_empty_fields(v) for k, v in value.items()}
+        return {k: v for k, v in cleaned.items() if v not in (None, "", "N/A", [], {})}
+    if isinstance(value, list):
+        cleaned = [_drop_empty_fields(v) for v in value]
+        return [v for v in cleaned if v not in (None, "", "N/A", [], {})]
+    return value
+
+def compact_extracted_details(details_json):
+    """
+    Serializes the EXTRACT_PROMPT_TEMPLATE result as compact JSON (no "N/A"/empty
+    fields, no whitespace) so it can stand in for the raw resume text in prompts.
+    """
+    compact_json = json.dumps(_drop_empty_fields(details_json), separators=(",", ":"), ensure_ascii=False)
+    return f"Structured resume details (JSON extracted from the candidate's resume):\n{compact_json}"
+
+def _prompt_size_report(raw_tasks, compact_tasks):
+    raw_sizes = dict((key, len(prompt)) for key, prompt in raw_tasks)
+    report = {}
+    for key, prompt in compact_tasks:
+        raw_chars = raw_sizes[key]
+        report[key] = {
+            "raw_chars": raw_chars,
+            "compact_chars": len(prompt),
+            "reduction_pct": round(100 * (raw_chars - len(prompt)) / raw_chars, 1) if raw_chars else 0.0,
+        }
+    return report
+
+def run_pipeline_analysis(resume_text, job_title, job_description="", max_workers=DEFAULT_MAX_PARALLEL_TASKS,
+                          on_task_done=None, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, skip_keys=(), extracted_details=None,
+                          **gemini_kwargs):
+    """
+    Runs extraction first (alongside the grammar check, which needs the raw text), then
+    sends a compact serialization of `extracted_details` instead of the raw resume text
+    to the role-specific tasks. Falls back to the raw text if extraction fails.
+    Pass an earlier `extracted_details` result (and skip its key) to build on it
+    instead of extracting again.
+    Returns (results, prompt_size_report), where the report maps each role-specific
+    task to its raw vs. compact prompt size in characters.
+    """
+    raw_context, raw_tasks = build_context_tasks(resume_text, job_title, job_description, token_budget, skip_keys=skip_keys)
+    first_stage = [(key, prompt) for key, prompt in raw_tasks if key not in EXTRACTED_DETAILS_TASKS]
+    results = run_analysis_tasks(first_stage, max_workers=max_workers, on_task_done=on_task_done, context=raw_context,
+                                 **gemini_kwargs)
+
+    role_context, role_tasks = raw_context, [(key, prompt) for key, prompt in raw_tasks if key in EXTRACTED_DETAILS_TASKS]
+    prompt_size_report = {}
+    extracted_details = results.get("extracted_details", extracted_details)
+    if isinstance(extracted_details, dict) and "error" not in extracted_details:
+        compact_context, compact_tasks = build_context_tasks(compact_extracted_details(extracted_details), job_title, job_description,
+                                                             compact=False, skip_keys=skip_keys)
+        compact_tasks = [(key, prompt) for key, prompt in compact_tasks if key in EXTRACTED_DETAILS_TASKS]
+        prompt_size_report = _prompt_size_report(
+            [(key, context_prompt(raw_context, prompt)) for key, prompt in role_tasks],
+            [(key, context_prompt(compact_context, prompt)) for key, prompt in compact_tasks],
+        )
+        role_context, role_tasks = compact_context, compact_tasks
+    else:
+        print("Pipeline analysis: extraction failed, using the raw resume text for every task.")
+
+    if not role_tasks:
+        return {key: results[key] for key, _ in raw_tasks}, prompt_size_report
+    results.update(run_analysis_tasks(role_tasks, max_workers=max_workers, on_task_done=on_task_done, context=role_context,
+                                      **gemini_kwargs))
+    return {key: results[key] for key, _ in raw_tasks}, prompt_size_report
+
+
+# --- Local Analysis ---
+# Results computed offline by local_analysis.py; Gemini's answers for them are optional enrichment.
+LOCAL_ANALYSIS_KEYS = ("skill_gap", "ats_check")
+
+def add_local_analysis(results, resume_text, job_title, job_description="", on_task_done=None, skip_keys=()):
+    """
+    Adds the local skill gap (when a job description is given) and ATS check to `results`.
+    If `results` already holds Gemini's answer for one of them, the two are merged,
+    with Gemini's items first. The locally found name and contact details are filled
+    into `extracted_details`. Keys in `skip_keys` (results reused from an earlier,
+    already completed analysis) are left as they are. Returns `results`.
+    """
+    metrics = get_default_metrics()
+    resume_text = normalize_resume_text(resume_text)
+    if "extracted_details" in results and "extracted_details" not in skip_keys:
+        results["extracted_details"] = merge_contact_details(extract_contact_details(resume_text), results["extracted_details"])
+    local_results = {}
+    if "ats_check" not in skip_keys:
+        with metrics.timer("local_analysis_seconds", task="ats_check"):
+            local_results["ats_check"] = local_ats_check(resume_text, job_title, job_description)
+    if job_description and "skill_gap" not in skip_keys:
+        with metrics.timer("local_analysis_seconds", task="skill_gap"):
+            local_results["skill_gap"] = local_skill_gap(resume_text, job_description)
+    for key, local_result in local_results.items():
+        results[key] = merge_enrichment(local_result, results.get(key))
+        if on_task_done:
+            on_task_done(key, results[key])
+    return results
+
+# --- Task Dependencies ---
+# The analysis inputs each task's result depends on. A finished result stays valid until
+# one of them changes, so a re-analysis only runs the stale tasks: a new job title keeps
+# extracted_details and grammar_clarity. The local ATS check also reads the job description.
+TASK_INPUTS = {
+    "extracted_details": ("resume_text",),
+    "strengths_weaknesses_missing": ("resume_text", "job_title"),
+    "improvement_suggestions": ("resume_text", "job_title"),
+    "job_match": ("resume_text", "job_title", "job_description"),
+    "skill_gap": ("resume_text", "job_title", "job_description"),
+    "ats_check": ("resume_text", "job_title", "job_description"),
+    "grammar_clarity": ("resume_text",),
+}
+# Tasks that read another task's result, per analysis mode (the pipeline sends the
+# extracted details instead of the resume text to the role-specific tasks).
+TASK_UPSTREAM = {"pipeline": {key: ("extracted_details",) for key in EXTRACTED_DETAILS_TASKS}}
+
+def task_fingerprints(resume_text, job_title, job_description="", mode="parallel", token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                      enrich_local=False):
+    """
+    Returns {task key: fingerprint} for an analysis. A fingerprint covers the inputs the
+    task reads (TASK_INPUTS), the fingerprints of its upstream tasks in `mode`, and the
+    settings that shape its prompt (mode, token budget; enrich_local for the ATS check
+    and skill gap), so it changes exactly when the task has to run again.
+    """
+    inputs = {
+        "resume_text": hashlib.sha256((resume_text or "").encode("utf-8")).hexdigest(),
+        "job_title": " ".join((job_title or "").split()),
+        "job_description": hashlib.sha256((job_description or "").strip().encode("utf-8")).hexdigest(),
+    }
+    upstream = TASK_UPSTREAM.get(mode, {})
+    fingerprints = {}
+
+    def fingerprint(key):
+        if key not in fingerprints:
+            payload = {
+                "task": key, "mode": mode, "token_budget": token_budget,
+                "inputs": {name: inputs[name] for name in TASK_INPUTS[key]},
+                "upstream": [fingerprint(parent) for parent in upstream.get(key, ())],
+            }
+            if key in LOCAL_ANALYSIS_KEYS:
+                payload["enrich_local"] = bool(enrich_local)
+            fingerprints[key] = result_fingerprint(payload)
+        return fingerprints[key]
+
+    for key in TASK_INPUTS:
+        fingerprint(key)
+    return fingerprints
+
+def reusable_results(previous_results, previous_fingerprints, fingerprints):
+    """
+    Returns the earlier results that are still valid for `fingerprints`: same inputs
+    and settings, and not an error. Everything else is stale and has to run again.
+    """
+    return {
+        key: result for key, result in (previous_results or {}).items()
+        if key in fingerprints and (previous_fingerprints or {}).get(key) == fingerprints[key]
+        and isinstance(result, dict) and "error" not in result
+    }
+
+# Used only to express saved response tokens as an approximate time saving.
+ESTIMATED_OUTPUT_TOKENS_PER_SECOND = float(os.getenv("GEMINI_OUTPUT_TOKENS_PER_SECOND", "150"))
+
+def measure_contact_prefill(resume_text):
+    """
+    Reports what local name/contact pre-extraction saves on the extraction call:
+    {"applied", "fields_found", "local_ms", "prompt_tokens_saved", "response_tokens_saved",
+    "estimated_seconds_saved"}. Nothing is saved when the pre-extraction is not confident.
+    """
+    resume_text = normalize_resume_text(resume_text)
+    started = time.perf_counter()
+    details = extract_contact_details(resume_text)
+    local_ms = round((time.perf_counter() - started) * 1000, 2)
+    report = {
+        "applied": is_confident_contact_extraction(details),
+        "fields_found": [field for field, value in details["contact_information"].items() if value != "N/A"],
+        "local_ms": local_ms, "prompt_tokens_saved": 0, "response_tokens_saved": 0, "estimated_seconds_saved": 0.0,
+    }
+    if report["applied"]:
+        report["prompt_tokens_saved"] = (count_tokens(EXTRACT_PROMPT_TEMPLATE.format(resume_text=""))
+                                         - count_tokens(EXTRACT_SLIM_PROMPT_TEMPLATE.format(resume_text="")))
+        report["response_tokens_saved"] = count_tokens(json.dumps(details, indent=2, ensure_ascii=False))
+        report["estimated_seconds_saved"] = round(report["response_tokens_saved"] / ESTIMATED_OUTPUT_TOKENS_PER_SECOND, 2)
+    return report